@@ -0,0 +1,244 @@
+import os
+from typing import Optional
+import faiss
+import numpy as np
+
+# Which FAISS index to build: flat, hnsw, ivf_flat, ivf_pq, sq_fp16 or sq_int8
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+
+# HNSW graph parameters
+HNSW_M = int(os.getenv("FAISS_HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", 64))
+
+# IVF parameters
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", 1024))
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", 16))
+PQ_M = int(os.getenv("FAISS_PQ_M", 64))  # Sub-quantizers; must divide the vector dimension
+PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", 8))
+
+# IVF indexes stay flat until this many vectors exist to train the coarse quantizer on
+TRAIN_MIN_VECTORS = int(os.getenv("FAISS_TRAIN_MIN_VECTORS", IVF_NLIST * 39))
+# Upper bound on the number of vectors sampled for training
+TRAIN_MAX_VECTORS = int(os.getenv("FAISS_TRAIN_MAX_VECTORS", IVF_NLIST * 256))
+
+# Scalar quantizers: 2 bytes (fp16) or 1 byte (int8) per dimension instead of 4
+SQ_TYPES = {"sq_fp16": faiss.ScalarQuantizer.QT_fp16, "sq_int8": faiss.ScalarQuantizer.QT_8bit}
+# int8 quantization learns a value range per dimension, which takes far fewer vectors than IVF clustering
+SQ_TRAIN_MIN_VECTORS = int(os.getenv("FAISS_SQ_TRAIN_MIN_VECTORS", 1000))
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq_fp16", "sq_int8")
+
+def create_index(index_type: str, dimensions: int) -> faiss.Index:
+    """
+    Create an empty FAISS index of the given type.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dimensions: Vector dimensions
+
+    Returns:
+        The new (possibly untrained) index
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimensions)
+    if index_type in SQ_TYPES:
+        return faiss.IndexScalarQuantizer(dimensions, SQ_TYPES[index_type], faiss.METRIC_L2)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimensions, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimensions), dimensions, IVF_NLIST)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimensions), dimensions, IVF_NLIST, PQ_M, PQ_NBITS)
+    else:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'. Expected one of {', '.join(INDEX_TYPES)}.")
+    index.nprobe = IVF_NPROBE
+    return index
+
+def index_type_of(index: faiss.Index) -> str:
+    """Return the INDEX_TYPES name describing an existing index."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for index_type, qtype in SQ_TYPES.items():
+            if index.sq.qtype == qtype:
+                return index_type
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+def mmap_flags(index_type: str) -> int:
+    """
+    faiss.read_index flags that memory-map an index of this type instead of reading it into RAM.
+
+    Mapped indexes are read-only views of the file; they must never be added to.
+    """
+    if is_ivf(index_type):
+        return faiss.IO_FLAG_MMAP  # Inverted lists are served from the file
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", 0)  # Flat and SQ codes (also HNSW storage) are served from the file
+
+def is_ivf(index_type: str) -> bool:
+    """Whether indexes of this type are inverted-file indexes (searched with nprobe)."""
+    return index_type in ("ivf_flat", "ivf_pq")
+
+def is_quantized(index_type: str) -> bool:
+    """Whether indexes of this type store lossy codes instead of the vectors themselves."""
+    return index_type in ("ivf_pq", "sq_fp16", "sq_int8")
+
+def requires_training(index_type: str) -> bool:
+    """Whether indexes of this type must be trained before vectors can be added."""
+    return is_ivf(index_type) or index_type == "sq_int8"
+
+def can_build(index_type: str, ntotal: int) -> bool:
+    """Whether there are enough vectors to build an index of this type."""
+    if not requires_training(index_type):
+        return True
+    return ntotal >= (TRAIN_MIN_VECTORS if is_ivf(index_type) else SQ_TRAIN_MIN_VECTORS)
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """
+    Read every vector back out of an index, in FAISS id order.
+
+    Vectors from quantized indexes are approximations of the originals.
+    """
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def build_index(index_type: str, vectors: np.ndarray) -> faiss.Index:
+    """
+    Build a populated index of the given type, training it on a sample of the vectors first if needed.
+
+    Vectors are added in order, so FAISS ids match their row positions.
+    """
+    index = create_index(index_type, vectors.shape[1])
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > TRAIN_MAX_VECTORS:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), TRAIN_MAX_VECTORS, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+    index.add(vectors)
+    return index
+
+def rebuild_index(index: faiss.Index, keep: np.ndarray) -> faiss.Index:
+    """
+    Build a new index of the same type holding only some of an index's vectors.
+
+    Args:
+        index: The index to copy from (may be memory-mapped)
+        keep: Sorted FAISS ids to keep; each is renumbered to its position in keep
+
+    Returns:
+        The new index. IVF entries and SQ codes are copied code for code, so
+        nothing is retrained and quantized vectors are not re-encoded.
+    """
+    index_type = index_type_of(index)
+    if index_type in SQ_TYPES:
+        sq_index = faiss.downcast_index(index)
+        rebuilt = create_index(index_type, sq_index.d)
+        rebuilt.sq = sq_index.sq
+        rebuilt.is_trained = True
+        codes = faiss.rev_swig_ptr(sq_index.codes.data(), sq_index.ntotal * sq_index.code_size)
+        if len(keep):
+            rebuilt.add_sa_codes(np.ascontiguousarray(codes.reshape(sq_index.ntotal, -1)[keep]))
+        return rebuilt
+    if not is_ivf(index_type):
+        vectors = index.reconstruct_batch(keep) if len(keep) else np.empty((0, index.d), dtype=np.float32)
+        return build_index(index_type, vectors)
+
+    ivf = faiss.downcast_index(faiss.extract_index_ivf(index))
+    quantizer = faiss.IndexFlatL2(ivf.d)
+    quantizer.add(ivf.quantizer.reconstruct_n(0, ivf.nlist))
+    if index_type == "ivf_pq":
+        rebuilt = faiss.IndexIVFPQ(quantizer, ivf.d, ivf.nlist, ivf.pq.M, ivf.pq.nbits)
+        rebuilt.pq = ivf.pq
+        rebuilt.is_trained = True
+        rebuilt.precompute_table()
+    else:
+        rebuilt = faiss.IndexIVFFlat(quantizer, ivf.d, ivf.nlist)
+        rebuilt.is_trained = True
+    rebuilt.nprobe = ivf.nprobe
+
+    new_ids = np.full(ivf.ntotal, -1, dtype=np.int64)
+    new_ids[keep] = np.arange(len(keep), dtype=np.int64)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids = new_ids[faiss.rev_swig_ptr(invlists.get_ids(list_no), size)]
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).reshape(size, -1)
+        kept = ids >= 0
+        if kept.any():
+            # Bind the arrays: swig_ptr does not keep its argument alive
+            kept_ids = np.ascontiguousarray(ids[kept])
+            kept_codes = np.ascontiguousarray(codes[kept])
+            rebuilt.invlists.add_entries(list_no, len(kept_ids), faiss.swig_ptr(kept_ids), faiss.swig_ptr(kept_codes))
+    rebuilt.ntotal = len(keep)
+    return rebuilt
+
+def migrate_index(index: faiss.Index, index_type: str = FAISS_INDEX_TYPE,
+                  vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    Convert an index to the configured type once there are enough vectors to do so.
+
+    Args:
+        index: The current index
+        index_type: The target index type
+        vectors: Optional full-precision copies of the index's vectors, in
+            FAISS id order, to build from instead of reading them back out of the index
+
+    Returns:
+        The migrated index, or the original one if it already has the target
+        type or the target type can't be trained yet
+    """
+    current_type = index_type_of(index)
+    if current_type == index_type or not can_build(index_type, index.ntotal):
+        return index
+
+    print(f"Migrating FAISS index from {current_type} to {index_type} ({index.ntotal} vectors)...")
+    if vectors is None or len(vectors) != index.ntotal:
+        if is_quantized(current_type):
+            print(f"Warning: rebuilding from {current_type} codes; migrated vectors are approximations.")
+        vectors = reconstruct_all(index)
+    return build_index(index_type, vectors)
+
+def search_parameters(index: faiss.Index, selector: Optional[faiss.IDSelector] = None,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Build per-query search parameters suited to the index type.
+
+    Args:
+        index: The index that will be searched
+        selector: Optional ID selector restricting the search
+        nprobe: Optional number of IVF lists to visit
+        ef_search: Optional HNSW search queue size
+
+    Returns:
+        Search parameters, or None if the defaults apply
+    """
+    if selector is None and nprobe is None and ef_search is None:
+        return None
+
+    # Parameter objects replace the index defaults wholesale, so carry those over
+    index_type = index_type_of(index)
+    if index_type == "hnsw":
+        hnsw_index = faiss.downcast_index(index)
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or hnsw_index.hnsw.efSearch)
+    elif is_ivf(index_type):
+        ivf = faiss.try_extract_index_ivf(index)
+        params = faiss.SearchParametersIVF(nprobe=nprobe or ivf.nprobe)
+    else:
+        params = faiss.SearchParameters()
+
+    if selector is not None:
+        params.sel = selector
+    return params
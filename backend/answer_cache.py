@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple
+import faiss
+import numpy as np
+
+# Maximum number of cached answers; 0 disables the cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+# Seconds an answer may be served from the cache
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+# Cosine similarity at which a different phrasing counts as the same question; above 1 disables the semantic level
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+# Nearest cached questions checked for a matching scope on a semantic lookup
+SEMANTIC_CANDIDATES = 8
+
+# (sorted doc_ids or None for all documents, nprobe, ef_search, retrieval mode)
+Scope = Tuple[Optional[Tuple[int, ...]], Optional[int], Optional[int], Optional[str]]
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, ignoring trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+def make_scope(doc_ids: Optional[List[int]], nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               mode: Optional[str] = None) -> Scope:
+    """Everything besides the question that determines an answer."""
+    return (tuple(sorted(set(doc_ids))) if doc_ids else None, nprobe, ef_search, mode)
+
+class AnswerCache:
+    """
+    In-memory, two-level cache of /query answers.
+
+    The first level matches the normalized question text exactly. The second
+    finds earlier questions whose embeddings are within a cosine-similarity
+    threshold, using a small inner-product FAISS index of unit vectors. Both
+    levels only match answers computed for the same scope. Entries expire
+    after a TTL, are evicted least recently used first, and are dropped when a
+    document in their scope changes.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, similarity: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+        # Bumped on every invalidation, so answers computed across one are not cached
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._exact: Dict[Tuple[str, Scope], int] = {}
+        self._vectors: Optional[faiss.IndexIDMap2] = None
+        self._next_id = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, question: str, scope: Scope) -> Optional[Dict[str, Any]]:
+        """Return a cached answer for exactly this question and scope, if any."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry_id = self._exact.get((normalize_question(question), scope))
+            entry = self._touch(entry_id)
+            if entry is not None:
+                self.exact_hits += 1
+                self.saved_seconds += entry["seconds"]
+                return entry["result"]
+        return None
+
+    def get_similar(self, query_vector: np.ndarray, scope: Scope) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached answer to a question phrased differently but meaning the same.
+
+        Counts a miss when nothing matches, so call it after get().
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._vectors is not None and self._vectors.ntotal and self.similarity <= 1:
+                query = unit_vector(query_vector)
+                k = min(SEMANTIC_CANDIDATES, self._vectors.ntotal)
+                similarities, entry_ids = self._vectors.search(query, k)
+                for similarity, entry_id in zip(similarities[0], entry_ids[0]):
+                    if similarity < self.similarity:
+                        break
+                    if entry_id >= 0 and self._entries.get(int(entry_id), {}).get("scope") == scope:
+                        entry = self._touch(int(entry_id))
+                        if entry is not None:
+                            self.semantic_hits += 1
+                            self.saved_seconds += entry["seconds"]
+                            return entry["result"]
+            self.misses += 1
+        return None
+
+    def record_miss(self, count: int = 1):
+        """Count lookups that found no exact match and had no query embedding to look for similar ones with."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.misses += count
+
+    def put(self, question: str, scope: Scope, query_vector: Optional[np.ndarray], result: Dict[str, Any],
+            seconds: float, generation: int):
+        """
+        Cache an answer.
+
+        Args:
+            question: The question as asked
+            scope: Scope the answer was computed for
+            query_vector: Embedding of the question, or None to cache it for exact matches only
+            result: The answer and its sources
+            seconds: Time it took to compute, credited as saved on each hit
+            generation: Value of self.generation before the answer was computed
+        """
+        if not self.enabled:
+            return
+        vector = unit_vector(query_vector) if query_vector is not None else None
+        with self._lock:
+            if generation != self.generation:
+                # Documents changed while answering; the answer may already be stale
+                return
+            key = (normalize_question(question), scope)
+            if key in self._exact:
+                self._remove([self._exact[key]])
+            if self._vectors is None and vector is not None:
+                self._vectors = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {"key": key, "scope": scope, "result": result,
+                                       "seconds": seconds, "expires": time.monotonic() + self.ttl}
+            self._exact[key] = entry_id
+            if vector is not None:
+                self._vectors.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+
+            if len(self._entries) > self.max_entries:
+                oldest = list(self._entries)[:len(self._entries) - self.max_entries]
+                self._remove(oldest)
+
+    def invalidate(self, doc_id: int):
+        """Drop answers whose scope includes the document (including all-document scopes)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.generation += 1
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if entry["scope"][0] is None or doc_id in entry["scope"][0]]
+            self._remove(stale)
+            self.invalidations += len(stale)
+
+    def invalidate_all(self):
+        """Drop every answer, e.g. once another process changed documents in unknown ways."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._remove(list(self._entries))
+
+    def _touch(self, entry_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Return a live entry and mark it most recently used; drop it if it expired."""
+        entry = self._entries.get(entry_id) if entry_id is not None else None
+        if entry is None:
+            return None
+        if entry["expires"] < time.monotonic():
+            self._remove([entry_id])
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry
+
+    def _remove(self, entry_ids: List[int]):
+        if not entry_ids:
+            return
+        for entry_id in entry_ids:
+            entry = self._entries.pop(entry_id)
+            self._exact.pop(entry["key"], None)
+        if self._vectors is not None:
+            self._vectors.remove_ids(faiss.IDSelectorBatch(np.array(entry_ids, dtype=np.int64)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counters, time saved and current size."""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_latency_seconds": round(self.saved_seconds, 3),
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+def unit_vector(vector: np.ndarray) -> np.ndarray:
+    """Row vector scaled to unit length, so inner product equals cosine similarity."""
+    vector = np.array(vector, dtype=np.float32).reshape(1, -1)
+    faiss.normalize_L2(vector)
+    return vector
+
+# Shared cache used by index.answer
+cache = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY)
@@ -1,14 +1,38 @@
 import os
+import json
+import asyncio
+import shutil
 import tempfile
 import uvicorn
-from typing import List, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, BackgroundTasks
+from typing import List, Optional, Literal
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
-from models import Document, Chunk, create_db_and_tables, get_session
-from index import add_document, answer, save_index
+from models import Document, Chunk, Job, create_db_and_tables, get_session, engine
+from index import (answer, answer_batch, answer_stream, save_index, delete_document, index_stats, accepts_writes,
+                   load_lexical_index, reload_periodically, INDEX_RELOAD_SECONDS)
+from embedding_cache import cache as embedding_cache
+from answer_cache import cache as answer_cache
+from clients import init_openai_client, close_openai_client, pool_stats
+from concurrency import start_pools, shutdown_pools, run_in_thread
+from shards import shards
+from metrics import TimingMiddleware, registry as metrics_registry
+from jobs import (UPLOAD_DIR, QueueFullError, create_job, get_job, update_job, enqueue,
+                  queue_is_full, start_workers, stop_workers)
+
+# Block size for spooling uploads to disk
+UPLOAD_COPY_BUFFER = 1024 * 1024
+# Most questions accepted in one batch query
+QUERY_BATCH_MAX_QUESTIONS = int(os.getenv("QUERY_BATCH_MAX_QUESTIONS", 1000))
+# Replays removals shards missed while they were down, when sharded
+shard_retry_task: Optional[asyncio.Task] = None
+# Keeps a read-only worker's index copy in step with the writer
+index_reload_task: Optional[asyncio.Task] = None
+# Returned by workers that serve a read-only copy of the index
+READ_ONLY_DETAIL = "This worker serves a read-only copy of the index; send uploads and deletions to the writer process"
 
 # Initialize FastAPI
 app = FastAPI(title="Quick-RAG API", 
@@ -22,20 +46,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser dev tools show the Server-Timing breakdown of cross-origin requests
+    expose_headers=["Server-Timing"],
 )
+# Per-request latency histograms, Server-Timing headers and slow-request profiles
+app.add_middleware(TimingMiddleware)
 
 # Request and response models
 class QueryRequest(BaseModel):
     question: str
     doc_ids: Optional[List[int]] = None
+    # Optional per-query ANN tuning; ignored by index types they don't apply to
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    # Optional retrieval mode; "lexical" answers without calling the embeddings API
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[dict]
 
-class DocumentResponse(BaseModel):
-    id: int
-    name: str
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    # Applied to every question in the batch
+    doc_ids: Optional[List[int]] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
 
 class DocumentDetailResponse(BaseModel):
     id: int
@@ -43,41 +83,137 @@ class DocumentDetailResponse(BaseModel):
     mime_type: str
     chunks: List[dict]
 
-# Create tables on startup
+class JobResponse(BaseModel):
+    job_id: int
+    name: str
+    status: str
+    stage: Optional[str] = None
+    document_id: Optional[int] = None
+    error: Optional[str] = None
+
+def get_document_row(doc_id: int) -> Optional[Document]:
+    with Session(engine) as session:
+        return session.get(Document, doc_id)
+
+def job_response(job: Job) -> dict:
+    return {
+        "job_id": job.id,
+        "name": job.file_name,
+        "status": job.status,
+        "stage": job.stage,
+        "document_id": job.doc_id,
+        "error": job.error,
+    }
+
+# Create tables, the shared OpenAI client and ingestion workers on startup
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
+    global shard_retry_task, index_reload_task
     create_db_and_tables()
+    # Reconciled with the chunk table, so only once the tables exist
+    load_lexical_index()
+    init_openai_client()
+    start_pools()
+    await start_workers()
+    if shards is not None:
+        shard_retry_task = asyncio.create_task(shards.retry_missed_removals())
+    elif not accepts_writes() and INDEX_RELOAD_SECONDS > 0:
+        index_reload_task = asyncio.create_task(reload_periodically())
 
-# Save index on shutdown
+# Save index and release pooled connections on shutdown
 @app.on_event("shutdown")
-def on_shutdown():
+async def on_shutdown():
+    await stop_workers()
     save_index()
+    await close_openai_client()
+    if shard_retry_task is not None:
+        shard_retry_task.cancel()
+    if index_reload_task is not None:
+        index_reload_task.cancel()
+    if shards is not None:
+        await shards.aclose()
+    shutdown_pools()
+
+async def queue_upload(file: UploadFile, doc_id: Optional[int] = None) -> dict:
+    """Spool an upload to disk and queue an ingestion job for it."""
+    if not accepts_writes():
+        raise HTTPException(status_code=503, detail=READ_ONLY_DETAIL)
+    # Backpressure: refuse work up front rather than letting the queue grow without bound
+    if queue_is_full():
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, try again later",
+                            headers={"Retry-After": "30"})
+    
+    # Spool the upload to disk so the job can outlive this request (and a restart)
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, delete=False) as temp:
+        temp_path = temp.name
+        try:
+            # Copy in blocks rather than reading the whole upload into memory
+            await run_in_thread(shutil.copyfileobj, file.file, temp, UPLOAD_COPY_BUFFER)
+        except BaseException:
+            # A failed or cancelled copy (full disk, client gone) must not leave a partial file behind
+            temp.close()
+            os.unlink(temp_path)
+            raise
+    
+    job = await run_in_thread(create_job, file.filename, temp_path, doc_id)
+    try:
+        await enqueue(job.id)
+    except QueueFullError:
+        await run_in_thread(update_job, job.id, status="failed", error="Ingestion queue is full")
+        os.unlink(temp_path)
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, try again later",
+                            headers={"Retry-After": "30"})
+    
+    return job_response(job)
 
 # Endpoints
-@app.post("/documents", response_model=DocumentResponse)
+@app.post("/documents", response_model=JobResponse, status_code=202)
 async def upload_document(file: UploadFile = File(...)):
     """
     Upload a document (PDF, DOCX, or TXT) for processing.
+    
+    Ingestion runs in the background; poll GET /jobs/{job_id} for progress.
     """
-    # Create a temporary file to store the upload
-    with tempfile.NamedTemporaryFile(delete=False) as temp:
-        # Write uploaded file content to temp file
-        content = await file.read()
-        temp.write(content)
-        temp_path = temp.name
+    return await queue_upload(file)
+
+@app.put("/documents/{doc_id}", response_model=JobResponse, status_code=202)
+async def replace_document(doc_id: int, file: UploadFile = File(...)):
+    """
+    Upload a new version of a document.
     
-    try:
-        # Process the document
-        doc_id = await add_document(temp_path, file.filename)
-        
-        # Return document ID
-        return {"id": doc_id, "name": file.filename}
-    finally:
-        # Clean up the temp file
-        os.unlink(temp_path)
+    The new version is ingested in the background like an upload; the old
+    chunks stay searchable until it is indexed and are then removed.
+    """
+    if await run_in_thread(get_document_row, doc_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return await queue_upload(file, doc_id)
 
+@app.delete("/documents/{doc_id}", status_code=204)
+def remove_document(doc_id: int):
+    """
+    Delete a document, its chunks and its vectors.
+    
+    Vectors drop out of search results immediately; their space is reclaimed
+    by a background compaction of the index.
+    """
+    if not accepts_writes():
+        raise HTTPException(status_code=503, detail=READ_ONLY_DETAIL)
+    if not delete_document(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: int):
+    """
+    Get the status of a document ingestion job.
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+# Plain def: FastAPI runs these in its thread pool, keeping SQLite off the event loop
 @app.get("/documents/{doc_id}", response_model=DocumentDetailResponse)
-async def get_document(doc_id: int, session: Session = Depends(get_session)):
+def get_document(doc_id: int, session: Session = Depends(get_session)):
     """
     Get document details including its chunks.
     """
@@ -91,7 +227,7 @@ async def get_document(doc_id: int, session: Session = Depends(get_session)):
     chunks = session.exec(chunks_query).all()
     
     # Format response
-    chunks_data = [{"id": chunk.id, "text": chunk.text} for chunk in chunks]
+    chunks_data = [{"id": chunk.id, "text": chunk.text, "page": chunk.page} for chunk in chunks]
     
     return {
         "id": document.id,
@@ -101,7 +237,7 @@ async def get_document(doc_id: int, session: Session = Depends(get_session)):
     }
 
 @app.get("/documents")
-async def list_documents(session: Session = Depends(get_session)):
+def list_documents(session: Session = Depends(get_session)):
     """
     List all documents.
     """
@@ -113,8 +249,61 @@ async def query_documents(query: QueryRequest):
     """
     Query documents and get an AI-generated answer.
     """
-    result = await answer(query.question, query.doc_ids)
+    result = await answer(query.question, query.doc_ids, nprobe=query.nprobe, ef_search=query.ef_search,
+                          mode=query.mode)
     return result
 
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_documents_batch(query: BatchQueryRequest):
+    """
+    Answer many questions in one request.
+
+    The questions are embedded together, searched with one FAISS call and
+    answered concurrently; results come back in the order of the questions.
+    """
+    if len(query.questions) > QUERY_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {QUERY_BATCH_MAX_QUESTIONS} questions per batch")
+    results = await answer_batch(query.questions, query.doc_ids, nprobe=query.nprobe,
+                                 ef_search=query.ef_search, mode=query.mode)
+    return {"results": results}
+
+@app.post("/query/stream")
+async def query_documents_stream(query: QueryRequest):
+    """
+    Query documents and stream the answer as server-sent events.
+    
+    Sends a `sources` event once retrieval is done, `token` events as the
+    answer is generated, then `done` with the full answer (or `error`).
+    """
+    async def events():
+        async for event, data in answer_stream(query.question, query.doc_ids, nprobe=query.nprobe,
+                                               ef_search=query.ef_search, mode=query.mode):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    # Keep proxies from buffering the stream
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stats")
+async def get_stats():
+    """
+    Runtime statistics for caches and other subsystems.
+    """
+    return {
+        "index": await run_in_thread(index_stats),
+        "answer_cache": answer_cache.stats(),
+        # Counts rows in SQLite, so it runs off the event loop too
+        "embedding_cache": await run_in_thread(embedding_cache.stats),
+        "openai_pool": pool_stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Latency histograms per pipeline stage and per route, in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+ANN benchmark: recall@k against the flat baseline, p50/p99 latency and memory.
+
+Builds every configured index type over the same synthetic corpus
+(Gaussian clusters, which is closer to real embeddings than uniform noise)
+and sweeps nprobe / efSearch so the memory/recall trade-off can be chosen
+with data.
+
+Usage (from the backend directory):
+    python -m benchmarks.ann_recall --vectors 100000 --dim 1536 --nlist 1024
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ann
+
+
+def synthetic_corpus(n_vectors, n_queries, dim, n_clusters, seed=0):
+    """Clustered vectors plus queries drawn from the same distribution."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+
+    def sample(n):
+        labels = rng.integers(0, n_clusters, n)
+        return centers[labels] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+
+    return sample(n_vectors), sample(n_queries)
+
+
+def measure(index, queries, k, params=None):
+    """Search one query at a time, as the API does. Returns (ids, per-query latencies in ms)."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k, params=params)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        ids[i] = found[0]
+    return ids, latencies
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200, help="clusters in the synthetic corpus")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", default=",".join(ann.INDEX_TYPES), help="comma separated index types")
+    parser.add_argument("--nlist", type=int, default=ann.IVF_NLIST)
+    parser.add_argument("--pq-m", type=int, default=ann.PQ_M)
+    parser.add_argument("--nprobe", default="1,8,16,64", help="comma separated nprobe values for IVF types")
+    parser.add_argument("--ef-search", default="16,64,256", help="comma separated efSearch values for HNSW")
+    args = parser.parse_args()
+
+    ann.IVF_NLIST = args.nlist
+    ann.PQ_M = args.pq_m
+    faiss.omp_set_num_threads(1)  # Per-query latency, not throughput
+
+    print(f"Corpus: {args.vectors} x {args.dim}, {args.queries} queries, k={args.k}")
+    corpus, queries = synthetic_corpus(args.vectors, args.queries, args.dim, args.clusters)
+
+    flat = ann.build_index("flat", corpus)
+    truth, _ = measure(flat, queries, args.k)
+
+    print(f"{'index':<10} {'param':<14} {'build s':>8} {'MB':>9} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = ann.build_index(index_type, corpus)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        if index_type == "hnsw":
+            sweep = [("efSearch", int(v), ann.search_parameters(index, ef_search=int(v))) for v in args.ef_search.split(",")]
+        elif ann.is_ivf(index_type):
+            sweep = [("nprobe", int(v), ann.search_parameters(index, nprobe=int(v))) for v in args.nprobe.split(",")]
+        else:
+            sweep = [("-", "", None)]
+
+        for name, value, params in sweep:
+            found, latencies = measure(index, queries, args.k, params)
+            label = f"{name}={value}" if value != "" else name
+            print(f"{index_type:<10} {label:<14} {build_seconds:8.1f} {size_mb:9.1f} "
+                  f"{recall_at_k(found, truth):9.3f} {np.percentile(latencies, 50):8.3f} {np.percentile(latencies, 99):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
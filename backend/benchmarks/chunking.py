@@ -0,0 +1,81 @@
+"""
+Benchmark: chunking throughput in MB/s, sentence-by-sentence vs token windows.
+
+Chunks synthetic text of several sizes with:
+
+    legacy   the original chunk_text: split on '.', encode every sentence
+             separately to count its tokens, join sentences into chunks
+    windows  chunking.chunk_text: encode the text once, cut the token ids
+             into overlapping windows at paragraph/sentence breaks
+
+and reports MB/s, the number of chunks and their token lengths.
+
+Usage (from the backend directory):
+    python -m benchmarks.chunking --sizes-mb 1 10 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_paragraphs
+from chunking import chunk_text, token_flags
+from embeddings import count_tokens, encoder
+
+
+def legacy_chunk_text(text, chunk_size=500):
+    """The original sentence-based chunk_text, kept here for comparison."""
+    sentences = [s.strip() for s in text.split('.') if s.strip()]
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for sentence in sentences:
+        if not sentence.endswith('.'):
+            sentence = sentence + '.'
+        sentence_size = count_tokens(sentence)
+        if current_size + sentence_size > chunk_size and current_chunk:
+            chunks.append(' '.join(current_chunk))
+            current_chunk = [sentence]
+            current_size = sentence_size
+        else:
+            current_chunk.append(sentence)
+            current_size += sentence_size
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def make_text(megabytes):
+    pages = make_paragraphs(max(1, int(megabytes * 1024 * 1024 / 5000)), 700)
+    # Blank lines between pages as paragraph breaks, and some decimals that must not end a sentence
+    return "\n\n".join(f"{page} Rate was {i % 97}.{i % 10} percent." for i, page in enumerate(pages))
+
+
+def measure(name, chunker, text):
+    start = time.perf_counter()
+    chunks = chunker(text)
+    seconds = time.perf_counter() - start
+    sample = chunks[:: max(1, len(chunks) // 200)]
+    tokens = np.array([len(encoder.encode_ordinary(chunk)) for chunk in sample])
+    megabytes = len(text.encode("utf-8")) / 2**20
+    print(f"{name:>8}: {megabytes / seconds:7.2f} MB/s  {seconds:7.2f} s  {len(chunks):6d} chunks  "
+          f"tokens/chunk mean {tokens.mean():5.0f} max {tokens.max():4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    args = parser.parse_args()
+
+    token_flags()  # One-off vocabulary scan, not part of the per-document cost
+    for size in args.sizes_mb:
+        text = make_text(size)
+        print(f"{len(text.encode('utf-8')) / 2**20:.1f} MB of text")
+        measure("legacy", lambda t: legacy_chunk_text(t, args.chunk_size), text)
+        measure("windows", lambda t: chunk_text(t, args.chunk_size, args.overlap), text)
+
+
+if __name__ == "__main__":
+    main()
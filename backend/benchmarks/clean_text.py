@@ -0,0 +1,97 @@
+"""
+Benchmark: clean_text throughput on extracted PDF, DOCX and TXT text.
+
+Writes a synthetic sample of each format, extracts its raw text (pypdf page
+text, docx2txt output, the decoded file), then times on each:
+
+    legacy  the original clean_text: four re.sub passes, non-ASCII replaced
+            by spaces
+    clean   extract.clean_text: NFKC check, str.translate character
+            filtering, one precompiled PDF-syntax regex (skipped for DOCX,
+            as in extraction), split/join whitespace collapse
+
+and reports the best of --repeats runs in MB/s, along with how many
+non-ASCII characters survive cleaning. Set UNICODE_HANDLING to compare the
+nfkc, keep and ascii modes.
+
+Usage (from the backend directory):
+    python -m benchmarks.clean_text --megabytes 5
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import docx2txt
+import pypdf
+
+from benchmarks.synthetic import make_paragraphs, write_docx, write_pdf
+from extract import UNICODE_HANDLING, clean_text
+
+# Accented Latin, Cyrillic, CJK, a ligature and a zero-width space
+MULTILINGUAL = ["Die Größe der Datei überschreitet das Limit.", "Срок подачи заявки истекает завтра.",
+                "申請は上司の承認が必要です。", "The ﬁnal re​port is due on Friday."]
+
+
+def legacy_clean_text(text):
+    """The original clean_text, kept here for comparison."""
+    text = re.sub(r'[^\x20-\x7E\n\r\t]', ' ', text)
+    text = re.sub(r'(?:endobj|endstream|obj|stream|\/Type|\/FontDescriptor|\/XYZ|\/Page[s]?|\/Catalog|\/Outlines|\/StructTreeRoot|\/MarkInfo|\/Metadata|\/PieceInfo|\/LastModified|\/Creator|\/Producer|\/CreationDate|\/ModDate|\/OpenAction|\/AcroForm|\/Filter|\/Subtype|\/Length\d*|\/Width|\/Height|\/ColorSpace|\/BitsPerComponent|\/Filter|\/DecodeParms|\/ASCIIHexDecode|\/FlateDecode|\/DCTDecode|\/JPXDecode|\/CCITTFaxDecode|\/JBIG2Decode|xref|trailer|startxref|%%EOF)', ' ', text, flags=re.IGNORECASE)
+    text = re.sub(r'\<\<.*?\>\>', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def make_samples(megabytes, workdir):
+    pages = make_paragraphs(max(1, int(megabytes * 2**20 / 4200)), 700)
+
+    pdf_path = os.path.join(workdir, "sample.pdf")
+    write_pdf(pdf_path, pages)
+    pdf_text = "\n".join(page.extract_text() for page in pypdf.PdfReader(pdf_path).pages)
+
+    docx_path = os.path.join(workdir, "sample.docx")
+    write_docx(docx_path, [f"{page} {MULTILINGUAL[i % len(MULTILINGUAL)]}" for i, page in enumerate(pages)])
+    docx_text = docx2txt.process(docx_path)
+
+    txt_path = os.path.join(workdir, "sample.txt")
+    with open(txt_path, "w", encoding="utf-8", newline="") as f:
+        # Windows line endings and stray control characters, as in text exported from other tools
+        f.write("\r\n\r\n".join(f"{page}\x07\r\n{' '.join(MULTILINGUAL)}" for page in pages))
+    with open(txt_path, "r", encoding="utf-8", errors="ignore") as f:
+        txt_text = f.read()
+
+    return {"pdf": pdf_text, "docx": docx_text, "txt": txt_text}
+
+
+def best_time(function, text, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    samples = make_samples(args.megabytes, tempfile.mkdtemp(prefix="clean-bench-"))
+    print(f"UNICODE_HANDLING={UNICODE_HANDLING}")
+    for name, text in samples.items():
+        megabytes = len(text.encode("utf-8")) / 2**20
+        non_ascii = sum(not c.isascii() for c in text)
+        print(f"{name}: {megabytes:.1f} MB extracted, {non_ascii} non-ASCII characters")
+        # DOCX text is cleaned without the PDF-syntax pass, as extract_text_from_docx does
+        clean = lambda t: clean_text(t, pdf_syntax=name != "docx")
+        for label, function in (("legacy", legacy_clean_text), ("clean", clean)):
+            seconds, cleaned = best_time(function, text, args.repeats)
+            kept = sum(not c.isascii() for c in cleaned)
+            print(f"  {label:>6}: {megabytes / seconds:7.1f} MB/s  {seconds * 1000:7.1f} ms  {kept} non-ASCII kept")
+
+
+if __name__ == "__main__":
+    main()
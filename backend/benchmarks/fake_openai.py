@@ -0,0 +1,155 @@
+"""
+Local stand-in for the OpenAI API, for benchmarks and manual testing without network access or cost.
+
+Serves the two endpoints the backend uses:
+
+    POST /v1/embeddings         deterministic pseudo-random vectors per input text
+    POST /v1/chat/completions   a canned answer, streamed token by token when stream=true
+
+Latencies are configurable so time-to-first-token and streaming behaviour
+can be measured, and a fraction of requests can be failed (from a seeded
+generator, so runs are repeatable) to exercise retries and fallbacks.
+GET /v1/fake/stats returns request and error counts per endpoint. Point the
+backend at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake uvicorn app:app
+
+Usage (from the backend directory):
+    python -m benchmarks.fake_openai --port 8100 --first-token-ms 400 --token-ms 15 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DIMENSIONS = 1536
+
+settings = {
+    "embedding_ms": 20.0,
+    "first_token_ms": 400.0,
+    "token_ms": 15.0,
+    "tokens": 120,
+    "error_rate": 0.0,
+    "error_status": 500,
+}
+
+failures = random.Random(0)
+counts = Counter()
+
+app = FastAPI(title="Fake OpenAI API")
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIMENSIONS, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def injected_error(endpoint):
+    """An OpenAI-style error response for error_rate of the requests, else None."""
+    counts[f"{endpoint}_requests"] += 1
+    if failures.random() >= settings["error_rate"]:
+        return None
+    counts[f"{endpoint}_errors"] += 1
+    return JSONResponse({"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+                        status_code=settings["error_status"])
+
+
+def answer_tokens():
+    words = ("Based on the provided context, the answer involves several relevant details "
+             "drawn from the uploaded documents.").split()
+    return [(" " if i else "") + words[i % len(words)] for i in range(settings["tokens"])]
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    error = injected_error("embeddings")
+    if error is not None:
+        return error
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(settings["embedding_ms"] / 1000)
+    data = []
+    for i, text in enumerate(inputs):
+        vector = fake_vector(text if isinstance(text, str) else json.dumps(text))
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+    return {"object": "list", "data": data, "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    error = injected_error("chat")
+    if error is not None:
+        return error
+    model = body.get("model", "fake")
+    tokens = answer_tokens()
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep((settings["first_token_ms"] + settings["token_ms"] * len(tokens)) / 1000)
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        }
+
+    async def stream():
+        def chunk(delta, finish_reason=None):
+            payload = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        await asyncio.sleep(settings["first_token_ms"] / 1000)
+        yield chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(settings["token_ms"] / 1000)
+            yield chunk({"content": token})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/v1/fake/stats")
+async def fake_stats():
+    return dict(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embedding-ms", type=float, default=settings["embedding_ms"])
+    parser.add_argument("--first-token-ms", type=float, default=settings["first_token_ms"])
+    parser.add_argument("--token-ms", type=float, default=settings["token_ms"])
+    parser.add_argument("--tokens", type=int, default=settings["tokens"], help="tokens per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of failed requests, e.g. 429")
+    parser.add_argument("--seed", type=int, default=0, help="seed for choosing which requests fail")
+    args = parser.parse_args()
+    settings.update(embedding_ms=args.embedding_ms, first_token_ms=args.first_token_ms,
+                    token_ms=args.token_ms, tokens=args.tokens, error_rate=args.error_rate,
+                    error_status=args.error_status)
+    failures.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
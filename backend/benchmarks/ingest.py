@@ -0,0 +1,94 @@
+"""
+Ingest benchmark: time to store chunks + vectors, per 1k chunks.
+
+Compares the old per-chunk path (one commit and one FAISS add per chunk)
+with the bulk path in index.store_chunks. Runs against a throwaway
+SQLite database and FAISS index in a temp directory, with random vectors,
+so no embeddings API calls are made.
+
+Usage (from the backend directory):
+    python -m benchmarks.ingest --chunks 2000 --docs 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_store(index_module, doc_id, chunks, embeddings):
+    """The original add_document storage loop, kept here for comparison."""
+    from sqlmodel import Session
+    from models import Chunk, engine
+
+    with Session(engine) as session:
+        for chunk_text_content, embedding_vector in zip(chunks, embeddings):
+            chunk = Chunk(doc_id=doc_id, text=chunk_text_content)
+            session.add(chunk)
+            session.commit()
+            session.refresh(chunk)
+
+            vector = np.array([embedding_vector], dtype=np.float32)
+            index_module.index.add(vector)
+            index_module.id_map.append([chunk.id])
+            # Kept in step with id_map, which the bulk variant's store_chunks relies on
+            index_module.id_docs.append([doc_id])
+
+
+def run(store, index_module, n_chunks, n_docs, dim):
+    from sqlmodel import Session
+    from models import Document, engine
+
+    rng = np.random.default_rng(0)
+    chunks = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 20 for i in range(n_chunks)]
+    embeddings = rng.standard_normal((n_chunks, dim), dtype=np.float32).tolist()
+
+    timings = []
+    for _ in range(n_docs):
+        with Session(engine) as session:
+            document = Document(name="bench.txt", mime_type="text/plain")
+            session.add(document)
+            session.commit()
+            session.refresh(document)
+            doc_id = document.id
+
+        start = time.perf_counter()
+        store(index_module, doc_id, chunks, embeddings)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks per document")
+    parser.add_argument("--docs", type=int, default=3, help="documents ingested per variant")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ingest-bench-")
+    os.chdir(workdir)
+    os.environ["FAISS_INDEX_PATH"] = os.path.join(workdir, ".faiss")
+    sys.path.insert(0, BACKEND_DIR)
+
+    import index as index_module
+    from models import create_db_and_tables
+
+    create_db_and_tables()
+    dim = index_module.EMBEDDING_DIMENSIONS
+
+    variants = {
+        "per-chunk": legacy_store,
+        "bulk": lambda module, doc_id, chunks, embeddings: module.store_chunks(doc_id, chunks, embeddings),
+    }
+    for name, store in variants.items():
+        timings = run(store, index_module, args.chunks, args.docs, dim)
+        per_1k = [t / args.chunks * 1000 for t in timings]
+        print(f"{name:>10}: {np.median(per_1k) * 1000:9.1f} ms per 1k chunks "
+              f"(median of {args.docs}, {args.chunks} chunks/doc)")
+
+
+if __name__ == "__main__":
+    main()
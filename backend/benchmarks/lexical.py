@@ -0,0 +1,96 @@
+"""
+Benchmark: BM25 inverted index build rate, posting list size and query latency.
+
+Indexes a synthetic corpus with a Zipf-like word distribution (plus a few
+rare identifiers) into lexical.BM25Index, then reports index build rate,
+bytes per posting against a plain (int32 entry, int32 frequency) layout,
+save/load time, and query latency for lexical search next to a flat FAISS
+search of the same number of vectors.
+
+Usage (from the backend directory):
+    python -m benchmarks.lexical --chunks 50000 --words-per-chunk 300
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from lexical import BM25Index
+
+
+def make_corpus(n_chunks, words_per_chunk, vocabulary, rng):
+    # Zipf-like ranks: a few very common words and a long tail of rare ones
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    words = rng.choice(vocabulary, size=(n_chunks, words_per_chunk), p=weights / weights.sum())
+    texts = [" ".join(f"w{word}" for word in row) for row in words]
+    for i in range(0, n_chunks, 97):
+        texts[i] += f" part number PN-{i:06d}-X"
+    return texts
+
+
+def percentiles(timings):
+    timings = np.array(timings) * 1000
+    return f"p50 {np.percentile(timings, 50):6.2f} ms  p99 {np.percentile(timings, 99):6.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--words-per-chunk", type=int, default=300)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts = make_corpus(args.chunks, args.words_per_chunk, args.vocabulary, rng)
+    workdir = tempfile.mkdtemp(prefix="lexical-bench-")
+    lexical_index = BM25Index(os.path.join(workdir, "lexical.npz"))
+
+    start = time.perf_counter()
+    for first in range(0, args.chunks, 100):
+        batch = texts[first:first + 100]
+        lexical_index.add(range(first, first + len(batch)), [first // 100] * len(batch), batch)
+    build_seconds = time.perf_counter() - start
+    stats = lexical_index.stats()
+    postings = sum(len(lexical_index._decode(term_id)[0]) for term_id in range(stats["terms"]))
+    print(f"Indexed {args.chunks} chunks in {build_seconds:.2f} s ({args.chunks / build_seconds:,.0f} chunks/s)")
+    print(f"{stats['terms']} terms, {postings} postings: {stats['postings_bytes'] / 2**20:.1f} MB "
+          f"({stats['postings_bytes'] / postings:.2f} bytes/posting vs 8 for int32 pairs)")
+
+    start = time.perf_counter()
+    lexical_index.save()
+    save_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    BM25Index(lexical_index.path).load()
+    print(f"Save {save_seconds:.2f} s, load {time.perf_counter() - start:.2f} s, "
+          f"{os.path.getsize(lexical_index.path) / 2**20:.1f} MB on disk")
+
+    queries = [" ".join(f"w{word}" for word in rng.integers(0, 2000, size=4)) for _ in range(args.queries)]
+    queries += [f"What is part PN-{i:06d}-X?" for i in range(0, args.chunks, 97)][:args.queries]
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        lexical_index.search(query, 20)
+        timings.append(time.perf_counter() - start)
+    print(f"Lexical search: {percentiles(timings)}")
+
+    hits = sum(lexical_index.search(f"PN-{i:06d}-X", 1)[0][0] == i for i in range(0, args.chunks, 97))
+    print(f"Exact identifier queries answered by the right chunk: {hits} of {len(range(0, args.chunks, 97))}")
+
+    vectors = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+    vector_index = faiss.IndexFlatL2(args.dim)
+    vector_index.add(vectors)
+    timings = []
+    for i in range(min(args.queries, 100)):
+        start = time.perf_counter()
+        vector_index.search(vectors[i:i + 1], 20)
+        timings.append(time.perf_counter() - start)
+    print(f"Flat vector search (excluding the embedding call): {percentiles(timings)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: PDF extraction and chunking time and peak memory, whole-document vs page-streaming.
+
+Writes a synthetic PDF, then runs each mode in a fresh subprocess and
+reports wall time and the peak RSS of the process (and of its extraction
+workers):
+
+    legacy     the original extractor: text += page_text for every page,
+               regexes over the whole string, then the original
+               sentence-based chunk_text on all of it
+    streaming  extract.iter_pages over the process pool feeding a
+               PageChunker, with chunks dropped batch by batch as if stored
+
+No embeddings are computed.
+
+Usage (from the backend directory):
+    python -m benchmarks.pdf_extract --pages 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_paragraphs, write_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_clean_text(text):
+    """The original clean_text, kept here for comparison."""
+    text = re.sub(r'[^\x20-\x7E\n\r\t]', ' ', text)
+    text = re.sub(r'(?:endobj|endstream|obj|stream|\/Type|\/FontDescriptor|\/XYZ|\/Page[s]?|\/Catalog|\/Outlines|\/StructTreeRoot|\/MarkInfo|\/Metadata|\/PieceInfo|\/LastModified|\/Creator|\/Producer|\/CreationDate|\/ModDate|\/OpenAction|\/AcroForm|\/Filter|\/Subtype|\/Length\d*|\/Width|\/Height|\/ColorSpace|\/BitsPerComponent|\/Filter|\/DecodeParms|\/ASCIIHexDecode|\/FlateDecode|\/DCTDecode|\/JPXDecode|\/CCITTFaxDecode|\/JBIG2Decode|xref|trailer|startxref|%%EOF)', ' ', text, flags=re.IGNORECASE)
+    text = re.sub(r'\<\<.*?\>\>', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_extract(file_path):
+    """The original extract_text_from_pdf loop, kept here for comparison."""
+    import pypdf
+
+    text = ""
+    with open(file_path, "rb") as f:
+        pdf = pypdf.PdfReader(f)
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+    return legacy_clean_text(text)
+
+
+def run_legacy(file_path):
+    # Frozen copy of the sentence-based chunker the token-window one replaced
+    from benchmarks.chunking import legacy_chunk_text
+
+    chunks = legacy_chunk_text(legacy_extract(file_path))
+    return len(chunks)
+
+
+async def run_streaming(file_path, batch_chunks):
+    from concurrency import run_in_thread, start_pools, shutdown_pools
+    from chunking import PageChunker
+    from extract import iter_pages
+
+    start_pools()
+    chunker = PageChunker()
+    pending, total = [], 0
+    async for page, text in iter_pages(file_path, "benchmark.pdf"):
+        pending += await run_in_thread(chunker.feed, text, page)
+        if len(pending) >= batch_chunks:
+            total += len(pending)
+            pending = []
+    total += len(pending) + len(chunker.finish())
+    shutdown_pools()
+    return total
+
+
+def child(mode, file_path, batch_chunks):
+    start = time.perf_counter()
+    if mode == "legacy":
+        chunks = run_legacy(file_path)
+    else:
+        chunks = asyncio.run(run_streaming(file_path, batch_chunks))
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    workers_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({"chunks": chunks, "seconds": seconds, "peak_mb": peak_kb / 1024, "worker_peak_mb": workers_kb / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--words-per-page", type=int, default=600)
+    parser.add_argument("--batch-chunks", type=int, default=256)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.batch_chunks)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="pdf-bench-")
+    path = os.path.join(workdir, "synthetic.pdf")
+    write_pdf(path, make_paragraphs(args.pages, args.words_per_page))
+    print(f"{args.pages}-page PDF, {os.path.getsize(path) / 2**20:.1f} MB")
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])))
+    for mode in ("legacy", "streaming"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.pdf_extract", "--child", mode, path,
+                                 "--batch-chunks", str(args.batch_chunks)],
+                                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(next(line for line in output.splitlines() if line.startswith("{")))
+        print(f"{mode:>10}: {result['seconds']:6.2f} s  {result['chunks']} chunks  "
+              f"peak RSS {result['peak_mb']:6.1f} MB (largest worker {result['worker_peak_mb']:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: index memory footprint against recall@4, with and without exact re-ranking.
+
+Builds flat, sq_fp16, sq_int8 and ivf_pq indexes over the same synthetic
+corpus (Gaussian clusters, as in ann_recall) and for each reports the index
+size in memory, then recall@k and p50 latency with FAISS_RERANK_FACTOR set
+to each value in --rerank-factors. A factor of 1 uses the quantized
+distances as they are; larger factors over-fetch candidates and re-rank them
+against full-precision vectors read from a memory-mapped VectorStore file,
+which lives on disk and in the page cache rather than in process memory.
+
+Usage (from the backend directory):
+    python -m benchmarks.quantization --vectors 50000 --dim 1536
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+import ann
+from benchmarks.ann_recall import recall_at_k, synthetic_corpus
+from vector_store import VectorStore
+
+
+def search(index, store, queries, k, factor):
+    """Search one query at a time, as the API does, re-ranking like index.search_vectors_batch."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        query = queries[i:i + 1]
+        start = time.perf_counter()
+        _, found = index.search(query, k * factor)
+        if factor > 1:
+            candidates = found[0][found[0] >= 0]
+            distances = ((store.get(candidates) - query) ** 2).sum(axis=1)
+            found = candidates[np.argsort(distances, kind="stable")[:k]].reshape(1, -1)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        ids[i] = found[0][:k]
+    return ids, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200, help="clusters in the synthetic corpus")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", default="flat,sq_fp16,sq_int8,ivf_pq", help="comma separated index types")
+    parser.add_argument("--rerank-factors", default="1,2,4,8", help="comma separated over-fetch factors")
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    ann.IVF_NLIST = args.nlist
+    ann.IVF_NPROBE = args.nprobe
+    faiss.omp_set_num_threads(1)  # Per-query latency, not throughput
+
+    print(f"Corpus: {args.vectors} x {args.dim}, {args.queries} queries, k={args.k}")
+    corpus, queries = synthetic_corpus(args.vectors, args.queries, args.dim, args.clusters)
+    truth = ann.build_index("flat", corpus).search(queries, args.k)[1]
+
+    store = VectorStore(os.path.join(tempfile.mkdtemp(prefix="quantization-bench-"), "bench.vectors"), args.dim)
+    store.open(0)
+    store.append(corpus)
+    print(f"Full-precision vectors on disk for re-ranking: {store.nbytes / 2**20:.1f} MB")
+
+    print(f"{'index':<9} {'MB in RAM':>10} {'bytes/vec':>10} {'rerank':>7} {'recall@k':>9} {'p50 ms':>8}")
+    for index_type in args.types.split(","):
+        index = ann.build_index(index_type, corpus)
+        size = faiss.serialize_index(index).nbytes
+        factors = [1] if not ann.is_quantized(index_type) else [int(f) for f in args.rerank_factors.split(",")]
+        for factor in factors:
+            found, latencies = search(index, store, queries, args.k, factor)
+            print(f"{index_type:<9} {size / 2**20:10.1f} {size / args.vectors:10.0f} {factor:>6}x "
+                  f"{recall_at_k(found, truth):9.3f} {np.percentile(latencies, 50):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: answering many questions one /query at a time versus one /query/batch.
+
+Two parts:
+
+    search    FAISS alone: n single-vector searches against one n x d search
+              over a flat index of synthetic vectors, in queries/s
+    end to end
+              starts the fake OpenAI server and the backend (as query_ttfb
+              does), uploads a document, then asks the same questions through
+              sequential /query calls and through a single /query/batch call
+
+The answer cache is off so every question is embedded, searched and answered.
+
+Usage (from the backend directory):
+    python -m benchmarks.query_batch --questions 200 --vectors 50000
+"""
+import argparse
+import tempfile
+import time
+
+import faiss
+import httpx
+import numpy as np
+
+from benchmarks.query_ttfb import start_servers, upload, wait_until_up
+
+
+def search_throughput(vectors, questions, dim, k):
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.standard_normal((vectors, dim), dtype=np.float32))
+    queries = rng.standard_normal((questions, dim), dtype=np.float32)
+
+    start = time.perf_counter()
+    for i in range(questions):
+        index.search(queries[i:i + 1], k)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.search(queries, k)
+    batched = time.perf_counter() - start
+
+    print(f"FAISS flat, {vectors} x {dim}, {questions} queries")
+    print(f"{'one by one':>14}: {questions / single:9.0f} queries/s")
+    print(f"{'n x d matrix':>14}: {questions / batched:9.0f} queries/s  ({single / batched:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--vectors", type=int, default=50000, help="index size for the search part")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=8766)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    search_throughput(args.vectors, args.questions, args.dim, args.k)
+
+    workdir = tempfile.mkdtemp(prefix="batch-bench-")
+    base_url = f"http://127.0.0.1:{args.port}"
+    processes = start_servers(args, workdir)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/docs")
+        wait_until_up(f"{base_url}/documents")
+        upload(base_url, workdir)
+
+        questions = [f"What does policy number {i * 7} say?" for i in range(args.questions)]
+        with httpx.Client(timeout=600) as client:
+            start = time.perf_counter()
+            for question in questions:
+                client.post(f"{base_url}/query", json={"question": question}).raise_for_status()
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            response = client.post(f"{base_url}/query/batch", json={"questions": questions})
+            response.raise_for_status()
+            batched = time.perf_counter() - start
+        answered = len(response.json()["results"])
+
+        print(f"End to end, {args.questions} questions")
+        print(f"{'/query':>14}: {single:7.2f} s  {args.questions / single:7.1f} questions/s")
+        print(f"{'/query/batch':>14}: {batched:7.2f} s  {answered / batched:7.1f} questions/s  "
+              f"({single / batched:.1f}x)")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark: time to first byte of /query versus /query/stream.
+
+Starts the fake OpenAI server and the backend (uvicorn) against a throwaway
+database and index, uploads a document, then asks the same questions through
+both endpoints. /query only responds once the whole completion is done;
+/query/stream sends the sources right after retrieval and then forwards
+tokens as they arrive.
+
+Usage (from the backend directory):
+    python -m benchmarks.query_ttfb --queries 20 --first-token-ms 400 --token-ms 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout} s")
+
+
+def start_servers(args, workdir):
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])),
+               OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1", OPENAI_API_KEY="fake",
+               FAISS_INDEX_PATH=os.path.join(workdir, ".faiss"), ANSWER_CACHE_MAX_ENTRIES="0")
+    fake = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+                             "--first-token-ms", str(args.first_token_ms), "--token-ms", str(args.token_ms),
+                             "--tokens", str(args.tokens)], cwd=BACKEND_DIR, env=env)
+    backend = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port),
+                                "--log-level", "warning"], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL)
+    return [fake, backend]
+
+
+def upload(base_url, workdir):
+    path = os.path.join(workdir, "handbook.txt")
+    with open(path, "w") as f:
+        f.write(" ".join(f"Section {i} of the handbook describes policy number {i} in detail." for i in range(2000)))
+    with open(path, "rb") as f:
+        job = httpx.post(f"{base_url}/documents", files={"file": ("handbook.txt", f, "text/plain")}).json()
+    while job["status"] not in ("done", "failed"):
+        time.sleep(0.2)
+        job = httpx.get(f"{base_url}/jobs/{job['job_id']}").json()
+    if job["status"] == "failed":
+        raise RuntimeError(f"Upload failed: {job['error']}")
+
+
+def time_query(client, url, question):
+    """Return (seconds to first body byte, seconds to first answer token, total seconds)."""
+    start = time.perf_counter()
+    first_byte = first_token = None
+    with client.stream("POST", url, json={"question": question}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            now = time.perf_counter() - start
+            if first_byte is None:
+                first_byte = now
+            if first_token is None and (line.startswith("event: token") or '"answer"' in line):
+                first_token = now
+    return first_byte, first_token, time.perf_counter() - start
+
+
+def report(name, timings):
+    timings = np.array(timings) * 1000
+    print(f"{name:>14}: first byte p50 {np.percentile(timings[:, 0], 50):7.1f} ms  "
+          f"first token p50 {np.percentile(timings[:, 1], 50):7.1f} ms  "
+          f"total p50 {np.percentile(timings[:, 2], 50):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=8766)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ttfb-bench-")
+    base_url = f"http://127.0.0.1:{args.port}"
+    processes = start_servers(args, workdir)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/docs")
+        wait_until_up(f"{base_url}/documents")
+        upload(base_url, workdir)
+
+        questions = [f"What does policy number {i * 7} say?" for i in range(args.queries)]
+        with httpx.Client(timeout=60) as client:
+            blocking = [time_query(client, f"{base_url}/query", q) for q in questions]
+            streaming = [time_query(client, f"{base_url}/query/stream", q) for q in questions]
+        report("/query", blocking)
+        report("/query/stream", streaming)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Load test: query latency while large uploads are being ingested.
+
+Runs index.search() in a closed loop from several concurrent clients, first
+on an idle server and then while large text documents are uploaded through
+index.add_document(). With parsing, chunking, FAISS and SQLite work kept off
+the event loop, query p99 should stay roughly flat between the two phases.
+
+The embeddings API is replaced by an in-process fake with configurable
+latency, and everything runs against a throwaway database and index.
+
+Usage (from the backend directory):
+    python -m benchmarks.query_under_upload --seed-vectors 50000 --uploads 4
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fake_vectors(texts, dim):
+    seed = int.from_bytes(hashlib.sha256("".join(texts).encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal((len(texts), dim), dtype=np.float32)
+
+
+async def query_loop(index_module, stop, latencies, client_id):
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await index_module.search(f"client {client_id} question {i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+
+
+async def loop_lag(stop, lags, interval=0.01):
+    """Measure how late the event loop wakes up; large values mean something blocked it."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run_phase(index_module, clients, seconds, background=None):
+    stop = asyncio.Event()
+    latencies = []
+    lags = []
+    tasks = [asyncio.create_task(query_loop(index_module, stop, latencies, c)) for c in range(clients)]
+    tasks.append(asyncio.create_task(loop_lag(stop, lags)))
+    if background is not None:
+        await background
+    else:
+        await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return np.array(latencies), np.array(lags)
+
+
+def report(name, latencies, lags):
+    print(f"{name:>16}: {len(latencies):6d} queries  p50 {np.percentile(latencies, 50):8.2f} ms  "
+          f"p99 {np.percentile(latencies, 99):8.2f} ms  max {latencies.max():8.2f} ms  "
+          f"max loop stall {lags.max():7.2f} ms")
+
+
+async def main_async(args, workdir):
+    import embeddings
+    import index as index_module
+    from concurrency import start_pools, shutdown_pools
+    from models import create_db_and_tables
+
+    create_db_and_tables()
+    start_pools()
+    dim = index_module.EMBEDDING_DIMENSIONS
+
+    async def fake_request_embeddings(texts):
+        await asyncio.sleep(args.embed_latency / 1000)
+        # A real API computes vectors elsewhere, so keep the fake's CPU work off the loop
+        return list(await asyncio.to_thread(fake_vectors, texts, dim))
+
+    embeddings.request_embeddings = fake_request_embeddings
+
+    # Seed the index so searches do real work
+    rng = np.random.default_rng(0)
+    doc_id = index_module.create_document("seed.txt", "text/plain")
+    for start in range(0, args.seed_vectors, 10000):
+        n = min(10000, args.seed_vectors - start)
+        index_module.store_chunks(doc_id, [f"seed {start + i}" for i in range(n)],
+                                  rng.standard_normal((n, dim), dtype=np.float32))
+
+    paths = []
+    sentence = "The quarterly report covers revenue, margins and the outlook for part number AX-{}. "
+    for u in range(args.uploads):
+        path = os.path.join(workdir, f"upload{u}.txt")
+        with open(path, "w") as f:
+            f.write("".join(sentence.format(i) for i in range(args.upload_sentences)))
+        paths.append(path)
+
+    async def uploads():
+        await asyncio.gather(*(index_module.add_document(path, os.path.basename(path)) for path in paths))
+
+    idle = await run_phase(index_module, args.clients, args.seconds)
+    start = time.perf_counter()
+    busy = await run_phase(index_module, args.clients, args.seconds, background=uploads())
+    upload_seconds = time.perf_counter() - start
+
+    report("idle", *idle)
+    report("during uploads", *busy)
+    print(f"{args.uploads} uploads of {args.upload_sentences} sentences took {upload_seconds:.1f} s")
+    shutdown_pools()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed-vectors", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent query clients")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of the idle phase")
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--upload-sentences", type=int, default=50000, help="sentences per uploaded document")
+    parser.add_argument("--embed-latency", type=float, default=20, help="fake embeddings latency in ms")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    os.chdir(workdir)
+    os.environ["FAISS_INDEX_PATH"] = os.path.join(workdir, ".faiss")
+    os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = "0"
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(main_async(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: scatter-gather search over 1, 2, 4... shard server processes.
+
+For each shard count, starts that many shard_server.py processes on this
+machine, spreads the same synthetic documents across them with ShardSet
+(as the API server does on upload), then runs concurrent searches through
+ShardSet.search and reports queries/s and latency. Every merged result is
+checked against one flat index holding all vectors, so sharding must not
+change what a query returns.
+
+Shards only help when there are cores (or machines) for them to run on:
+on a machine with fewer cores than shards, the processes take turns and
+the fan-out and merge are pure overhead.
+
+Usage (from the backend directory):
+    python -m benchmarks.shards --shards 1,2,4 --vectors 200000 --queries 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import httpx
+import numpy as np
+
+from shards import ShardSet
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_shards(count, base_port, workdir):
+    env = dict(os.environ, FAISS_INDEX_PATH=os.path.join(workdir, ".faiss"), FAISS_MMAP="0")
+    processes = [subprocess.Popen([sys.executable, "shard_server.py", "--shard", str(shard),
+                                   "--port", str(base_port + shard)],
+                                  cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                 for shard in range(count)]
+    urls = [f"http://127.0.0.1:{base_port + shard}" for shard in range(count)]
+    for url in urls:
+        for _ in range(300):
+            try:
+                httpx.get(f"{url}/stats")
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+    return processes, urls
+
+
+async def run_queries(shard_set, queries, k, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(row):
+        async with semaphore:
+            start = time.perf_counter()
+            hits, _ = await shard_set.search(queries[row:row + 1], k)
+            latencies.append(time.perf_counter() - start)
+            return hits[0]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(row) for row in range(len(queries))))
+    elapsed = time.perf_counter() - start
+    await shard_set.aclose()
+    return results, elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", default="1,2,4", help="comma-separated shard counts to try")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    # Chunk IDs are the row numbers, so the reference index needs no id map
+    documents = np.array_split(np.arange(args.vectors), args.documents)
+    reference = faiss.IndexFlatL2(args.dim)
+    reference.add(vectors)
+    expected = reference.search(queries, args.k)[1].tolist()
+
+    print(f"{args.vectors} x {args.dim} vectors in {args.documents} documents, {args.queries} queries, "
+          f"{args.concurrency} concurrent, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6} {'load s':>8} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8}  same results")
+    for count in [int(count) for count in args.shards.split(",")]:
+        workdir = tempfile.mkdtemp(prefix="shard-bench-")
+        processes, urls = start_shards(count, args.port, workdir)
+        try:
+            shard_set = ShardSet(urls)
+            start = time.perf_counter()
+            for doc_id, rows in enumerate(documents, start=1):
+                shard_set.add(doc_id, rows, vectors[rows])
+            load = time.perf_counter() - start
+
+            results, elapsed, latencies = asyncio.run(run_queries(shard_set, queries, args.k, args.concurrency))
+            same = all([chunk_id for chunk_id, _ in hits] == row for hits, row in zip(results, expected))
+            latencies.sort()
+            print(f"{count:>6} {load:8.1f} {args.queries / elapsed:10.1f} "
+                  f"{statistics.median(latencies) * 1000:8.1f} {latencies[int(len(latencies) * 0.95)] * 1000:8.1f}  "
+                  f"{'yes' if same else 'NO'}")
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: index load time and memory per worker process.
+
+Builds a synthetic snapshot, then starts several worker processes that each
+import the index module the way a uvicorn worker does, in three modes:
+
+    legacy   the old .index + JSON .map snapshot, read fully into memory
+    read     the generation snapshot, read fully into memory (FAISS_MMAP=0)
+    mmap     the generation snapshot, memory-mapped (FAISS_MMAP=1)
+
+For each mode it reports load time and the workers' private (RssAnon) and
+file-backed (RssFile) resident memory. Mapped pages are file-backed and shared
+through the page cache, so RssAnon per worker should drop to roughly the
+interpreter's baseline in mmap mode.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --vectors 200000 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+import index
+elapsed = time.perf_counter() - start
+status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+kb = lambda key: int(status[key].split()[0])
+print(json.dumps({"seconds": elapsed, "ntotal": index.index.ntotal,
+                  "rss_anon_mb": kb("RssAnon") / 1024, "rss_file_mb": kb("RssFile") / 1024}))
+sys.stdout.flush()
+# Stay alive until every worker has loaded, as uvicorn workers would
+sys.stdin.read()
+"""
+
+
+def build_snapshots(workdir, vectors, index_type):
+    os.environ["FAISS_INDEX_PATH"] = os.path.join(workdir, "snapshot")
+    os.environ["FAISS_INDEX_TYPE"] = index_type
+    sys.path.insert(0, BACKEND_DIR)
+    import faiss
+    import index
+
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((vectors, index.EMBEDDING_DIMENSIONS), dtype=np.float32)
+    built = index.ann.build_index(index_type, data)
+    index.index = built
+    index.id_map = index.IdArray(np.arange(vectors, dtype=np.int64))
+    index.id_docs = index.IdArray(np.zeros(vectors, dtype=np.int64))
+    index.save_index()
+
+    legacy = os.path.join(workdir, "legacy")
+    faiss.write_index(built, f"{legacy}.index")
+    with open(f"{legacy}.map", "w") as f:
+        json.dump({str(i): i for i in range(vectors)}, f)
+    return os.environ["FAISS_INDEX_PATH"], legacy
+
+
+def run_mode(workdir, index_path, mmap, workers):
+    env = dict(os.environ, FAISS_INDEX_PATH=index_path, FAISS_MMAP="1" if mmap else "0",
+               PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])))
+    procs = [subprocess.Popen([sys.executable, "-c", WORKER], cwd=workdir, env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+             for _ in range(workers)]
+    results = []
+    for proc in procs:
+        # Skip the index module's own load messages
+        line = proc.stdout.readline()
+        while not line.startswith("{"):
+            line = proc.stdout.readline()
+        results.append(json.loads(line))
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--index-type", default="flat")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-bench-")
+    os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = "0"
+    snapshot, legacy = build_snapshots(workdir, args.vectors, args.index_type)
+
+    print(f"{args.vectors} vectors, {args.index_type}, {args.workers} workers")
+    for mode, path, mmap in [("legacy", legacy, False), ("read", snapshot, False), ("mmap", snapshot, True)]:
+        results = run_mode(workdir, path, mmap, args.workers)
+        load = [r["seconds"] * 1000 for r in results]
+        anon = sum(r["rss_anon_mb"] for r in results)
+        file_backed = sum(r["rss_file_mb"] for r in results)
+        print(f"{mode:>8}: load p50 {np.percentile(load, 50):8.1f} ms  max {max(load):8.1f} ms  "
+              f"RssAnon total {anon:8.1f} MB  RssFile total {file_backed:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
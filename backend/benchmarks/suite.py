@@ -0,0 +1,310 @@
+"""
+Benchmark suite: end-to-end scenarios against the backend and the fake OpenAI server, with JSON results.
+
+Starts benchmarks.fake_openai and the backend (uvicorn) against a throwaway
+database and index, then runs the selected scenarios:
+
+    ingest    upload a synthetic PDF/DOCX/TXT corpus and wait for every job
+    query     closed-loop /query load from concurrent clients
+    scoped    the same load with doc_ids restricted to a few documents
+    startup   load time and memory of worker processes over a large
+              synthetic index, read into memory and memory-mapped
+
+The query scenarios ingest the corpus first even when ingest itself is not
+selected. Corpus, questions, fake vectors and injected errors are all
+seeded, so two runs differ only by the code under test. The caches are off,
+so every question is embedded and answered.
+
+Results are written as JSON with the git commit, the settings, each
+scenario's numbers and, for the HTTP scenarios, the time the backend spent
+per stage (from /metrics). --compare prints the change against an earlier
+results file.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --scenarios query,scoped --error-rate 0.02 --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+from benchmarks.query_ttfb import wait_until_up
+from benchmarks.synthetic import write_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("ingest", "query", "scoped", "startup")
+
+
+def git_commit():
+    def git(*command):
+        return subprocess.run(["git", *command], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def start_servers(args, workdir):
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])),
+               OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1", OPENAI_API_KEY="fake",
+               FAISS_INDEX_PATH=os.path.join(workdir, ".faiss"), FAISS_INDEX_TYPE=args.index_type,
+               ANSWER_CACHE_MAX_ENTRIES="0",
+               EMBEDDING_CACHE_MAX_ENTRIES="0")
+    fake = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+                             "--embedding-ms", str(args.embedding_ms), "--first-token-ms", str(args.first_token_ms),
+                             "--token-ms", str(args.token_ms), "--tokens", str(args.tokens),
+                             "--error-rate", str(args.error_rate), "--seed", str(args.seed)],
+                            cwd=BACKEND_DIR, env=env)
+    backend = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port),
+                                "--log-level", "warning"], cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    return [fake, backend]
+
+
+def stage_totals(client, base_url):
+    """Seconds and span counts per stage, from the backend's /metrics."""
+    totals = {}
+    for line in client.get(f"{base_url}/metrics").text.splitlines():
+        for suffix, key in (("_sum", "seconds"), ("_count", "count")):
+            prefix = f"quickrag_stage_seconds{suffix}{{stage=\""
+            if line.startswith(prefix):
+                stage = line[len(prefix):line.index('"', len(prefix))]
+                totals.setdefault(stage, {})[key] = float(line.rsplit(" ", 1)[1])
+    return totals
+
+
+def stage_delta(before, after):
+    return {stage: {"seconds": round(values["seconds"] - before.get(stage, {}).get("seconds", 0.0), 6),
+                    "count": int(values["count"] - before.get(stage, {}).get("count", 0))}
+            for stage, values in sorted(after.items())
+            if values["count"] > before.get(stage, {}).get("count", 0)}
+
+
+def percentiles(latencies):
+    latencies = np.array(latencies) * 1000 if len(latencies) else np.zeros(1)
+    return {f"p{p}_ms": round(float(np.percentile(latencies, p)), 3) for p in (50, 95, 99)}
+
+
+def run_ingest(client, base_url, paths):
+    start = time.perf_counter()
+    jobs = []
+    for path in paths:
+        while True:
+            with open(path, "rb") as f:
+                response = client.post(f"{base_url}/documents", files={"file": (os.path.basename(path), f)})
+            if response.status_code != 503:
+                break
+            time.sleep(0.2)  # Ingestion queue full
+        response.raise_for_status()
+        jobs.append(response.json()["job_id"])
+    statuses = {}
+    while len(statuses) < len(jobs):
+        for job_id in jobs:
+            if job_id not in statuses:
+                job = client.get(f"{base_url}/jobs/{job_id}").json()
+                if job["status"] in ("done", "failed"):
+                    statuses[job_id] = job["status"]
+        time.sleep(0.05)
+    seconds = time.perf_counter() - start
+    megabytes = sum(os.path.getsize(path) for path in paths) / 2**20
+    vectors = client.get(f"{base_url}/stats").json()["index"]["vectors"]
+    return {
+        "documents": len(paths),
+        "failed": sum(status == "failed" for status in statuses.values()),
+        "megabytes": round(megabytes, 3),
+        "chunks": vectors,
+        "seconds": round(seconds, 3),
+        "documents_per_second": round(len(paths) / seconds, 3),
+        "megabytes_per_second": round(megabytes / seconds, 3),
+        "chunks_per_second": round(vectors / seconds, 3),
+    }
+
+
+async def run_query_load(base_url, clients, queries_per_client, seed, doc_ids=None):
+    rng = np.random.default_rng(seed)
+    latencies, errors = [], 0
+
+    async def client_loop(http, questions):
+        nonlocal errors
+        for question in questions:
+            body = {"question": question}
+            if doc_ids is not None:
+                body["doc_ids"] = doc_ids
+            start = time.perf_counter()
+            response = await http.post(f"{base_url}/query", json=body)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200 or response.json()["answer"].startswith("[Error")
+
+    questions = [[f"What does item {rng.integers(1000, 9999)} say about requests before the deadline?"
+                  for _ in range(queries_per_client)] for _ in range(clients)]
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(http, client_questions) for client_questions in questions))
+        seconds = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "queries": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "queries_per_second": round(len(latencies) / seconds, 3),
+        **percentiles(latencies),
+    }
+
+
+def run_startup(args, workdir):
+    # Builds the snapshot by importing the index module here, so it runs last
+    from benchmarks.startup import build_snapshots, run_mode
+    os.environ["EMBEDDING_CACHE_MAX_ENTRIES"] = "0"
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from models import create_db_and_tables
+    create_db_and_tables()
+    snapshot, _ = build_snapshots(workdir, args.startup_vectors, args.index_type)
+    results = {"vectors": args.startup_vectors, "index_type": args.index_type, "workers": args.workers}
+    for mode, mmap in (("read", False), ("mmap", True)):
+        workers = run_mode(workdir, snapshot, mmap, args.workers)
+        results[mode] = {
+            "load_p50_ms": round(float(np.percentile([w["seconds"] * 1000 for w in workers], 50)), 3),
+            "rss_anon_mb_total": round(sum(w["rss_anon_mb"] for w in workers), 1),
+            "rss_file_mb_total": round(sum(w["rss_file_mb"] for w in workers), 1),
+        }
+    return results
+
+
+def run_http_scenarios(args, scenarios, workdir):
+    results = {}
+    base_url = f"http://127.0.0.1:{args.port}"
+    paths = write_corpus(os.path.join(workdir, "corpus"), args.documents, args.pages, args.words_per_page,
+                         seed=args.seed)
+    processes = start_servers(args, workdir)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/docs")
+        wait_until_up(f"{base_url}/documents")
+        with httpx.Client(timeout=120) as client:
+            before = stage_totals(client, base_url)
+            ingest = run_ingest(client, base_url, paths)
+            if "ingest" in scenarios:
+                results["ingest"] = {**ingest, "stages": stage_delta(before, stage_totals(client, base_url))}
+                print(f"ingest: {ingest['documents']} documents, {ingest['chunks']} chunks in "
+                      f"{ingest['seconds']:.1f} s ({ingest['megabytes_per_second']:.2f} MB/s)")
+
+            doc_ids = sorted(document["id"] for document in client.get(f"{base_url}/documents").json())
+            scope = [int(doc_id) for doc_id in
+                     np.random.default_rng(args.seed).choice(doc_ids, min(args.scope, len(doc_ids)), replace=False)]
+            for name, scenario_doc_ids in (("query", None), ("scoped", scope)):
+                if name not in scenarios:
+                    continue
+                before = stage_totals(client, base_url)
+                load = asyncio.run(run_query_load(base_url, args.clients, args.queries, args.seed, scenario_doc_ids))
+                if scenario_doc_ids is not None:
+                    load["scope_documents"] = len(scenario_doc_ids)
+                results[name] = {**load, "stages": stage_delta(before, stage_totals(client, base_url))}
+                print(f"{name}: {load['queries_per_second']:.1f} queries/s  p50 {load['p50_ms']:.1f} ms  "
+                      f"p99 {load['p99_ms']:.1f} ms  {load['errors']} errors")
+
+            fake_stats = client.get(f"http://127.0.0.1:{args.fake_port}/v1/fake/stats").json()
+            results["fake_openai"] = fake_stats
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    return results
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline_path, results, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"Compared with {baseline_path} (commit {str(baseline.get('commit'))[:10]}):")
+    old, new = flatten(baseline["results"]), flatten(results)
+    for key in sorted(old.keys() & new.keys()):
+        if ".stages." in key or not old[key]:
+            continue
+        change = (new[key] - old[key]) / abs(old[key])
+        marker = "  <-" if abs(change) >= threshold else ""
+        print(f"  {key:<40} {old[key]:>12g} -> {new[key]:>12g}  {change:+7.1%}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, from " + ", ".join(SCENARIOS))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change marked in --compare output")
+    parser.add_argument("--seed", type=int, default=0)
+    # Corpus
+    parser.add_argument("--documents", type=int, default=30, help="documents, cycling through PDF, DOCX and TXT")
+    parser.add_argument("--pages", type=int, default=20, help="pages per document")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    # Query load
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=20, help="queries per client")
+    parser.add_argument("--scope", type=int, default=3, help="documents a scoped query is restricted to")
+    # Fake OpenAI server
+    parser.add_argument("--embedding-ms", type=float, default=20)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--index-type", default="flat",
+                        help="FAISS_INDEX_TYPE of the backend and of the startup snapshot")
+    # Startup
+    parser.add_argument("--startup-vectors", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8785)
+    parser.add_argument("--fake-port", type=int, default=8786)
+    args = parser.parse_args()
+
+    # The startup scenario changes directory
+    output, baseline = [os.path.abspath(path) if path else None for path in (args.output, args.compare)]
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="benchmark-suite-")
+    results = {}
+    if set(scenarios) & {"ingest", "query", "scoped"}:
+        results.update(run_http_scenarios(args, scenarios, workdir))
+    if "startup" in scenarios:
+        results["startup"] = run_startup(args, os.path.join(workdir, "startup"))
+        for mode in ("read", "mmap"):
+            print(f"startup ({mode}): load p50 {results['startup'][mode]['load_p50_ms']:.1f} ms  "
+                  f"RssAnon total {results['startup'][mode]['rss_anon_mb_total']:.1f} MB")
+
+    report = {
+        **git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    if baseline:
+        compare(baseline, results, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
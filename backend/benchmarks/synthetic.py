@@ -0,0 +1,117 @@
+"""
+Synthetic test documents for benchmarks, written without extra dependencies.
+"""
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+WORDS = ("the policy applies to every employee and contractor working on site during normal hours "
+         "requests must be approved by a manager before the deadline expires under section").split()
+
+
+def make_paragraphs(n_pages, words_per_page, seed=0):
+    """Pseudo-random English-like text, one string per page, with sentences that run across page breaks."""
+    rng = np.random.default_rng(seed)
+    pages = []
+    for page in range(n_pages):
+        words = [WORDS[i] for i in rng.integers(0, len(WORDS), size=words_per_page)]
+        for i in range(9, words_per_page, 12):
+            words[i] += "."
+        words[0] = f"Page {page + 1} item {rng.integers(1000, 9999)}"
+        pages.append(" ".join(words))
+    return pages
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, line_chars=90):
+    """Write a minimal PDF with one text page per string, in Helvetica, wrapped at line_chars."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        lines, line = [], ""
+        for word in text.split():
+            if line and len(line) + len(word) + 1 > line_chars:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_escape(l)}) Tj T*" for l in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+
+
+def write_docx(path, paragraphs):
+    """Write a minimal DOCX with one paragraph per string."""
+    body = "".join(f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>' for text in paragraphs)
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{body}</w:body></w:document>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", DOCX_RELS)
+        docx.writestr("word/document.xml", document)
+
+
+def write_corpus(directory, documents, pages_per_document, words_per_page, formats=("pdf", "docx", "txt"), seed=0):
+    """
+    Write a corpus of documents cycling through formats, each with its own seeded text.
+
+    Returns the paths, in order. The same arguments always produce the same files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(documents):
+        pages = make_paragraphs(pages_per_document, words_per_page, seed=seed * 100003 + i)
+        file_format = formats[i % len(formats)]
+        path = os.path.join(directory, f"doc{i:05d}.{file_format}")
+        if file_format == "pdf":
+            write_pdf(path, pages)
+        elif file_format == "docx":
+            write_docx(path, pages)
+        else:
+            with open(path, "w") as f:
+                f.write("\n\n".join(pages))
+        paths.append(path)
+    return paths
@@ -0,0 +1,226 @@
+import os
+import re
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+import numpy as np
+
+import metrics
+from embeddings import encoder
+
+# Target chunk length, and how many tokens consecutive chunks share, in tokens
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", 500))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 50))
+# A chunk ends at the last paragraph or sentence break within this final fraction of it, if there is one
+BOUNDARY_SEARCH_FRACTION = 0.25
+
+# Texts longer than this are encoded in pieces on several threads
+PARALLEL_ENCODE_CHARS = 256 * 1024
+PARAGRAPH_SPLIT = re.compile(r"\n\n(?=\S)")
+
+# Cut qualities, from hard cut (mid-sentence) to paragraph break
+NO_BREAK, SENTENCE_BREAK, PARAGRAPH_BREAK = 0, 1, 2
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = frozenset([b"mr", b"mrs", b"ms", b"dr", b"prof", b"st", b"vs", b"fig", b"eq", b"approx"])
+# Values of the letter table: a single letter ("J"), or one that follows a period in the same token (".g")
+LETTER, DOTTED_LETTER = 1, 2
+
+_token_flags: Optional[Tuple[np.ndarray, ...]] = None
+
+def token_flags() -> Tuple[np.ndarray, ...]:
+    """
+    Per-token tables, indexed by token id.
+
+    Returns:
+        Boolean tables (ends a sentence, contains a paragraph break, starts
+        with whitespace, is an abbreviation, starts with a capital letter) and
+        an int8 letter table (LETTER, DOTTED_LETTER or 0). Built once from the
+        vocabulary, so boundaries are found with array lookups instead of
+        decoding text.
+    """
+    global _token_flags
+
+    if _token_flags is None:
+        size = encoder.max_token_value + 1
+        sentence_end, paragraph, leading_space, abbreviation, capitalised = (
+            np.zeros(size, dtype=bool) for _ in range(5))
+        letter = np.zeros(size, dtype=np.int8)
+        for token_id in range(size):
+            try:
+                data = encoder.decode_single_token_bytes(token_id)
+            except KeyError:
+                continue  # Unused ids between the regular and special tokens
+            sentence_end[token_id] = data.rstrip(b" \t\"')]")[-1:] in (b".", b"!", b"?")
+            paragraph[token_id] = b"\n\n" in data
+            leading_space[token_id] = data[:1].isspace()
+            word = data.strip()
+            abbreviation[token_id] = word.lower() in ABBREVIATIONS
+            capitalised[token_id] = word[:1].isupper()
+            if len(word) == 1 and word.isalpha():
+                letter[token_id] = LETTER
+            elif len(word) == 2 and word[:1] == b"." and word[1:].isalpha():
+                letter[token_id] = DOTTED_LETTER
+        _token_flags = (sentence_end, paragraph, leading_space, abbreviation, capitalised, letter)
+    return _token_flags
+
+def encode_text(text: str) -> np.ndarray:
+    """
+    Token ids of a text, encoded once.
+
+    Long texts are split after blank lines into pieces of about
+    PARALLEL_ENCODE_CHARS and encoded with tiktoken's multithreaded batch
+    encoder. The tokenizer's pre-splitting never joins a blank line with the
+    word after it, so the ids are the same as encoding the text whole.
+    """
+    if len(text) <= PARALLEL_ENCODE_CHARS:
+        return np.asarray(encoder.encode_ordinary(text), dtype=np.int64)
+
+    pieces, start = [], 0
+    while start < len(text):
+        match = PARAGRAPH_SPLIT.search(text, start + PARALLEL_ENCODE_CHARS)
+        end = match.end() if match else len(text)
+        pieces.append(text[start:end])
+        start = end
+    encoded = encoder.encode_ordinary_batch(pieces, num_threads=os.cpu_count() or 1)
+    return np.concatenate([np.asarray(tokens, dtype=np.int64) for tokens in encoded])
+
+def cut_qualities(ids: np.ndarray) -> np.ndarray:
+    """
+    How good a place each position of a token sequence is to end a chunk.
+
+    Returns:
+        Array q of len(ids) + 1 where q[j] rates a cut before ids[j]:
+        PARAGRAPH_BREAK after a blank line, SENTENCE_BREAK after sentence-ending
+        punctuation that is followed by whitespace (so 3.5 doesn't count) and
+        doesn't end an abbreviation, NO_BREAK elsewhere.
+    """
+    sentence_end, paragraph, leading_space, abbreviation, capitalised, letter = token_flags()
+    quality = np.zeros(len(ids) + 1, dtype=np.int8)
+    if len(ids) < 2:
+        return quality
+    before, after = ids[:-1], ids[1:]
+    sentence = sentence_end[before] & leading_space[after]
+    # For cuts after the second token on: the token before the period, and the one after the cut
+    word, following = ids[:-2], ids[2:]
+    # "Dr. Smith", "Fig. 3": the token before the period is an abbreviation
+    sentence[1:] &= ~abbreviation[word]
+    # "J. Smith": a capital letter followed by a capitalised word is an initial
+    sentence[1:] &= ~((letter[word] == LETTER) & capitalised[word] & capitalised[following])
+    # "e.g. the", "U.S. Army": the letter follows another period
+    sentence[1:] &= letter[word] != DOTTED_LETTER
+    if len(ids) > 2:
+        word, period = ids[1:-2], ids[:-3]
+        sentence[2:] &= ~((letter[word] == LETTER) & ~leading_space[word] & sentence_end[period])
+    quality[1:-1] = np.where(paragraph[before], PARAGRAPH_BREAK, np.where(sentence, SENTENCE_BREAK, NO_BREAK))
+    return quality
+
+class PageChunker:
+    """
+    Token-window chunker fed one page of text at a time.
+
+    Each page is encoded once and the token ids are cut into windows of
+    chunk_size tokens that overlap by `overlap` tokens. A window ends at the
+    last paragraph break, or failing that sentence break, in its final
+    BOUNDARY_SEARCH_FRACTION; the overlap starts at a sentence start when one
+    falls inside it. Breaks are found with vectorized table lookups on the
+    token ids, and chunk text is decoded from the ids, so the text is never
+    re-tokenized. Only the tokens not yet emitted are held, so a document can
+    be chunked while it is still being extracted.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError(f"Chunk overlap ({overlap}) must be smaller than the chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        # Tokens from the start of the next chunk on
+        self._ids = np.empty(0, dtype=np.int64)
+        # Buffer offsets at which pages start, and their page numbers
+        self._page_offsets: List[int] = []
+        self._pages: List[Optional[int]] = []
+        # Buffer offset where the last emitted chunk ended (0 if none reaches into the buffer)
+        self._emitted_end = 0
+        self._emitted_any = False
+
+    def feed(self, text: str, page: Optional[int] = None) -> List[Tuple[str, Optional[int]]]:
+        """
+        Add the text of the next page.
+
+        Args:
+            text: Page text
+            page: Page number, or None for formats without pages
+
+        Returns:
+            Chunks completed by this page, as (chunk text, page the chunk starts on)
+        """
+        if not text:
+            return []
+        if len(self._ids):
+            # Pages are joined like words; a sentence may run across the page break
+            text = " " + text
+        self._page_offsets.append(len(self._ids))
+        self._pages.append(page)
+        with metrics.span("tokenize"):
+            ids = encode_text(text)
+        self._ids = np.concatenate([self._ids, ids])
+        with metrics.span("chunk"):
+            return self._cut(final=False)
+
+    def finish(self) -> List[Tuple[str, Optional[int]]]:
+        """Return the remaining chunks once all pages have been fed."""
+        with metrics.span("chunk"):
+            return self._cut(final=True)
+
+    def _cut(self, final: bool) -> List[Tuple[str, Optional[int]]]:
+        ids = self._ids
+        quality = cut_qualities(ids)
+        chunks = []
+        start = 0
+        # The token after a window is needed to judge the cut at its end, so keep one in reserve
+        while len(ids) - start > self.chunk_size:
+            last = start + self.chunk_size
+            first = last - int(self.chunk_size * BOUNDARY_SEARCH_FRACTION)
+            region = quality[first:last + 1]
+            best = region.max()
+            end = last if best == NO_BREAK else first + len(region) - 1 - int(np.argmax(region[::-1] == best))
+            chunks.append(self._chunk(ids, start, end))
+
+            next_start = max(end - self.overlap, start + 1)
+            breaks = np.flatnonzero(quality[next_start:end])
+            if len(breaks):
+                next_start += int(breaks[0])
+            start = next_start
+
+        # At the end, emit what is left unless the previous chunk already covers it
+        if final and len(ids) > start and (len(ids) > self._emitted_end or not self._emitted_any):
+            chunks.append(self._chunk(ids, start, len(ids)))
+            start = len(ids)
+
+        self._ids = ids[start:]
+        first_page = max(bisect_right(self._page_offsets, start) - 1, 0)
+        self._page_offsets = [max(offset - start, 0) for offset in self._page_offsets[first_page:]]
+        self._pages = self._pages[first_page:]
+        self._emitted_end = max(self._emitted_end - start, 0)
+        return [chunk for chunk in chunks if chunk[0]]
+
+    def _chunk(self, ids: np.ndarray, start: int, end: int) -> Tuple[str, Optional[int]]:
+        self._emitted_end = end
+        self._emitted_any = True
+        page = self._pages[bisect_right(self._page_offsets, start) - 1]
+        # Hard cuts can split a multi-byte character; drop the fragment rather than emit a replacement char
+        text = encoder.decode_bytes(ids[start:end].tolist()).decode("utf-8", errors="ignore")
+        return text.strip(), page
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split text into chunks of at most chunk_size tokens that overlap by about `overlap` tokens.
+
+    Args:
+        text: The text to split into chunks
+        chunk_size: Maximum size of each chunk in tokens
+        overlap: Tokens shared by consecutive chunks
+
+    Returns:
+        List of text chunks
+    """
+    chunker = PageChunker(chunk_size, overlap)
+    return [chunk for chunk, _ in chunker.feed(text) + chunker.finish()]
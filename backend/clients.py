@@ -0,0 +1,97 @@
+import os
+from typing import Optional, Dict, Any
+import httpx
+import openai
+
+# Connection pool and timeout settings for the shared OpenAI client
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # None uses the official endpoint
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 100))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport that counts requests so pool usage can be reported."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+_client: Optional[openai.AsyncOpenAI] = None
+_transport: Optional[CountingTransport] = None
+
+def init_openai_client() -> openai.AsyncOpenAI:
+    """Create the shared OpenAI client and its connection pool (idempotent)."""
+    global _client, _transport
+
+    if _client is None:
+        _transport = CountingTransport(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            )
+        )
+        http_client = httpx.AsyncClient(
+            transport=_transport,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        )
+        _client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=OPENAI_BASE_URL,
+            http_client=http_client,
+        )
+    return _client
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """
+    Return the shared OpenAI client, creating it on first use.
+
+    The app creates it at startup; scripts that never run the app get one lazily.
+    """
+    return _client or init_openai_client()
+
+async def close_openai_client():
+    """Close the shared client and its pooled connections."""
+    global _client, _transport
+
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _transport = None
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool usage of the shared OpenAI client."""
+    if _transport is None:
+        return {"initialized": False}
+
+    # httpcore exposes the pool's live connections; fall back gracefully if that changes
+    connections = getattr(getattr(_transport, "_pool", None), "connections", [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        "initialized": True,
+        "connections": len(connections),
+        "idle_connections": idle,
+        "active_connections": len(connections) - idle,
+        "max_connections": OPENAI_MAX_CONNECTIONS,
+        "requests": _transport.requests,
+        "errors": _transport.errors,
+        "in_flight": _transport.in_flight,
+        "max_in_flight": _transport.max_in_flight,
+    }
@@ -0,0 +1,112 @@
+import os
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Optional
+
+import metrics
+
+# Worker processes for CPU-bound parsing and chunking
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+# Worker threads for FAISS and database calls (FAISS releases the GIL while searching)
+IO_WORKERS = int(os.getenv("IO_WORKERS", 16))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _process_pool
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _thread_pool
+
+def _noop():
+    return None
+
+def start_pools():
+    """
+    Create the worker pools up front.
+
+    With the fork start method all worker processes are forked on the first
+    submit, so doing it at startup forks them before the app has busy threads.
+    """
+    get_thread_pool()
+    get_process_pool().submit(_noop).result()
+
+def shutdown_pools():
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=True, cancel_futures=True)
+        _thread_pool = None
+
+async def run_in_process(func: Callable, *args, **kwargs) -> Any:
+    """Run a picklable, CPU-bound function in the process pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # Spans recorded in the worker come back with the result
+    result, spans = await loop.run_in_executor(get_process_pool(),
+                                               partial(metrics.call_with_spans, func, *args, **kwargs))
+    metrics.record_spans(spans)
+    return result
+
+async def run_in_thread(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking function (FAISS, SQLite, file I/O) in the thread pool."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context over, so spans recorded in the thread count toward its request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_thread_pool(), partial(context.run, func, *args, **kwargs))
+
+class RWLock:
+    """
+    Readers-writer lock for threads.
+
+    Any number of readers may hold the lock together; a writer holds it alone.
+    Waiting writers block new readers so a steady stream of searches cannot
+    starve an add.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
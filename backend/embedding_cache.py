@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import threading
+import hashlib
+from typing import List, Optional, Dict, Any
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+# Maximum number of cached vectors (~6 KB each for 1536 dimensions); 0 disables the cache
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100_000))
+# Share of max_entries freed at once when the cache is full, so eviction runs once per many inserts
+EMBEDDING_CACHE_EVICT_FRACTION = 0.1
+
+def cache_key(model: str, text: str) -> bytes:
+    """Content address of an embedding: hash of the model name and the exact input text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    Disk-backed, size-bounded LRU cache of embedding vectors.
+
+    Vectors are stored as raw float32 BLOBs in SQLite, keyed on a hash of
+    (model, text), so identical chunks across uploads and repeated queries
+    never reach the embeddings API twice. Lookups and inserts do blocking
+    SQLite I/O; call them from a worker thread.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._clock = 0
+        # Upper bound on the number of rows: inserts that replace a row are counted as new ones
+        self._entries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embedding_last_used ON embedding (last_used)")
+            row = self._conn.execute("SELECT MAX(last_used) FROM embedding").fetchone()
+            self._clock = row[0] or 0
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+        return self._conn
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached vectors.
+
+        Args:
+            model: Embedding model name
+            texts: Input texts
+
+        Returns:
+            One float32 vector per text, or None where the text is not cached
+        """
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+
+        keys = [cache_key(model, text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            conn = self._connect()
+            unique_keys = list(set(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, vector FROM embedding WHERE key IN ({placeholders})", batch)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                self._clock += 1
+                conn.executemany("UPDATE embedding SET last_used = ? WHERE key = ?",
+                                 [(self._clock, key) for key in found])
+                conn.commit()
+
+        results = [found.get(key) for key in keys]
+        hits = sum(vector is not None for vector in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Store vectors for texts.
+
+        Once the cache holds more than max_entries, the least recently used
+        entries are evicted down to EMBEDDING_CACHE_EVICT_FRACTION below it.
+        """
+        if not self.enabled or not texts:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            self._clock += 1
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding (key, vector, last_used) VALUES (?, ?, ?)",
+                [(cache_key(model, text), np.asarray(vector, dtype=np.float32).tobytes(), self._clock)
+                 for text, vector in zip(texts, vectors)]
+            )
+            self._entries += len(texts)
+            if self._entries > self.max_entries:
+                # Only count the rows when the estimate says the cache may be full
+                count = conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+                if count > self.max_entries:
+                    target = int(self.max_entries * (1 - EMBEDDING_CACHE_EVICT_FRACTION))
+                    conn.execute(
+                        "DELETE FROM embedding WHERE key IN "
+                        "(SELECT key FROM embedding ORDER BY last_used LIMIT ?)",
+                        (count - target,)
+                    )
+                    count = target
+                self._entries = count
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size (an upper bound, see put_many)."""
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                self._connect()
+                entries = self._entries
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+# Shared cache used by embeddings.embed
+cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
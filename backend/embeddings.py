@@ -1,25 +1,73 @@
 import os
+import asyncio
 from typing import List
 import openai
 import tiktoken
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 
+import metrics
+from clients import get_openai_client
+from concurrency import run_in_thread
+from embedding_cache import cache as embedding_cache
+
 # Get API key from environment variable
 openai.api_key = os.getenv("OPENAI_API_KEY")
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 1536  # Dimensions for text-embedding-3-small
+# Limits for a single embeddings request, and how many requests may be in flight at once
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 100_000))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", 2048))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
 
 # Get encoder for calculating token lengths
 encoder = tiktoken.get_encoding("cl100k_base")  # The encoding used by text-embedding-3 models
 
+# Caps concurrent embeddings requests across all callers
+request_slots = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
 def count_tokens(text: str) -> int:
     """Count the number of tokens in a text string."""
     return len(encoder.encode(text))
 
+def batch_by_tokens(texts: List[str], max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+                    max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS) -> List[List[str]]:
+    """
+    Split texts into consecutive batches that each stay under a token and input budget.
+    
+    Args:
+        texts: Texts to split
+        max_tokens: Maximum total tokens per batch
+        max_inputs: Maximum number of texts per batch
+        
+    Returns:
+        List of batches, in input order. A single text larger than max_tokens
+        gets a batch of its own.
+    """
+    # Tokenize all texts in one multithreaded call rather than one encode per text
+    with metrics.span("tokenize"):
+        token_counts = [len(tokens) for tokens in encoder.encode_ordinary_batch(texts)]
+    
+    batches = []
+    current_batch = []
+    current_tokens = 0
+    for text, tokens in zip(texts, token_counts):
+        if current_batch and (current_tokens + tokens > max_tokens or len(current_batch) >= max_inputs):
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(text)
+        current_tokens += tokens
+    
+    if current_batch:
+        batches.append(current_batch)
+    
+    return batches
+
 @retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(3))
-async def embed(texts: List[str]) -> List[List[float]]:
+async def request_embeddings(texts: List[str]) -> List[List[float]]:
     """
-    Generate embeddings for a list of texts using OpenAI's API.
+    Generate embeddings for one batch of texts using OpenAI's API, bypassing the cache.
+    Retries apply to this batch only.
     
     Args:
         texts: List of text strings to embed
@@ -30,57 +78,59 @@ async def embed(texts: List[str]) -> List[List[float]]:
     if not texts:
         return []
     
-    client = openai.AsyncOpenAI(api_key=openai.api_key)
-    response = await client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=texts
-    )
+    # Time spent queued for a slot is reported apart from the API round trip
+    with metrics.span("embed_queue"):
+        await request_slots.acquire()
+    try:
+        with metrics.span("embed_request"):
+            response = await get_openai_client().embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=texts
+            )
+    finally:
+        request_slots.release()
     
-    # Extract embeddings from the response
-    embeddings = [item.embedding for item in response.data]
+    # Extract embeddings from the response, in input order
+    embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     return embeddings
 
-def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
+async def request_embeddings_batched(texts: List[str]) -> List[List[float]]:
     """
-    Split text into chunks of approximately chunk_size tokens.
-    Simple implementation that splits on periods and then combines sentences.
+    Embed any number of texts by splitting them into token-bounded batches
+    and sending the batches concurrently (bounded by EMBEDDING_CONCURRENCY).
     
     Args:
-        text: The text to split into chunks
-        chunk_size: Target size of each chunk in tokens
+        texts: List of text strings to embed
         
     Returns:
-        List of text chunks
+        List of embedding vectors, in input order
     """
-    # Get chunk size from environment or use default
-    chunk_size_tokens = int(os.getenv("CHUNK_SIZE_TOKENS", chunk_size))
-    
-    # Split on sentences (simple approach)
-    sentences = [s.strip() for s in text.split('.') if s.strip()]
-    
-    chunks = []
-    current_chunk = []
-    current_size = 0
+    # Tokenizing thousands of chunks is CPU work, so keep it off the event loop
+    batches = await run_in_thread(batch_by_tokens, texts)
+    results = await asyncio.gather(*(request_embeddings(batch) for batch in batches))
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+async def embed(texts: List[str]) -> List[List[float]]:
+    """
+    Generate embeddings for a list of texts, sending only cache misses to the API.
     
-    for sentence in sentences:
-        # Add a period back to the sentence
-        if not sentence.endswith('.'):
-            sentence = sentence + '.'
-            
-        sentence_size = count_tokens(sentence)
+    Args:
+        texts: List of text strings to embed
         
-        # If adding this sentence would exceed the chunk size,
-        # save the current chunk and start a new one
-        if current_size + sentence_size > chunk_size_tokens and current_chunk:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [sentence]
-            current_size = sentence_size
-        else:
-            current_chunk.append(sentence)
-            current_size += sentence_size
+    Returns:
+        List of embedding vectors (each is a list of floats)
+    """
+    if not texts:
+        return []
     
-    # Add the last chunk if it's not empty
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+    # The cache is SQLite on disk; keep its I/O off the event loop
+    cached = await run_in_thread(embedding_cache.get_many, EMBEDDING_MODEL, texts)
+    # Each distinct uncached text is sent once, even if it repeats in the input
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+    fresh = {}
+    if missing:
+        vectors = await request_embeddings_batched(missing)
+        await run_in_thread(embedding_cache.put_many, EMBEDDING_MODEL, missing, vectors)
+        fresh = dict(zip(missing, vectors))
     
-    return chunks 
\ No newline at end of file
+    return [vector.tolist() if vector is not None else fresh[text] for text, vector in zip(texts, cached)]
@@ -3,6 +3,28 @@ import mimetypes
 import pypdf
 import docx2txt
 import re
+import sys
+import asyncio
+import codecs
+import threading
+import unicodedata
+from collections import deque
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+import metrics
+from concurrency import EXTRACT_WORKERS, run_in_process
+
+# Pages extracted per worker-process task; ranges of one PDF are extracted in parallel
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+# How clean_text treats characters outside ASCII: "nfkc" keeps them and folds
+# compatibility forms (ligatures such as "ﬁ", full-width letters) with NFKC;
+# "keep" leaves them as extracted; "ascii" folds accents and replaces
+# everything else outside printable ASCII with spaces.
+UNICODE_HANDLINGS = ("nfkc", "keep", "ascii")
+UNICODE_HANDLING = os.getenv("UNICODE_HANDLING", "nfkc").lower()
+if UNICODE_HANDLING not in UNICODE_HANDLINGS:
+    raise ValueError(f"Unknown UNICODE_HANDLING '{UNICODE_HANDLING}'. Expected one of {', '.join(UNICODE_HANDLINGS)}.")
 
 def detect_mimetype(filename_with_extension: str) -> str:
     """
@@ -22,87 +44,255 @@ def detect_mimetype(filename_with_extension: str) -> str:
         
     return mime_type
 
-def clean_text(text: str) -> str:
+def _translation(code: int) -> Optional[str]:
+    """
+    What clean_text turns a character into: control, surrogate and
+    private-use characters become spaces, invisible format characters are
+    dropped; None if the character is kept.
+    """
+    category = unicodedata.category(chr(code))
+    if category in ("Cc", "Cs", "Co", "Zs"):
+        return " "
+    if category == "Cf":
+        return ""  # Zero-width spaces and joiners, soft hyphens, byte order marks, tag characters
+    if category == "Mn" and UNICODE_HANDLING == "ascii":
+        return ""  # Accents left over from NFKD, so "é" folds to "e"
+    return None
+
+class CharacterTable(dict):
+    """
+    str.translate table for every code point. The Basic Multilingual Plane
+    is filled in up front; characters outside it (emoji, tag characters,
+    supplementary private use) are looked up the first time they are seen.
+    """
+
+    def __missing__(self, code: int) -> str:
+        translation = _translation(code)
+        # Characters that are kept map to themselves, so the lookup is not repeated
+        self[code] = chr(code) if translation is None else translation
+        return self[code]
+
+def _character_table() -> CharacterTable:
+    """
+    The Basic Multilingual Plane part of CHARACTER_TABLE: every character
+    _translation changes, and every kind of whitespace and line break
+    becoming " " or "\n".
+    """
+    table = CharacterTable()
+    for code in range(0x10000):
+        translation = _translation(code)
+        if translation is not None:
+            table[code] = translation
+    table.update({ord("\r"): "\n", 0x2028: "\n", 0x2029: "\n\n"})
+    # Left as they are, so plain text needs no changes
+    del table[ord(" ")], table[ord("\n")]
+    return table
+
+def _character_class(codes, extra_ranges=()) -> re.Pattern:
+    """Regex matching runs of the given characters, and of those in extra_ranges, written as ranges."""
+    ranges = []
+    for code in sorted(codes):
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    ranges += [list(extra) for extra in extra_ranges]
+    return re.compile("[" + "".join(
+        re.escape(chr(first)) if first == last else f"{re.escape(chr(first))}-{re.escape(chr(last))}"
+        for first, last in ranges) + "]+")
+
+def _replace_with_space(error: UnicodeEncodeError) -> Tuple[str, int]:
+    return " ", error.end
+
+CHARACTER_TABLE = _character_table()
+# str.translate looks up every character of a non-ASCII string in the table;
+# finding the few that need it with a regex first is several times faster.
+# Characters outside the BMP are rare, so all of them go through the table.
+FILTERED_CHARACTERS = _character_class(CHARACTER_TABLE, [(0x10000, sys.maxunicode)])
+codecs.register_error("clean_text.space", _replace_with_space)
+
+# PDF dictionaries, names and keywords that can leak into extracted text. The
+# lookahead lets the regex engine skip positions that can't start a match.
+PDF_SYNTAX = re.compile(
+    r"(?=[<%/eEoOsStTxX])(?:<<.*?>>|%%EOF"
+    r"|/(?:Type|FontDescriptor|XYZ|Pages?|Catalog|Outlines|StructTreeRoot|MarkInfo|Metadata|PieceInfo"
+    r"|LastModified|Creator|Producer|CreationDate|ModDate|OpenAction|AcroForm|Filter|Subtype|Length\d*"
+    r"|Width|Height|ColorSpace|BitsPerComponent|DecodeParms|ASCIIHexDecode|FlateDecode|DCTDecode"
+    r"|JPXDecode|CCITTFaxDecode|JBIG2Decode)\b"
+    r"|\b(?:end(?:obj|stream)|obj|stream|(?:start)?xref|trailer)\b)",
+    re.IGNORECASE,
+)
+# A blank line, possibly holding spaces, after translation to plain spaces and newlines
+PARAGRAPH_BREAK = re.compile(r"\n *\n[ \n]*")
+
+def clean_text(text: str, pdf_syntax: bool = True) -> str:
     """
     Clean extracted text to remove binary content and non-readable characters.
+
+    Characters are filtered with str.translate over CHARACTER_TABLE,
+    non-ASCII text is handled as UNICODE_HANDLING says, and whitespace is
+    collapsed to single spaces within paragraphs, with paragraphs separated
+    by a blank line so the chunker can cut between them.
     
     Args:
         text: Text to clean
+        pdf_syntax: Also remove PDF structural elements mistakenly extracted as text
         
     Returns:
         Cleaned text
     """
-    # Remove non-printable characters but keep basic punctuation and whitespace
-    text = re.sub(r'[^\x20-\x7E\n\r\t]', ' ', text)
-    
-    # Remove common PDF structural elements that might be mistakenly extracted as text
-    text = re.sub(r'(?:endobj|endstream|obj|stream|\/Type|\/FontDescriptor|\/XYZ|\/Page[s]?|\/Catalog|\/Outlines|\/StructTreeRoot|\/MarkInfo|\/Metadata|\/PieceInfo|\/LastModified|\/Creator|\/Producer|\/CreationDate|\/ModDate|\/OpenAction|\/AcroForm|\/Filter|\/Subtype|\/Length\d*|\/Width|\/Height|\/ColorSpace|\/BitsPerComponent|\/Filter|\/DecodeParms|\/ASCIIHexDecode|\/FlateDecode|\/DCTDecode|\/JPXDecode|\/CCITTFaxDecode|\/JBIG2Decode|xref|trailer|startxref|%%EOF)', ' ', text, flags=re.IGNORECASE)
-    text = re.sub(r'\<\<.*?\>\>', ' ', text) # Remove dictionaries <</.../>>
-    text = re.sub(r'\s+', ' ', text) # Consolidate multiple spaces
-    
-    return text.strip()
+    with metrics.span("clean"):
+        if UNICODE_HANDLING == "nfkc":
+            if not unicodedata.is_normalized("NFKC", text):
+                text = unicodedata.normalize("NFKC", text)
+        elif UNICODE_HANDLING == "ascii" and not text.isascii():
+            text = unicodedata.normalize("NFKD", text)
+
+        text = text.replace("\r\n", "\n")
+        if text.isascii():
+            text = text.translate(CHARACTER_TABLE)
+        else:
+            text = FILTERED_CHARACTERS.sub(lambda match: match.group().translate(CHARACTER_TABLE), text)
+        if UNICODE_HANDLING == "ascii" and not text.isascii():
+            text = text.encode("ascii", "clean_text.space").decode("ascii")
+
+        if pdf_syntax:
+            text = PDF_SYNTAX.sub(" ", text)
+
+        paragraphs = (" ".join(paragraph.split()) for paragraph in PARAGRAPH_BREAK.split(text))
+        return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+# Reader of the PDF last opened in this process, keyed by (path, mtime, size)
+_open_pdf: Optional[Tuple[Tuple[str, int, int], pypdf.PdfReader]] = None
+# Seconds a worker process keeps that reader after its last task, for further page ranges of the same PDF
+PDF_READER_IDLE_SECONDS = 5.0
+_release_timer: Optional[threading.Timer] = None
+
+def release_pdf():
+    """Drop the cached PDF reader, and with it the document it holds in memory."""
+    global _open_pdf
+    _open_pdf = None
+
+def release_pdf_when_idle():
+    """Drop the cached reader unless another task uses it within PDF_READER_IDLE_SECONDS."""
+    global _release_timer
+
+    if _release_timer is not None:
+        _release_timer.cancel()
+    _release_timer = threading.Timer(PDF_READER_IDLE_SECONDS, release_pdf)
+    _release_timer.daemon = True
+    _release_timer.start()
+
+def open_pdf(file_path: str) -> pypdf.PdfReader:
+    """
+    Open a PDF, reusing the reader from the previous call if it was for the same file.
+
+    Parsing the cross-reference table and page tree of a long PDF takes far
+    longer than extracting a few pages, so each worker process parses a
+    document once however many of its page ranges it is given.
+    """
+    global _open_pdf
+
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    # The idle timer may clear the global at any moment; work on a local reference
+    cached = _open_pdf
+    if cached is None or cached[0] != key:
+        cached = _open_pdf = None  # Release the previous document before parsing the next
+        # A path (rather than a file object) makes pypdf read the file into memory and close it
+        cached = _open_pdf = (key, pypdf.PdfReader(file_path))
+    return cached[1]
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF."""
+    try:
+        return len(open_pdf(file_path).pages)
+    finally:
+        release_pdf_when_idle()
+
+def extract_page_text(page: pypdf.PageObject) -> str:
+    """Extract and clean the text of one PDF page."""
+    with metrics.span("extract"):
+        raw_text = page.extract_text() or ""
+    text = clean_text(raw_text)
+    if not text:
+        # pypdf's visitor functions can sometimes get more text; only pages that came out empty pay for a second pass
+        parts = []
+        def visitor_text(text, cm, tm, fontDict, fontSize):
+            parts.append(text)
+        with metrics.span("extract"):
+            page.extract_text(visitor_text=visitor_text)
+        text = clean_text("".join(parts))
+    return text
+
+def iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page number, cleaned text) for the pages of a PDF, one page at a time.
+
+    Args:
+        file_path: Path to the PDF
+        start: Index of the first page to extract
+        stop: Index after the last page to extract (default: the end of the document)
+
+    Yields:
+        1-based page numbers with their text. Pages without text, or that fail to parse, are skipped.
+    """
+    with metrics.span("extract"):
+        pdf = open_pdf(file_path)
+    stop = len(pdf.pages) if stop is None else min(stop, len(pdf.pages))
+    for page_index in range(start, stop):
+        try:
+            text = extract_page_text(pdf.pages[page_index])
+        except Exception as e:
+            print(f"Warning: Could not extract text from page {page_index + 1}: {str(e)}")
+            continue
+        if text:
+            yield page_index + 1, text
+    if stop == len(pdf.pages):
+        # No later range of this document needs the reader
+        release_pdf()
+
+def extract_pdf_pages(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """
+    Extract a range of PDF pages.
+
+    Picklable, so the page ranges of one document can be spread across worker
+    processes. Each worker keeps the document parsed for its next range, and
+    drops it once the last page is read or it has been idle for
+    PDF_READER_IDLE_SECONDS.
+    """
+    try:
+        return list(iter_pdf_pages(file_path, start, stop))
+    finally:
+        release_pdf_when_idle()
 
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text from a PDF file."""
-    text = ""
     try:
-        with open(file_path, "rb") as f:
-            pdf = pypdf.PdfReader(f)
-            
-            if not pdf.pages:
-                 return "[Warning: PDF has no pages or is encrypted and cannot be read.]"
-
-            for page_num, page in enumerate(pdf.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                except Exception as e:
-                    # Log or handle page-specific extraction errors if needed
-                    text += f"[Warning: Could not extract text from page {page_num + 1}: {str(e)}]\n"
-            
-            text = clean_text(text)
-            
-            if not text.strip() or len(text.strip()) < 50 : # Check if cleaned text is too short or empty
-                 # Attempt an alternative extraction if the primary one yields little or no text
-                alternative_text = ""
-                for page in pdf.pages:
-                    try:
-                        # pypdf's visitor functions can sometimes get more text
-                        parts = []
-                        def visitor_text(text, cm, tm, fontDict, fontSize):
-                            parts.append(text)
-                        page.extract_text(visitor_text=visitor_text)
-                        if parts:
-                            alternative_text += "".join(parts) + "\n"
-                    except:
-                        pass # Ignore errors in alternative method
-                
-                cleaned_alternative_text = clean_text(alternative_text)
-                if len(cleaned_alternative_text.strip()) > len(text.strip()):
-                    text = cleaned_alternative_text
-
-            if not text.strip() or len(text.strip()) < 50:
-                text = "[Warning: Limited text could be extracted from this PDF. It may contain mostly images, be scanned, or have complex formatting.]"
-    
+        # One join at the end instead of growing a string page by page
+        text = "\n".join(page_text for _, page_text in iter_pdf_pages(file_path))
     except pypdf.errors.PdfReadError as e:
         return f"[Error: Could not read PDF. It might be corrupted or encrypted: {str(e)}]"
     except Exception as e:
         return f"[Error extracting text from PDF: {str(e)}]"
-    
+
+    if len(text.strip()) < 50:
+        return "[Warning: Limited text could be extracted from this PDF. It may contain mostly images, be scanned, or have complex formatting.]"
     return text
 
 def extract_text_from_docx(file_path: str) -> str:
     """Extract text from a DOCX file."""
     try:
-        return docx2txt.process(file_path)
+        with metrics.span("extract"):
+            raw_text = docx2txt.process(file_path)
+        return clean_text(raw_text, pdf_syntax=False)
     except Exception as e:
         return f"[Error extracting text from DOCX: {str(e)}]"
 
 def extract_text_from_txt(file_path: str) -> str:
     """Extract text from a text file."""
     try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        with metrics.span("extract"), open(file_path, "r", encoding="utf-8", errors="ignore") as f:
             text_content = f.read()
         return clean_text(text_content) # Clean even plain text for consistency
     except Exception as e:
@@ -135,4 +325,51 @@ def extract_text(file_path: str, original_filename: str) -> str:
         else: # If text extraction fails, return a specific message for octet-stream
              return f"[Warning: File type is generic ('{mime_type}'), and text extraction failed. Content might be binary or an unsupported format.]"
     else:
-        return f"[Error: Cannot extract text from file with MIME type {mime_type}. Unsupported format.]" 
\ No newline at end of file
+        return f"[Error: Cannot extract text from file with MIME type {mime_type}. Unsupported format.]"
+
+async def iter_pages(file_path: str, original_filename: str) -> AsyncIterator[Tuple[Optional[int], str]]:
+    """
+    Extract a document page by page, in worker processes.
+    
+    PDF page ranges of PDF_PAGES_PER_TASK pages are extracted in parallel
+    across the process pool. At most EXTRACT_WORKERS ranges are in flight at
+    once, so memory stays bounded however long the document is. Other formats
+    are extracted whole and yielded as a single page.
+    
+    Args:
+        file_path: Path to the temporary file content.
+        original_filename: The original name of the file, used for MIME type detection.
+        
+    Yields:
+        (page number or None for formats without pages, text), in document order.
+        Nothing is yielded if extraction produced only an error or warning.
+    """
+    if detect_mimetype(original_filename) != "application/pdf":
+        extracted_text = await run_in_process(extract_text, file_path, original_filename)
+        # If extraction failed, extracted_text is an error/warning string rather than content
+        if extracted_text.startswith("[Error") or extracted_text.startswith("[Warning"):
+            print(f"No text extracted from {original_filename}: {extracted_text}")
+        else:
+            yield None, extracted_text
+        return
+
+    try:
+        page_count = await run_in_process(count_pdf_pages, file_path)
+    except Exception as e:
+        print(f"Error: Could not read PDF {original_filename}. It might be corrupted or encrypted: {str(e)}")
+        return
+
+    ranges = deque(range(0, page_count, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < EXTRACT_WORKERS:
+                start = ranges.popleft()
+                in_flight.append(asyncio.ensure_future(
+                    run_in_process(extract_pdf_pages, file_path, start, start + PDF_PAGES_PER_TASK)))
+            for page in await in_flight.popleft():
+                yield page
+    finally:
+        # The consumer stopped early (e.g. it failed); don't leave ranges running
+        for task in in_flight:
+            task.cancel()
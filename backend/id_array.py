@@ -0,0 +1,66 @@
+from typing import Optional
+import numpy as np
+
+# Marks a FAISS id with no value (e.g. a chunk missing from the database)
+MISSING = -1
+
+class IdArray:
+    """
+    Growable int64 array indexed by FAISS id.
+
+    FAISS assigns ids densely from 0, so position i holds the value for FAISS
+    id i. Capacity doubles when full, making appends amortized O(1) per id.
+    The backing buffer may be a read-only memory-mapped snapshot; it is copied
+    into a private buffer on the first append.
+    """
+
+    def __init__(self, values: Optional[np.ndarray] = None):
+        self._buffer = np.empty(0, dtype=np.int64) if values is None else values
+        self._size = len(self._buffer)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return self.values if dtype is None else self.values.astype(dtype)
+
+    @property
+    def values(self) -> np.ndarray:
+        """The populated part of the array, without copying."""
+        return self._buffer[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+    def append(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.int64)
+        needed = self._size + len(values)
+        if needed > len(self._buffer) or not self._buffer.flags.writeable:
+            grown = np.empty(max(needed, 2 * len(self._buffer), 1024), dtype=np.int64)
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+        self._buffer[self._size:needed] = values
+        self._size = needed
+
+    def assign(self, faiss_ids: np.ndarray, value: int):
+        """Set the entries at the given FAISS ids to value."""
+        if not self._buffer.flags.writeable:
+            self._buffer = np.array(self._buffer)
+        self._buffer[np.asarray(faiss_ids, dtype=np.int64)] = value
+
+    def lookup(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """
+        Map FAISS ids to values in one vectorized step.
+
+        Args:
+            faiss_ids: FAISS ids, possibly containing -1 padding from a search
+
+        Returns:
+            Values aligned with faiss_ids; MISSING for ids that are out of range
+        """
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        valid = (faiss_ids >= 0) & (faiss_ids < self._size)
+        result = np.full(faiss_ids.shape, MISSING, dtype=np.int64)
+        result[valid] = self._buffer[faiss_ids[valid]]
+        return result
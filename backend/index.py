@@ -1,128 +1,1203 @@
 import os
+import asyncio
 import faiss
 import numpy as np
 import json
 import tempfile
-from typing import List, Dict, Any, Tuple, Optional
-import openai
+import threading
+import time
+from typing import List, Dict, Any, Tuple, Optional, Callable, Awaitable, AsyncIterator, Sequence, BinaryIO
+from sqlalchemy import insert, delete
 from sqlmodel import Session, select
 
+import ann
+import metrics
+from clients import get_openai_client
+from concurrency import RWLock, get_thread_pool, run_in_thread
 from models import Document, Chunk, engine
-# Import with an alias to avoid potential name conflicts
-from embeddings import embed, chunk_text as split_text
-from extract import extract_text, detect_mimetype
+from vector_log import VectorLog, atomic_write
+from vector_store import VectorStore
+from id_array import IdArray, MISSING
+from lexical import BM25Index
+from shards import shards
+from answer_cache import cache as answer_cache, make_scope
+from embeddings import embed
+from chunking import PageChunker
+from extract import iter_pages, detect_mimetype
 
 # Vector dimensions for the embedding model
 EMBEDDING_DIMENSIONS = 1536  # Dimensions for text-embedding-3-small
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", ".faiss")
 TOP_K = 4  # Number of chunks to retrieve in search
+# Size of the vector log at which it is folded into a fresh index snapshot
+VECTOR_LOG_MAX_BYTES = int(os.getenv("VECTOR_LOG_MAX_BYTES", 256 * 1024 * 1024))
+# Memory-map index snapshots so uvicorn workers share them through the page cache
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# Fraction of deleted (tombstoned) vectors at which the index is rebuilt without them
+COMPACTION_THRESHOLD = float(os.getenv("COMPACTION_THRESHOLD", 0.2))
+# How chunks are retrieved: vector (embeddings), lexical (BM25, no embedding call) or hybrid (both, fused)
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"Unknown RETRIEVAL_MODE '{RETRIEVAL_MODE}'. Expected one of {', '.join(RETRIEVAL_MODES)}.")
+# Hits taken from each retriever before fusing them in hybrid mode
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+RRF_K = 60  # Reciprocal rank fusion constant; damps the weight of the top few ranks
+# Seconds to wait for a query embedding before answering from the lexical index alone
+QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", 5))
+# Chunks embedded and stored together while a document is still being extracted
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", 256))
+# Quantized indexes return this many times k candidates, re-ranked exactly against full-precision vectors (1 disables)
+FAISS_RERANK_FACTOR = int(os.getenv("FAISS_RERANK_FACTOR", 4))
+# Full-precision vectors are kept on disk when the configured index type stores lossy codes
+KEEP_EXACT_VECTORS = ann.is_quantized(ann.FAISS_INDEX_TYPE)
+# Largest document scope searched exhaustively against its full-precision vectors rather than through the index
+SCOPED_EXACT_SEARCH_MAX = int(os.getenv("SCOPED_EXACT_SEARCH_MAX", 50000))
+# Completions batch queries keep in flight at once, across all of them
+BATCH_COMPLETION_CONCURRENCY = int(os.getenv("BATCH_COMPLETION_CONCURRENCY", 8))
+# Seconds between checks of a read-only copy for snapshots and log records of the writer (0 disables them)
+INDEX_RELOAD_SECONDS = float(os.getenv("INDEX_RELOAD_SECONDS", 5))
+# Set by shard_server.py: this process serves one shard's vectors only; chunks and BM25 live in the API process
+INDEX_VECTORS_ONLY = os.getenv("INDEX_VECTORS_ONLY", "0") == "1"
+
+def new_index() -> faiss.Index:
+    """Create an empty index of the configured type, or a flat one if that type needs training first."""
+    index_type = ann.FAISS_INDEX_TYPE if ann.can_build(ann.FAISS_INDEX_TYPE, 0) else "flat"
+    return ann.create_index(index_type, EMBEDDING_DIMENSIONS)
 
 # Initialize FAISS index
-index = faiss.IndexFlatL2(EMBEDDING_DIMENSIONS)
-# Store mapping of FAISS ids to DB chunk ids
-id_map = {}
+index = new_index()
+# Whether index is a read-only memory-mapped view of the snapshot file
+index_mapped = False
+# FAISS id -> DB chunk id and FAISS id -> document id, as int64 arrays indexed by FAISS id
+id_map = IdArray()
+id_docs = IdArray()
+# FAISS ids belonging to each document, used to scope searches
+doc_vectors: Dict[int, np.ndarray] = {}
+# Vectors added since the last snapshot, and the snapshot generation they extend
+vector_log = VectorLog(f"{FAISS_INDEX_PATH}.log")
+index_epoch = 0
+# Deleted vectors still in the index, and the selector hiding them from unscoped searches
+tombstone_count = 0
+live_selector: Optional[faiss.IDSelector] = None
+# Vectors added while a compaction runs, carried over to the rebuilt index
+compaction_delta: Optional[List[np.ndarray]] = None
+# Full-precision vectors by FAISS id, for re-ranking, and the snapshot generation that named its file
+vector_store = VectorStore(f"{FAISS_INDEX_PATH}.0.vectors", EMBEDDING_DIMENSIONS)
+vectors_epoch = 0
+# BM25 index over chunk texts; it has its own lock
+lexical_index = BM25Index(f"{FAISS_INDEX_PATH}.lexical.npz", COMPACTION_THRESHOLD)
+# Whether lexical_index was loaded and reconciled with the chunk table (by the API server at startup)
+lexical_loaded = False
+# Guards index, id_map and doc_vectors: searches share it, adds take it exclusively
+index_lock = RWLock()
+# Serializes snapshots and compactions, which both start a new snapshot generation
+snapshot_lock = threading.Lock()
+# Whether this process holds the writer lock on the index files; other processes serve a read-only copy
+index_writable = False
+# Vector log size and monotonic time when the index files were last loaded, to tell when a read-only copy is stale
+loaded_log_size = 0
+loaded_at = 0.0
+# Caps concurrent batch-query completions, so simultaneous batches don't multiply the limit
+batch_completion_slots = asyncio.Semaphore(BATCH_COMPLETION_CONCURRENCY)
+
+class ReadOnlyIndexError(Exception):
+    """Raised on writes in a process that does not hold the writer lock of the index files."""
+
+# Called with (stage, doc_id) as ingestion progresses
+ProgressCallback = Callable[[str, Optional[int]], Awaitable[None]]
 
-async def add_document(temp_file_path: str, original_file_name: str) -> int:
+async def add_document(temp_file_path: str, original_file_name: str,
+                       on_progress: Optional[ProgressCallback] = None, doc_id: Optional[int] = None) -> int:
     """
     Process a document: extract text, chunk it, generate embeddings, 
     store in FAISS and database.
     
+    Pages are chunked as they are extracted, and chunks are embedded and
+    stored in batches of INGEST_BATCH_CHUNKS, so memory use does not grow
+    with the length of the document. Until the whole document is done,
+    each batch's vectors wait in a spool file rather than in the indexes, so
+    searches never see a half-indexed document, or two versions of one.
+    
     Args:
         temp_file_path: Path to the temporary uploaded file content.
         original_file_name: The original name of the file (e.g., "G05 Abstract.pdf").
+        on_progress: Optional async callback told about each stage
+        doc_id: Optional ID of an existing document to re-index; its current
+            chunks are replaced once the new ones are stored
         
     Returns:
         Document ID
     """
-    # Extract text from file using temp_file_path for content and original_file_name for type detection
-    extracted_text = extract_text(temp_file_path, original_filename=original_file_name)
-    
+    async def progress(stage: str):
+        if on_progress is not None:
+            await on_progress(stage, doc_id)
+
     # Determine mime_type using the original_file_name for storing in DB
     db_mime_type = detect_mimetype(original_file_name) 
     
-    # Create document in database
+    # Create document in database; chunks are stored against it as they are ready
+    previous_chunk_ids = []
+    if doc_id is not None:
+        await run_in_thread(update_document, doc_id, original_file_name, db_mime_type)
+        previous_chunk_ids = await run_in_thread(document_chunk_ids, doc_id)
+    else:
+        doc_id = await run_in_thread(create_document, original_file_name, db_mime_type)
+    
+    # If no chunks (e.g., empty doc or extraction failed to produce usable text),
+    # the document entry is still kept.
+    # Every chunk row inserted for the new version, added to as soon as each insert commits
+    chunk_ids: List[int] = []
+    try:
+        with tempfile.TemporaryFile(prefix="vectors-") as spool:
+            await progress("extracting")
+            chunker = PageChunker()
+            pending = []
+            async for page, text in iter_pages(temp_file_path, original_file_name):
+                pending += await run_in_thread(chunker.feed, text, page)
+                if len(pending) >= INGEST_BATCH_CHUNKS:
+                    await stage_chunks(doc_id, pending, spool, chunk_ids, progress)
+                    pending = []
+                    await progress("extracting")
+            pending += chunker.finish()
+            if pending:
+                await stage_chunks(doc_id, pending, spool, chunk_ids, progress)
+
+            await progress("indexing")
+            await run_in_thread(publish_staged_chunks, doc_id, chunk_ids, spool)
+    except Exception:
+        # Drop the partly stored new version; a re-indexed document keeps its old chunks
+        if chunk_ids:
+            await run_in_thread(remove_chunks, doc_id, keep_chunk_ids=previous_chunk_ids)
+        raise
+
+    if previous_chunk_ids:
+        # The old version stays searchable until the new one is in place
+        await run_in_thread(remove_chunks, doc_id, keep_chunk_ids=chunk_ids)
+    return doc_id
+
+async def stage_chunks(doc_id: int, chunks: List[Tuple[str, Optional[int]]], spool: BinaryIO,
+                       chunk_ids: List[int], progress: Callable[[str], Awaitable[None]]):
+    """
+    Embed one batch of (text, page) chunks, insert their rows and append their vectors to the spool.
+
+    The new rows' IDs are appended to chunk_ids as soon as they are
+    committed, so a failure after that point still finds them to clean up.
+    """
+    texts = [text for text, _ in chunks]
+    # Generate embeddings for all chunks
+    await progress("embedding")
+    embeddings = await embed(texts)
+
+    def stage():
+        chunk_ids.extend(insert_chunks(doc_id, texts, [page for _, page in chunks]))
+        spool.write(np.asarray(embeddings, dtype=np.float32).tobytes())
+
+    await run_in_thread(stage)
+
+def publish_staged_chunks(doc_id: int, chunk_ids: List[int], spool: BinaryIO):
+    """Add staged chunks to the vector and BM25 indexes, INGEST_BATCH_CHUNKS at a time. Blocking."""
+    spool.seek(0)
+    for start in range(0, len(chunk_ids), INGEST_BATCH_CHUNKS):
+        batch = chunk_ids[start:start + INGEST_BATCH_CHUNKS]
+        vectors = np.frombuffer(spool.read(len(batch) * EMBEDDING_DIMENSIONS * 4), dtype=np.float32)
+        with Session(engine) as session:
+            texts = dict(session.exec(select(Chunk.id, Chunk.text).where(Chunk.id.in_(batch))).all())
+        publish_chunks(doc_id, batch, [texts[chunk_id] for chunk_id in batch], vectors)
+        compact_if_needed()
+
+def create_document(name: str, mime_type: str) -> int:
+    """Insert a document row and return its ID."""
     with Session(engine) as session:
-        document = Document(name=original_file_name, mime_type=db_mime_type)
+        document = Document(name=name, mime_type=mime_type)
         session.add(document)
         session.commit()
         session.refresh(document)
-        doc_id = document.id
-    
-    # Chunk the text
-    # If extraction failed, extracted_text might be an error/warning string
-    if extracted_text.startswith("[Error") or extracted_text.startswith("[Warning"):
-        # Optionally, log this information or handle it
-        # For now, we proceed, but no chunks will be created if it's just a warning/error string
-        chunks = [] 
+        return document.id
+
+def update_document(doc_id: int, name: str, mime_type: str):
+    """
+    Rename an existing document row for a new version of its file.
+
+    Raises:
+        ValueError: If the document no longer exists
+    """
+    with Session(engine) as session:
+        document = session.get(Document, doc_id)
+        if document is None:
+            raise ValueError(f"Document {doc_id} not found")
+        document.name = name
+        document.mime_type = mime_type
+        session.add(document)
+        session.commit()
+
+def document_chunk_ids(doc_id: int) -> List[int]:
+    """Database IDs of a document's chunks."""
+    with Session(engine) as session:
+        return list(session.exec(select(Chunk.id).where(Chunk.doc_id == doc_id)).all())
+
+def delete_document(doc_id: int) -> bool:
+    """
+    Delete a document with its chunks and vectors.
+
+    Vectors are tombstoned, so they drop out of searches immediately; the
+    space they take is reclaimed by a later compaction.
+
+    Returns:
+        False if the document does not exist
+    """
+    with Session(engine) as session:
+        if session.get(Document, doc_id) is None:
+            return False
+
+    remove_chunks(doc_id)
+    with Session(engine) as session:
+        document = session.get(Document, doc_id)
+        if document is not None:
+            session.delete(document)
+            session.commit()
+    return True
+
+def remove_chunks(doc_id: int, keep_chunk_ids: Sequence[int] = ()) -> int:
+    """
+    Tombstone a document's vectors (on every shard, when sharded) and delete its chunk rows.
+
+    Args:
+        doc_id: Document whose chunks are removed
+        keep_chunk_ids: Chunks to leave in place (e.g. a freshly stored new version)
+
+    Returns:
+        Number of vectors tombstoned
+    """
+    keep = np.asarray(keep_chunk_ids, dtype=np.int64)
+    if shards is not None:
+        removed = shards.remove(doc_id, keep)
     else:
-        chunks = split_text(extracted_text)
+        removed = remove_chunk_vectors(doc_id, keep)
+    lexical_index.remove_document(doc_id, keep)
+
+    # The index goes first: a crash in between leaves rows that a retried delete removes
+    with Session(engine) as session:
+        statement = delete(Chunk).where(Chunk.doc_id == doc_id)
+        if len(keep):
+            statement = statement.where(Chunk.id.not_in(keep.tolist()))
+        session.execute(statement)
+        session.commit()
+    answer_cache.invalidate(doc_id)
+    return removed
+
+def remove_chunk_vectors(doc_id: int, keep_chunk_ids: Sequence[int] = ()) -> int:
+    """
+    Tombstone a document's vectors in this process's index, except those of keep_chunk_ids.
+
+    Returns:
+        Number of vectors tombstoned
+    """
+    keep = np.asarray(keep_chunk_ids, dtype=np.int64)
+    with index_lock.write():
+        check_writable()
+        faiss_ids = doc_vectors.get(doc_id, np.empty(0, dtype=np.int64))
+        dead = ~np.isin(id_map.lookup(faiss_ids), keep)
+        tombstone(faiss_ids[dead])
+        if dead.all():
+            doc_vectors.pop(doc_id, None)
+        else:
+            doc_vectors[doc_id] = faiss_ids[~dead]
+
+    schedule_compaction()
+    return int(dead.sum())
+
+def document_vector_counts() -> Dict[int, int]:
+    """Number of live vectors of each document in this process's index."""
+    with index_lock.read():
+        return {doc_id: len(faiss_ids) for doc_id, faiss_ids in doc_vectors.items()}
+
+def document_vectors(doc_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    A document's live chunk IDs and their vectors, e.g. to move them to another shard.
+
+    Vectors come from the full-precision store when it is complete, else
+    from the index; quantized indexes without the store only give back
+    approximations.
+    """
+    with index_lock.read():
+        faiss_ids = doc_vectors.get(doc_id, np.empty(0, dtype=np.int64))
+        chunk_ids = id_map.lookup(faiss_ids)
+        if has_exact_vectors():
+            vectors = vector_store.get(faiss_ids)
+        else:
+            vectors = index.reconstruct_batch(faiss_ids) if len(faiss_ids) else np.empty((0, index.d), np.float32)
+    return chunk_ids, vectors
+
+def tombstone(faiss_ids: np.ndarray):
+    """
+    Hide vectors from searches until a compaction removes them. Call with index_lock held for writing.
+    """
+    if not len(faiss_ids):
+        return
+    id_map.assign(faiss_ids, MISSING)
+    id_docs.assign(faiss_ids, MISSING)
+    vector_log.append_tombstones(index_epoch, faiss_ids)
+    refresh_tombstones()
+
+def refresh_tombstones():
+    """Recount tombstoned vectors and rebuild the selector that excludes them."""
+    global tombstone_count, live_selector
+
+    dead = np.flatnonzero(id_map.values == MISSING)
+    tombstone_count = len(dead)
+    live_selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(dead)) if len(dead) else None
+
+def store_chunks(doc_id: int, chunks: List[str], embeddings: List[List[float]],
+                 pages: Optional[Sequence[Optional[int]]] = None) -> List[int]:
+    """
+    Insert a document's chunks in one transaction and add their vectors to FAISS (or the document's shard) in one call.
     
+    Args:
+        doc_id: ID of the document the chunks belong to
+        chunks: Chunk texts
+        embeddings: Embedding vectors, one per chunk
+        pages: Optional page each chunk starts on
+        
+    Returns:
+        Database IDs of the inserted chunks, in input order
+    """
+    chunk_ids = insert_chunks(doc_id, chunks, pages)
+    if chunk_ids:
+        publish_chunks(doc_id, chunk_ids, chunks, embeddings)
+    return chunk_ids
+
+def insert_chunks(doc_id: int, chunks: List[str], pages: Optional[Sequence[Optional[int]]] = None) -> List[int]:
+    """
+    Insert chunk rows in one transaction. Rows are not found by searches until publish_chunks indexes them.
+
+    Returns:
+        Database IDs of the inserted chunks, in input order
+    """
     if not chunks:
-        # If no chunks (e.g., empty doc or extraction failed to produce usable text),
-        # still return doc_id as the document entry is created.
-        return doc_id
-    
-    # Generate embeddings for all chunks
-    embeddings = await embed(chunks)
-    
-    # Store chunks and embeddings
-    with Session(engine) as session:
-        for i, (chunk_text_content, embedding_vector) in enumerate(zip(chunks, embeddings)):
-            chunk = Chunk(doc_id=doc_id, text=chunk_text_content)
-            session.add(chunk)
+        return []
+
+    with metrics.span("sql_store"), Session(engine) as session:
+        # Single executemany-style INSERT ... RETURNING instead of a commit per chunk
+        statement = insert(Chunk).returning(Chunk.id, sort_by_parameter_order=True)
+        pages = pages or [None] * len(chunks)
+        rows = [{"doc_id": doc_id, "text": chunk_text_content, "page": page}
+                for chunk_text_content, page in zip(chunks, pages)]
+        chunk_ids = list(session.execute(statement, rows).scalars())
+        session.commit()
+    return chunk_ids
+
+def publish_chunks(doc_id: int, chunk_ids: List[int], chunks: List[str], embeddings: Any):
+    """
+    Add inserted chunks to the vector index (or the document's shard) and the BM25 index.
+
+    If the vectors cannot be stored, the chunk rows are deleted before the error propagates.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(chunk_ids), -1)
+    try:
+        if shards is not None:
+            shards.add(doc_id, chunk_ids, vectors)
+        else:
+            add_chunk_vectors(doc_id, chunk_ids, vectors)
+    except Exception:
+        # Rows without vectors or BM25 entries would make the document look indexed
+        with Session(engine) as session:
+            session.execute(delete(Chunk).where(Chunk.id.in_(chunk_ids)))
             session.commit()
-            session.refresh(chunk)
-            
-            vector = np.array([embedding_vector], dtype=np.float32)
-            faiss_id = index.ntotal
-            index.add(vector)
-            id_map[faiss_id] = chunk.id
-            
-    save_index()
-    return doc_id
+        raise
+    lexical_index.add(chunk_ids, [doc_id] * len(chunk_ids), chunks)
+    answer_cache.invalidate(doc_id)
+    return chunk_ids
+
+def add_chunk_vectors(doc_id: int, chunk_ids: Sequence[int], vectors: np.ndarray):
+    """
+    Add a document's chunk vectors to this process's index and log them.
+
+    Args:
+        doc_id: ID of the document the chunks belong to
+        chunk_ids: Database IDs of the chunks
+        vectors: Their embeddings, one row per chunk
+    """
+    global index
+
+    new_ids = np.array(chunk_ids, dtype=np.int64)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(new_ids), -1)
+    doc_ids = np.full(len(new_ids), doc_id, dtype=np.int64)
+    with index_lock.write():
+        check_writable()
+        first_faiss_id = index.ntotal
+        add_vectors(vectors)
+        id_map.append(new_ids)
+        id_docs.append(doc_ids)
+        faiss_ids = np.arange(first_faiss_id, first_faiss_id + len(new_ids), dtype=np.int64)
+        doc_vectors[doc_id] = np.concatenate([doc_vectors.get(doc_id, faiss_ids[:0]), faiss_ids])
+        # Persist just the new vectors; cost is proportional to this document
+        vector_log.append(index_epoch, first_faiss_id, new_ids, doc_ids, vectors)
+        if compaction_delta is not None:
+            compaction_delta.append(vectors)
+
+        # Switch to the configured index type once there are enough vectors to train it
+        index = ann.migrate_index(index, vectors=exact_vectors())
+
+def accepts_writes() -> bool:
+    """Whether uploads and deletions can be made through this process."""
+    return shards is not None or index_writable
+
+def check_writable():
+    """
+    Raises:
+        ReadOnlyIndexError: If another process writes the index files
+    """
+    if not index_writable:
+        raise ReadOnlyIndexError(f"The index at {FAISS_INDEX_PATH} is written by process {vector_log.lock_holder()}; "
+                                 "this process serves a read-only copy")
+
+def add_vectors(vectors: np.ndarray):
+    """
+    Add vectors to the index, and to the full-precision store if it is kept. Call with index_lock held for writing.
+    """
+    ensure_writable_index()
+    with metrics.span("faiss_add"):
+        # Rows must line up with FAISS ids, so an incomplete store is left alone
+        if KEEP_EXACT_VECTORS and len(vector_store) == index.ntotal:
+            vector_store.append(vectors)
+        index.add(vectors)
+
+def has_exact_vectors() -> bool:
+    """Whether the full-precision store holds every indexed vector."""
+    return bool(index.ntotal) and len(vector_store) == index.ntotal
+
+def exact_vectors() -> Optional[np.ndarray]:
+    """Full-precision copies of every indexed vector (memory-mapped), or None if they are not all kept."""
+    return vector_store.vectors() if has_exact_vectors() else None
+
+def fill_vector_store():
+    """
+    Catch the full-precision store up with the index when it is expected but incomplete.
+
+    Vectors can be read back exactly from flat, HNSW and IVF-flat indexes.
+    Quantized indexes only hold approximations, so re-ranking stays off for
+    them until the index is rebuilt from exact vectors (see migrate_index.py).
+    A read-only copy leaves filling the file to the writer.
+    """
+    if not KEEP_EXACT_VECTORS or len(vector_store) >= index.ntotal or vector_store.read_only:
+        return
+    index_type = ann.index_type_of(index)
+    if ann.is_quantized(index_type):
+        print(f"Warning: only {len(vector_store)} of {index.ntotal} full-precision vectors are stored for the "
+              f"{index_type} index; exact re-ranking is off.")
+        return
+    missing = np.arange(len(vector_store), index.ntotal)
+    for start in range(0, len(missing), 65536):
+        vector_store.append(index.reconstruct_batch(missing[start:start + 65536]))
+    print(f"Stored {len(missing)} full-precision vectors in {vector_store.path} for re-ranking.")
+
+def rerank_enabled() -> bool:
+    """Whether searches re-rank the quantized index's candidates against full-precision vectors."""
+    return FAISS_RERANK_FACTOR > 1 and ann.is_quantized(ann.index_type_of(index)) and has_exact_vectors()
+
+def rerank(query_vector: np.ndarray, faiss_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Order candidate FAISS ids by exact L2 distance to the query, using the full-precision store.
+
+    Returns:
+        (distances, FAISS ids) of the k nearest candidates, as 1 x k arrays like a FAISS search
+    """
+    faiss_ids = faiss_ids[faiss_ids >= 0]
+    distances = ((vector_store.get(faiss_ids) - query_vector) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return distances[order].reshape(1, -1), faiss_ids[order].reshape(1, -1)
+
+def ensure_writable_index():
+    """
+    Swap a memory-mapped index for an in-memory copy before it is modified.
+
+    Mapped indexes cannot be added to, so the first write in a worker re-reads
+    the (unchanged) snapshot file into private memory. Call with index_lock held for writing.
+    """
+    global index, index_mapped
+
+    if index_mapped:
+        index = faiss.read_index(snapshot_paths(index_epoch)["index"])
+        index_mapped = False
+
+def lookup_doc_ids(chunk_ids: np.ndarray) -> np.ndarray:
+    """
+    Find the document of each chunk with one range query.
+
+    Returns:
+        Document IDs aligned with chunk_ids; MISSING where the chunk no longer exists
+    """
+    doc_ids = np.full(len(chunk_ids), MISSING, dtype=np.int64)
+    known = chunk_ids[chunk_ids >= 0]
+    if not len(known):
+        return doc_ids
+
+    statement = select(Chunk.id, Chunk.doc_id).where(Chunk.id.between(int(known.min()), int(known.max())))
+    try:
+        with Session(engine) as session:
+            rows = np.array(session.exec(statement).all(), dtype=np.int64).reshape(-1, 2)
+    except Exception as e:
+        # The chunk table may not exist yet on a fresh database
+        print(f"Could not load chunk ownership for scoped search: {e}")
+        return doc_ids
+
+    if not len(rows):
+        return doc_ids
+    rows = rows[np.argsort(rows[:, 0])]
+    positions = np.searchsorted(rows[:, 0], chunk_ids).clip(max=len(rows) - 1)
+    found = rows[positions, 0] == chunk_ids
+    doc_ids[found] = rows[positions[found], 1]
+    return doc_ids
+
+def rebuild_doc_vectors():
+    """Rebuild the document -> FAISS ids lookup from id_docs."""
+    global doc_vectors
+
+    owners = id_docs.values
+    faiss_ids = np.flatnonzero(owners >= 0)
+    owners = owners[faiss_ids]
+    # Group FAISS ids by document with one stable sort instead of a Python loop
+    order = np.argsort(owners, kind="stable")
+    faiss_ids, owners = faiss_ids[order], owners[order]
+    documents, starts = np.unique(owners, return_index=True)
+    doc_vectors = {int(doc_id): ids for doc_id, ids in zip(documents, np.split(faiss_ids, starts[1:]))}
+
+def scope_faiss_ids(doc_ids: List[int]) -> np.ndarray:
+    """Sorted FAISS ids of the live vectors of the given documents."""
+    scoped = [doc_vectors[doc_id] for doc_id in set(doc_ids) if doc_id in doc_vectors]
+    return np.sort(np.concatenate(scoped)) if scoped else np.empty(0, dtype=np.int64)
+
+def scope_vectors(faiss_ids: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Exact vectors of a search scope, so it can be searched on its own instead of filtering a search of the whole index.
+
+    Returns:
+        None when the index can only give back approximations and the
+        full-precision store is missing, or the scope is too large to search exhaustively
+    """
+    # A flat index holds the vectors themselves, and scanning a subset of it is never more work than scanning it all
+    if ann.index_type_of(index) == "flat":
+        return index.reconstruct_batch(faiss_ids)
+    if len(faiss_ids) <= SCOPED_EXACT_SEARCH_MAX and has_exact_vectors():
+        return vector_store.get(faiss_ids)
+    return None
+
+def scope_selector(faiss_ids: np.ndarray) -> faiss.IDSelector:
+    """
+    Build a FAISS ID selector restricting a search to the given sorted FAISS ids.
+
+    Used for scopes that scope_vectors() cannot provide; the search still
+    visits the whole index and tests each id against the selector.
+    """
+    # Chunks of a document are added in one go, so a single document usually
+    # owns a contiguous id range, which is a cheaper membership test than a set.
+    first, last = int(faiss_ids[0]), int(faiss_ids[-1])
+    if last - first + 1 == len(faiss_ids):
+        return faiss.IDSelectorRange(first, last + 1)
+    # Hashed once per search; IDSelectorArray would scan the whole scope for every id tested
+    return faiss.IDSelectorBatch(faiss_ids)
+
+def snapshot_paths(epoch: int) -> Dict[str, str]:
+    """
+    Files of the snapshot generation `epoch`.
+
+    The meta file names the current generation and is the snapshot's commit point.
+    """
+    return {
+        "meta": f"{FAISS_INDEX_PATH}.meta.json",
+        "index": f"{FAISS_INDEX_PATH}.{epoch}.index",
+        "ids": f"{FAISS_INDEX_PATH}.{epoch}.ids.npy",
+        "docs": f"{FAISS_INDEX_PATH}.{epoch}.docs.npy",
+        "vectors": f"{FAISS_INDEX_PATH}.{epoch}.vectors",
+    }
+
+def load_legacy_index() -> bool:
+    """Load a snapshot in the old single-file format (.index + JSON .map), if present."""
+    global index, id_map, id_docs, index_epoch
 
-def load_index():
-    """Load FAISS index from disk if it exists."""
-    global index, id_map
-    
     index_file = f"{FAISS_INDEX_PATH}.index"
     map_file = f"{FAISS_INDEX_PATH}.map"
+    if not (os.path.exists(index_file) and os.path.exists(map_file)):
+        return False
+
+    index = faiss.read_index(index_file)
+    with open(map_file, "r") as f:
+        saved_map = json.load(f)
+    if "id_map" in saved_map:
+        index_epoch = saved_map["epoch"]
+        saved_map = saved_map["id_map"]
+    chunk_ids = np.full(index.ntotal, MISSING, dtype=np.int64)
+    for faiss_id, chunk_id in saved_map.items():
+        chunk_ids[int(faiss_id)] = chunk_id
+    id_map = IdArray(chunk_ids)
+    id_docs = IdArray(lookup_doc_ids(chunk_ids))
+    print(f"Successfully loaded FAISS index from {index_file} and map from {map_file}. Index size: {index.ntotal}")
+    return True
+
+def load_index() -> bool:
+    """
+    Load the FAISS index snapshot from disk if it exists, then replay the vector log on top of it.
+
+    Returns:
+        False if the snapshot could not be read and an empty index was started instead
+    """
+    global index, index_mapped, id_map, id_docs, index_epoch, vector_store, vectors_epoch, index_writable
+    global loaded_log_size, loaded_at
+
+    if shards is not None:
+        # The shard servers own the vectors; files under FAISS_INDEX_PATH may be one of theirs
+        print(f"Vectors are served by {len(shards)} shards.")
+        return True
+
+    # One process writes the files; others (e.g. extra uvicorn workers) load them read-only
+    index_writable = vector_log.lock()
+    if not index_writable:
+        print(f"Index files under {FAISS_INDEX_PATH} are written by process {vector_log.lock_holder()}; "
+              "serving a read-only copy. Uploads and deletions must go through that process.")
+
+    # Taken first, so records the writer appends while this runs count as unseen
+    loaded_log_size = vector_log.size()
+    loaded = True
+    index_epoch = 0
+    vectors_epoch = 0
+    # Full-precision rows to trust from an existing vector file; only a committed snapshot vouches for them
+    stored_rows = 0
+    index_mapped = False
+    meta_file = snapshot_paths(0)["meta"]
+    try:
+        if os.path.exists(meta_file):
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+            index_epoch = meta["epoch"]
+            # Saves that don't renumber FAISS ids keep using the vector file of an earlier generation
+            vectors_epoch = meta.get("vectors_epoch", index_epoch)
+            paths = snapshot_paths(index_epoch)
+            # Memory-mapped files are shared between processes through the page cache
+            flags = ann.mmap_flags(meta["index_type"]) if FAISS_MMAP else 0
+            index = faiss.read_index(paths["index"], flags)
+            index_mapped = flags != 0
+            id_map = IdArray(np.load(paths["ids"], mmap_mode="r" if FAISS_MMAP else None))
+            id_docs = IdArray(np.load(paths["docs"], mmap_mode="r" if FAISS_MMAP else None))
+            stored_rows = index.ntotal
+            print(f"Successfully loaded FAISS index snapshot {index_epoch} from {paths['index']}. Index size: {index.ntotal}")
+        elif not load_legacy_index():
+            print("FAISS index files not found. Initializing new index.")
+            index = new_index()
+            id_map = IdArray()
+            id_docs = IdArray()
+    except Exception as e:
+        print(f"Error loading index: {e}. Initializing new index.")
+        loaded = False
+        index = new_index()
+        index_mapped = False
+        id_map = IdArray()
+        id_docs = IdArray()
+        index_epoch = 0
+        vectors_epoch = 0
+        stored_rows = 0
+
+    # Rows past the snapshot are replayed from the vector log, into memory unless this process writes the files
+    vector_store = VectorStore(snapshot_paths(vectors_epoch)["vectors"], EMBEDDING_DIMENSIONS)
+    vector_store.open(stored_rows, read_only=not index_writable)
+    replay_vector_log()
+    fill_vector_store()
+    # A read-only store holding replayed rows in memory would copy every row to hand them over
+    migrated = ann.migrate_index(index, vectors=exact_vectors() if index_writable else None)
+    if migrated is not index:
+        index, index_mapped = migrated, False
+    rebuild_doc_vectors()
+    refresh_tombstones()
+    loaded_at = time.monotonic()
+    return loaded
+
+def committed_epoch() -> int:
+    """Snapshot generation the meta file currently names (0 if there is none)."""
+    try:
+        with open(snapshot_paths(0)["meta"], "r") as f:
+            return json.load(f)["epoch"]
+    except (OSError, ValueError, KeyError):
+        return 0
+
+def reload_if_stale() -> bool:
+    """
+    Bring a read-only copy up to date once the writer committed a snapshot or logged more changes. Blocking.
+
+    The reload holds index_lock for writing, so searches wait for it rather
+    than see a half-loaded index. Cached answers are dropped and the lexical
+    index is reconciled with the chunk table again, as both may predate the
+    writer's changes.
+
+    Returns:
+        True if the index was reloaded
+    """
+    if shards is not None or index_writable:
+        return False
+    if committed_epoch() == index_epoch and vector_log.size() == loaded_log_size:
+        return False
 
-    if os.path.exists(index_file) and os.path.exists(map_file):
+    with index_lock.write():
+        # The writer removes the previous generation once it commits a new one, which can
+        # pull files out from under a load; the next attempt reads the newer generation
+        for _ in range(3):
+            if load_index():
+                break
+    answer_cache.invalidate_all()
+    if lexical_loaded:
+        load_lexical_index()
+    print(f"Reloaded read-only index at snapshot {index_epoch}. Index size: {index.ntotal}")
+    return True
+
+async def reload_periodically():
+    """Reload a read-only copy every INDEX_RELOAD_SECONDS while it is stale, until cancelled."""
+    # A copy that takes over the writer lock (the writer exited) writes the files itself from then on
+    while not index_writable:
+        await asyncio.sleep(INDEX_RELOAD_SECONDS)
         try:
-            index = faiss.read_index(index_file)
-            with open(map_file, "r") as f:
-                # Ensure keys are integers after loading from JSON
-                id_map_str_keys = json.load(f)
-                id_map = {int(k): v for k, v in id_map_str_keys.items()}
-            print(f"Successfully loaded FAISS index from {index_file} and map from {map_file}. Index size: {index.ntotal}")
+            await run_in_thread(reload_if_stale)
         except Exception as e:
-            print(f"Error loading index: {e}. Initializing new index.")
-            index = faiss.IndexFlatL2(EMBEDDING_DIMENSIONS)
-            id_map = {}
-    else:
-        print("FAISS index files not found. Initializing new index.")
-        index = faiss.IndexFlatL2(EMBEDDING_DIMENSIONS)
-        id_map = {}
+            print(f"Error reloading index: {e}")
 
-def save_index():
-    """Save FAISS index to disk."""
+def load_lexical_index():
+    """
+    Load the saved BM25 index and bring it in line with the chunk table.
+
+    The lexical index is only saved with snapshots, so chunks added or
+    removed since then (or all of them, the first time) are indexed or
+    dropped here from the database. Called by the API server at startup,
+    once the tables exist.
+    """
+    global lexical_loaded
+
+    try:
+        lexical_index.load()
+    except Exception as e:
+        print(f"Error loading lexical index: {e}. Rebuilding it from the database.")
+
+    try:
+        with Session(engine) as session:
+            rows = np.array(session.exec(select(Chunk.id, Chunk.doc_id)).all(), dtype=np.int64).reshape(-1, 2)
+    except Exception as e:
+        print(f"Could not load chunks for the lexical index: {e}")
+        return
+
+    # Indexed chunks whose row is gone, or now belongs to another document (a reused id), are stale
+    indexed = lexical_index.entries()
+    rows = rows[np.argsort(rows[:, 0])]
+    current = np.zeros(len(indexed), dtype=bool)
+    if len(rows):
+        positions = np.searchsorted(rows[:, 0], indexed[:, 0]).clip(max=len(rows) - 1)
+        current = (rows[positions, 0] == indexed[:, 0]) & (rows[positions, 1] == indexed[:, 1])
+    removed = lexical_index.remove(indexed[~current, 0])
+    missing = rows[~np.isin(rows[:, 0], indexed[current, 0]), 0].tolist()
+
+    for start in range(0, len(missing), 1000):
+        batch = missing[start:start + 1000]
+        with Session(engine) as session:
+            chunks = session.exec(select(Chunk.id, Chunk.doc_id, Chunk.text).where(Chunk.id.in_(batch))).all()
+        lexical_index.add([chunk[0] for chunk in chunks], [chunk[1] for chunk in chunks],
+                          [chunk[2] for chunk in chunks])
+    if missing or removed:
+        print(f"Lexical index: indexed {len(missing)} and dropped {removed} chunks from the database. "
+              f"Index size: {len(lexical_index)}")
+    lexical_loaded = True
+
+def replay_vector_log():
+    """Add vectors logged since the snapshot was taken. Only the writer may truncate a torn tail."""
+    replayed = 0
+    deleted = 0
+    for first_faiss_id, chunk_ids, doc_ids, vectors in vector_log.replay(index_epoch, truncate=index_writable):
+        if vectors is None:
+            # Tombstone record: chunk_ids holds the deleted FAISS ids
+            faiss_ids = chunk_ids[chunk_ids < index.ntotal]
+            id_map.assign(faiss_ids, MISSING)
+            id_docs.assign(faiss_ids, MISSING)
+            deleted += len(faiss_ids)
+            continue
+        if first_faiss_id + len(chunk_ids) <= index.ntotal:
+            # Already part of the snapshot (crash between snapshot and log reset)
+            continue
+        if first_faiss_id != index.ntotal:
+            print(f"Warning: vector log record at FAISS ID {first_faiss_id} does not follow index size {index.ntotal}; ignoring the rest of the log.")
+            break
+        add_vectors(vectors)
+        id_map.append(chunk_ids)
+        # Records written before doc ids were logged fall back to the database
+        id_docs.append(doc_ids if doc_ids is not None else lookup_doc_ids(chunk_ids))
+        replayed += len(chunk_ids)
+    if replayed or deleted:
+        print(f"Replayed {replayed} vectors and {deleted} deletions from {vector_log.path}. Index size: {index.ntotal}")
+
+def write_snapshot(epoch: int, snapshot_index: faiss.Index, chunk_ids: IdArray, doc_ids: IdArray):
+    """Write the files of snapshot generation `epoch`. They take effect once committed."""
     dir_path = os.path.dirname(FAISS_INDEX_PATH)
     if dir_path and not os.path.exists(dir_path):
         os.makedirs(dir_path, exist_ok=True)
+
+    def write_array(array: IdArray):
+        # np.save appends ".npy" to bare paths, so hand it a file object
+        def write(path: str):
+            with open(path, "wb") as f:
+                np.save(f, array.values)
+        return write
+
+    paths = snapshot_paths(epoch)
+    atomic_write(paths["index"], lambda path: faiss.write_index(snapshot_index, path))
+    atomic_write(paths["ids"], write_array(chunk_ids))
+    atomic_write(paths["docs"], write_array(doc_ids))
+
+def commit_snapshot(epoch: int, snapshot_index: faiss.Index, snapshot_vectors_epoch: int):
+    """Make generation `epoch` the current snapshot by atomically replacing the meta file."""
+    meta = {"epoch": epoch, "index_type": ann.index_type_of(snapshot_index), "ntotal": snapshot_index.ntotal,
+            "vectors_epoch": snapshot_vectors_epoch}
+
+    def write(path: str):
+        with open(path, "w") as f:
+            json.dump(meta, f)
+
+    atomic_write(snapshot_paths(epoch)["meta"], write)
+
+def remove_snapshot(epoch: int):
+    """Delete the files of an old snapshot generation, and any legacy single-file snapshot."""
+    paths = snapshot_paths(epoch)
+    # Mapped files stay readable after unlinking, so other workers are unaffected
+    stale = [paths["index"], paths["ids"], paths["docs"], f"{FAISS_INDEX_PATH}.index", f"{FAISS_INDEX_PATH}.map"]
+    for path in stale:
+        if os.path.exists(path):
+            os.unlink(path)
+
+def next_epoch() -> int:
+    """
+    A snapshot generation number not used before.
+
+    Skips past epochs found only in the log, e.g. records of a compaction
+    that crashed before committing, so they are never replayed. Call with
+    snapshot_lock held: two snapshots given the same generation would
+    overwrite each other's files, and the log would be reset past vectors
+    neither of them holds.
+    """
+    if not snapshot_lock.locked():
+        raise RuntimeError("A snapshot generation was requested without holding snapshot_lock")
+    return max(index_epoch, vector_log.max_epoch) + 1
+
+def save_index():
+    """
+    Write a full snapshot of the FAISS index and id arrays, then clear the vector log.
+
+    A snapshot is a new generation of files; atomically replacing the meta
+    file commits it. A crash before that leaves the previous snapshot and the
+    full log in place; a crash after it leaves log records of the previous
+    generation, which are ignored on replay.
+    """
+    global index_epoch
+
+    with metrics.span("save_index"):
+        # When sharded, the shard servers persist the vectors; a read-only copy has nothing to save
+        if shards is None and index_writable:
+            try:
+                # The epoch is bumped and the snapshot written under snapshot_lock, which saves
+                # from ingest workers, compactions and shutdown all take; the shared index_lock alone
+                # would let two saves pick the same generation
+                with snapshot_lock:
+                    # Searches may continue while saving; adds wait until it is done
+                    with index_lock.read():
+                        previous, epoch = index_epoch, next_epoch()
+                        write_snapshot(epoch, index, id_map, id_docs)
+                        vector_store.sync()
+                        commit_snapshot(epoch, index, vectors_epoch)
+                        index_epoch = epoch
+                        vector_log.reset()
+                    remove_snapshot(previous)
+                print(f"Successfully saved FAISS index snapshot {epoch} to {snapshot_paths(epoch)['index']}.")
+            except Exception as e:
+                print(f"Error saving FAISS index: {e}")
+
+        # An index that was never loaded holds only this process's additions; saving it would drop the rest
+        if lexical_loaded and accepts_writes():
+            try:
+                lexical_index.save()
+            except Exception as e:
+                print(f"Error saving lexical index: {e}")
+
+def compact_if_needed():
+    """Fold the vector log into a new snapshot once it has grown past VECTOR_LOG_MAX_BYTES."""
+    # A running compaction writes a snapshot of its own
+    if vector_log.size() > VECTOR_LOG_MAX_BYTES and not snapshot_lock.locked():
+        save_index()
+
+def schedule_compaction():
+    """Start a background compaction once tombstones make up COMPACTION_THRESHOLD of the index."""
+    if index.ntotal and tombstone_count / index.ntotal >= COMPACTION_THRESHOLD and not snapshot_lock.locked():
+        get_thread_pool().submit(compact_index)
+
+def compact_index():
+    """
+    Rebuild the index without tombstoned vectors and swap it in.
+
+    The rebuild works on a private copy, so searches and uploads carry on
+    meanwhile. Vectors added or deleted during the rebuild are carried over
+    under a short write lock. FAISS ids are renumbered, so the result is
+    committed as a new snapshot generation.
+    """
+    global index, index_mapped, id_map, id_docs, index_epoch, compaction_delta, vector_store, vectors_epoch
+
+    if not snapshot_lock.acquire(blocking=False):
+        return
+    compacted = False
+    try:
+        with index_lock.read():
+            keep = np.flatnonzero(id_map.values != MISSING)
+            if len(keep) == index.ntotal:
+                return
+            # A mapped index is never modified in place; any other is copied so the rebuild can run unlocked
+            source = index if index_mapped else faiss.clone_index(index)
+            start_total = index.ntotal
+            chunk_ids = IdArray(id_map.values[keep])
+            doc_ids = IdArray(id_docs.values[keep])
+            # Rows below start_total are never rewritten, so they can be copied after the lock is released
+            copy_vectors = has_exact_vectors()
+            compaction_delta = []
+
+        print(f"Compacting FAISS index: dropping {start_total - len(keep)} of {start_total} vectors...")
+        rebuilt = ann.rebuild_index(source, keep)
+        del source
+        epoch = next_epoch()
+        write_snapshot(epoch, rebuilt, chunk_ids, doc_ids)
+        snapshot_total = rebuilt.ntotal
+        new_store = VectorStore(snapshot_paths(epoch)["vectors"], EMBEDDING_DIMENSIONS)
+        if copy_vectors:
+            new_store = vector_store.copy_rows(keep, new_store.path)
+
+        with index_lock.write():
+            if ann.index_type_of(index) != ann.index_type_of(rebuilt):
+                print("FAISS index was migrated during compaction; discarding the rebuilt index.")
+                remove_snapshot(epoch)
+                new_store.remove()
+                return
+
+            # Carry over uploads and deletions that happened while rebuilding
+            added = np.concatenate(compaction_delta) if compaction_delta else np.empty((0, index.d), dtype=np.float32)
+            added_chunk_ids = id_map.values[start_total:].copy()
+            added_doc_ids = id_docs.values[start_total:].copy()
+            late_deletes = np.flatnonzero(id_map.values[keep] == MISSING)
+            rebuilt.add(added)
+            if copy_vectors:
+                new_store.append(added)
+                new_store.sync()
+            chunk_ids.append(added_chunk_ids)
+            doc_ids.append(added_doc_ids)
+            chunk_ids.assign(late_deletes, MISSING)
+            doc_ids.assign(late_deletes, MISSING)
+
+            # The snapshot files predate these changes, so log them for the new generation before committing it
+            if len(added):
+                vector_log.append(epoch, snapshot_total, added_chunk_ids, added_doc_ids, added)
+            if len(late_deletes):
+                vector_log.append_tombstones(epoch, late_deletes)
+            commit_snapshot(epoch, rebuilt, epoch)
+
+            previous = index_epoch
+            previous_store = vector_store
+            index, index_mapped = rebuilt, False
+            id_map, id_docs = chunk_ids, doc_ids
+            index_epoch = epoch
+            vector_store, vectors_epoch = new_store, epoch
+            rebuild_doc_vectors()
+            refresh_tombstones()
+        remove_snapshot(previous)
+        previous_store.remove()
+        compacted = True
+        print(f"Compacted FAISS index into snapshot {epoch}. Index size: {index.ntotal}")
+    except Exception as e:
+        print(f"Error compacting FAISS index: {e}")
+    finally:
+        compaction_delta = None
+        snapshot_lock.release()
+
+    # Deletions made during the rebuild may already call for another pass
+    if compacted:
+        schedule_compaction()
+
+def index_stats() -> Dict[str, Any]:
+    """Size and state of the vector index. When sharded, fetches every shard's stats; blocking."""
+    if shards is not None:
+        shard_stats = shards.stats()
+        return {
+            "sharded": True,
+            "vectors": sum(stats.get("vectors", 0) for stats in shard_stats),
+            "shards": shard_stats,
+            "lexical": lexical_index.stats(),
+        }
+    return {
+        "index_type": ann.index_type_of(index),
+        "vectors": index.ntotal,
+        "tombstones": tombstone_count,
+        "snapshot_epoch": index_epoch,
+        "memory_mapped": index_mapped,
+        "exact_vectors": len(vector_store),
+        "exact_rerank": rerank_enabled(),
+        "lexical": lexical_index.stats(),
+        "read_only": not index_writable,
+        # How far behind the writer a read-only copy may be; its changes show up at the next reload
+        "loaded_seconds_ago": round(time.monotonic() - loaded_at, 1),
+    }
+
+def fetch_chunks(chunk_ids: List[int]) -> Dict[int, Tuple[Chunk, str]]:
+    """
+    Load chunks and the names of their documents in one query.
     
-    index_file = f"{FAISS_INDEX_PATH}.index"
-    map_file = f"{FAISS_INDEX_PATH}.map"
+    Args:
+        chunk_ids: Database IDs of the chunks to load
+        
+    Returns:
+        Dictionary mapping chunk ID to (chunk, document name). Chunks whose row
+        or document no longer exists are left out.
+    """
+    if not chunk_ids:
+        return {}
+
+    statement = (
+        select(Chunk, Document.name)
+        .join(Document, Chunk.doc_id == Document.id)
+        .where(Chunk.id.in_(set(chunk_ids)))
+    )
+    with metrics.span("sql_fetch"), Session(engine) as session:
+        rows = session.exec(statement).all()
+    return {chunk.id: (chunk, document_name) for chunk, document_name in rows}
+
+def search_vectors_batch(query_vectors: np.ndarray, k: int, doc_ids: Optional[List[int]] = None,
+                         nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+    """
+    Search for many query vectors with one FAISS call. Blocking; call it from a worker thread.
+
+    FAISS computes the distances of an n x d query matrix to the flat codes
+    as one matrix product, rather than n separate matrix-vector products.
 
+    Args:
+        query_vectors: n x d float32 query vectors
+        k: Number of results per query
+        doc_ids: Optional list of document IDs to restrict every search to
+        nprobe: Optional number of lists to visit for IVF indexes
+        ef_search: Optional search queue size for HNSW indexes
+
+    Returns:
+        For each query, a list of (chunk ID, distance) tuples, nearest first
+    """
+    with index_lock.read():
+        # Unscoped queries skip deleted vectors inside the FAISS kernel, so they still get k hits
+        selector = live_selector
+        scope_size = index.ntotal - tombstone_count
+        scoped_ids = None
+        if doc_ids:
+            scoped_ids = scope_faiss_ids(doc_ids)
+            scope_size = len(scoped_ids)
+
+        # Ensure k is not greater than the number of items in scope
+        actual_k = min(k, scope_size)
+        if actual_k == 0 : # Should be caught by index.ntotal == 0, but defensive check
+            return [[] for _ in range(len(query_vectors))]
+
+        scoped_vectors = scope_vectors(scoped_ids) if scoped_ids is not None else None
+        exact = False
+        if scoped_vectors is not None:
+            # Searching the scope's own vectors costs O(scope); a filtered search visits every vector in the index
+            with metrics.span("faiss_search"):
+                distances, positions = faiss.knn(query_vectors, scoped_vectors, actual_k)
+            indices = np.where(positions >= 0, scoped_ids[positions], -1)
+        else:
+            if scoped_ids is not None:
+                # Filtered inside the FAISS kernel, so scoped queries still get k hits
+                selector = scope_selector(scoped_ids)
+            params = ann.search_parameters(index, selector, nprobe=nprobe, ef_search=ef_search)
+            # Quantized distances are approximate: over-fetch, then re-rank the candidates exactly
+            exact = rerank_enabled()
+            fetch_k = min(actual_k * FAISS_RERANK_FACTOR, scope_size) if exact else actual_k
+            with metrics.span("faiss_search"):
+                distances, indices = index.search(query_vectors, fetch_k, params=params)
+        if exact:
+            with metrics.span("faiss_rerank"):
+                reranked = [rerank(query_vectors[row:row + 1], indices[row], actual_k) for row in range(len(indices))]
+            # Pad rows that had fewer candidates, as FAISS does
+            distances = np.full((len(indices), actual_k), np.inf, dtype=np.float32)
+            indices = np.full((len(indices), actual_k), -1, dtype=np.int64)
+            for row, (row_distances, row_ids) in enumerate(reranked):
+                distances[row, :row_ids.shape[1]] = row_distances[0]
+                indices[row, :row_ids.shape[1]] = row_ids[0]
+        # Map all hits at once; FAISS pads with -1 if fewer than k results are found
+        chunk_ids = id_map.lookup(indices)
+
+    unmapped = (indices >= 0) & (chunk_ids == MISSING)
+    if unmapped.any():
+        print(f"Warning: FAISS IDs {indices[unmapped].tolist()} not found in id_map.")
+    results = []
+    for row_chunk_ids, row_distances in zip(chunk_ids, distances):
+        found = row_chunk_ids != MISSING
+        # Plain ints and floats for JSON serialization
+        results.append(list(zip(row_chunk_ids[found].tolist(), row_distances[found].tolist())))
+    return results
+
+def index_is_empty() -> bool:
+    """Whether there are no vectors to search. A sharded index is not checked, and never counts as empty."""
+    return shards is None and index.ntotal == 0
+
+async def vector_search(query_vectors: np.ndarray, k: int, doc_ids: Optional[List[int]] = None,
+                        nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None) -> Tuple[List[List[Tuple[int, float]]], bool]:
+    """
+    Search this process's index in a worker thread, or scatter the search across the shards.
+
+    Returns:
+        (hits per query, partial), where partial means a shard failed to answer
+    """
+    if shards is not None:
+        return await shards.search(query_vectors, k, doc_ids, nprobe=nprobe, ef_search=ef_search)
+    hits = await run_in_thread(search_vectors_batch, query_vectors, k, doc_ids, nprobe=nprobe, ef_search=ef_search)
+    return hits, False
+
+async def embed_query(query: str) -> Optional[np.ndarray]:
+    """Embed a query as a 1 x d float32 array, or None if embedding failed or took longer than QUERY_EMBEDDING_TIMEOUT."""
+    return await embed_queries([query])
+
+async def embed_queries(queries: List[str], timeout: Optional[float] = QUERY_EMBEDDING_TIMEOUT) -> Optional[np.ndarray]:
+    """
+    Embed queries as an n x d float32 array, in as few API requests as their tokens allow.
+
+    Returns:
+        The embeddings, or None if embedding failed or took longer than timeout seconds
+    """
     try:
-        faiss.write_index(index, index_file)
-        with open(map_file, "w") as f:
-            json.dump(id_map, f)
-        print(f"Successfully saved FAISS index to {index_file} and map to {map_file}.")
+        query_embeddings = await asyncio.wait_for(embed(queries), timeout)
     except Exception as e:
-        print(f"Error saving FAISS index: {e}")
+        print(f"Could not embed {len(queries)} queries: {e!r}")
+        return None
+    if len(query_embeddings) != len(queries):
+        return None
+    return np.array(query_embeddings, dtype=np.float32).reshape(len(queries), -1)
 
-async def search(query: str, doc_ids: Optional[List[int]] = None, k: int = TOP_K) -> List[Dict[str, Any]]:
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], k: int) -> List[Tuple[int, float]]:
+    """
+    Merge ranked hit lists with reciprocal rank fusion.
+
+    Each chunk scores the sum of 1 / (RRF_K + rank) over the lists it appears
+    in. Only ranks count, since L2 distances and BM25 scores are not comparable.
+
+    Args:
+        rankings: Lists of (chunk ID, score) tuples, best match first
+        k: Number of results to return
+
+    Returns:
+        List of (chunk ID, fused score) tuples, best match first
+    """
+    fused: Dict[int, float] = {}
+    for hits in rankings:
+        for rank, (chunk_id, _) in enumerate(hits, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda hit: hit[1], reverse=True)[:k]
+
+async def search(query: str, doc_ids: Optional[List[int]] = None, k: int = TOP_K,
+                 nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                 query_vector: Optional[np.ndarray] = None,
+                 mode: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
     """
     Search for relevant chunks based on a query.
     
@@ -130,83 +1205,145 @@ async def search(query: str, doc_ids: Optional[List[int]] = None, k: int = TOP_K
         query: Search query
         doc_ids: Optional list of document IDs to restrict search to
         k: Number of results to return (ensure k <= index.ntotal if index is not empty)
+        nprobe: Optional number of lists to visit for IVF indexes
+        ef_search: Optional search queue size for HNSW indexes
+        query_vector: Optional 1 x d embedding of the query, if the caller already has it
+        mode: One of RETRIEVAL_MODES (default RETRIEVAL_MODE). Vector and
+            hybrid searches fall back to lexical if the query can't be embedded.
         
     Returns:
-        List of dictionaries with chunk information
+        (results, partial): a list of dictionaries with chunk information,
+        best match first, and whether a shard failed to answer so some
+        vector hits may be missing. The score is the L2 distance for vector
+        search, the BM25 score for lexical search and the fused rank score
+        for hybrid search.
     """
-    if index.ntotal == 0:
-        print("Search called but FAISS index is empty.")
-        return []
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Expected one of {', '.join(RETRIEVAL_MODES)}.")
 
-    query_embedding = await embed([query])
-    if not query_embedding:
-        return []
+    if index_is_empty():
+        # Lexical search does not need vectors, and hybrid search fuses its hits with none
+        if mode == "vector":
+            print("Search called but FAISS index is empty.")
+            return [], False
+    elif mode != "lexical" and query_vector is None:
+        query_vector = await embed_query(query)
+        if query_vector is None:
+            print("Falling back to lexical search.")
+            mode = "lexical"
     
-    query_vector = np.array(query_embedding[0], dtype=np.float32).reshape(1, -1)
-    
-    # Ensure k is not greater than the number of items in the index
-    actual_k = min(k, index.ntotal)
-    if actual_k == 0 : # Should be caught by index.ntotal == 0, but defensive check
-        return []
+    partial = False
+    if mode == "vector":
+        vector_hits, partial = await vector_search(query_vector, k, doc_ids, nprobe=nprobe, ef_search=ef_search)
+        hits = vector_hits[0]
+    elif mode == "lexical":
+        hits = await run_in_thread(lexical_index.search, query, k, doc_ids)
+    else:
+        candidates = max(k, HYBRID_CANDIDATES)
+        lexical_search = run_in_thread(lexical_index.search, query, candidates, doc_ids)
+        if query_vector is None:
+            # The vector index is empty
+            vector_hits, lexical_hits = [[]], await lexical_search
+        else:
+            (vector_hits, partial), lexical_hits = await asyncio.gather(
+                vector_search(query_vector, candidates, doc_ids, nprobe=nprobe, ef_search=ef_search),
+                lexical_search,
+            )
+        hits = reciprocal_rank_fusion([vector_hits[0], lexical_hits], k)
 
-    distances, indices = index.search(query_vector, actual_k)
-    
+    # Resolve every hit with a single joined query rather than two lookups per hit
+    chunk_rows = await run_in_thread(fetch_chunks, [chunk_id for chunk_id, _ in hits])
+    return hit_results(hits, chunk_rows), partial
+
+def hit_results(hits: List[Tuple[int, float]], chunk_rows: Dict[int, Tuple[Chunk, str]]) -> List[Dict[str, Any]]:
+    """Search results for (chunk ID, score) hits, in rank order, leaving out chunks that no longer exist."""
     results = []
-    with Session(engine) as session:
-        for i, faiss_id_int in enumerate(indices[0]): # faiss_id is an int
-            # FAISS can return -1 if fewer than k results are found or if vectors are identical.
-            if faiss_id_int < 0:
-                continue
-            
-            # id_map keys are integers
-            if faiss_id_int in id_map:
-                chunk_id = id_map[faiss_id_int]
-                chunk = session.get(Chunk, chunk_id)
-                if not chunk:
-                    continue
-                
-                if doc_ids and chunk.doc_id not in doc_ids:
-                    continue
-                    
-                document = session.get(Document, chunk.doc_id)
-                if not document:
-                    continue
-                    
-                results.append({
-                    "chunk_id": chunk_id,
-                    "document_id": chunk.doc_id,
-                    "document_name": document.name,
-                    "text": chunk.text,
-                    "score": float(distances[0][i]) # Ensure score is float for JSON serialization
-                })
-            else:
-                print(f"Warning: FAISS ID {faiss_id_int} not found in id_map.")
-
-    results.sort(key=lambda x: x["score"]) # Lower distance is better
-    return results # Already sliced to actual_k by FAISS search
-
-async def answer(question: str, doc_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    for chunk_id, score in hits:
+        if chunk_id not in chunk_rows:
+            continue
+        chunk, document_name = chunk_rows[chunk_id]
+        results.append({
+            "chunk_id": chunk_id,
+            "document_id": chunk.doc_id,
+            "document_name": document_name,
+            "text": chunk.text,
+            "page": chunk.page,
+            "score": score
+        })
+    return results
+
+async def search_batch(queries: List[str], doc_ids: Optional[List[int]] = None, k: int = TOP_K,
+                       nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                       query_vectors: Optional[np.ndarray] = None,
+                       mode: Optional[str] = None) -> Tuple[List[List[Dict[str, Any]]], bool]:
     """
-    Generate an answer for a question using RAG.
-    
+    Search for many queries at once: one embeddings call, one FAISS search and one chunk query for all of them.
+
     Args:
-        question: The question to answer
-        doc_ids: Optional list of document IDs to restrict search to
-        
+        queries: Search queries
+        doc_ids: Optional list of document IDs to restrict every search to
+        k: Number of results per query
+        nprobe: Optional number of lists to visit for IVF indexes
+        ef_search: Optional search queue size for HNSW indexes
+        query_vectors: Optional n x d embeddings of the queries, if the caller already has them
+        mode: One of RETRIEVAL_MODES (default RETRIEVAL_MODE). If the queries
+            can't be embedded, all of them fall back to lexical search.
+
     Returns:
-        Dictionary with answer and sources
+        (results, partial): for each query, its results as returned by
+        search(); and whether a shard failed to answer
     """
-    relevant_chunks = await search(question, doc_ids)
-    
-    if not relevant_chunks:
-        return {
-            "answer": "I couldn't find any relevant information to answer your question based on the current documents and query.",
-            "sources": []
-        }
-    
-    context = "\n\n---\n\n".join([chunk["text"] for chunk in relevant_chunks])
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Expected one of {', '.join(RETRIEVAL_MODES)}.")
+
+    if not queries:
+        return [], False
+    if index_is_empty():
+        # Lexical search does not need vectors, and hybrid search fuses its hits with none
+        if mode == "vector":
+            print("Batch search called but FAISS index is empty.")
+            return [[] for _ in queries], False
+    elif mode != "lexical" and query_vectors is None:
+        # A batch is not interactive, so it gets no embedding timeout
+        query_vectors = await embed_queries(queries, timeout=None)
+        if query_vectors is None:
+            print("Falling back to lexical search for the batch.")
+            mode = "lexical"
+
+    def search_lexical(candidates: int) -> List[List[Tuple[int, float]]]:
+        return [lexical_index.search(query, candidates, doc_ids) for query in queries]
+
+    partial = False
+    if mode == "vector":
+        hits, partial = await vector_search(query_vectors, k, doc_ids, nprobe=nprobe, ef_search=ef_search)
+    elif mode == "lexical":
+        hits = await run_in_thread(search_lexical, k)
+    else:
+        candidates = max(k, HYBRID_CANDIDATES)
+        lexical_search = run_in_thread(search_lexical, candidates)
+        if query_vectors is None:
+            # The vector index is empty
+            vector_hits, lexical_hits = [[] for _ in queries], await lexical_search
+        else:
+            (vector_hits, partial), lexical_hits = await asyncio.gather(
+                vector_search(query_vectors, candidates, doc_ids, nprobe=nprobe, ef_search=ef_search),
+                lexical_search,
+            )
+        hits = [reciprocal_rank_fusion([vector, lexical], k) for vector, lexical in zip(vector_hits, lexical_hits)]
+
+    chunk_rows = await run_in_thread(fetch_chunks, [chunk_id for query_hits in hits for chunk_id, _ in query_hits])
+    return [hit_results(query_hits, chunk_rows) for query_hits in hits], partial
+
+NO_RESULTS_ANSWER = "I couldn't find any relevant information to answer your question based on the current documents and query."
+LLM_ERROR_ANSWER = "[Error: Could not generate an answer due to an LLM API issue.]"
+
+def build_prompt(question: str, chunks: List[Dict[str, Any]]) -> str:
+    """Prompt asking the model to answer from the retrieved chunks only."""
+    context = "\n\n---\n\n".join([chunk["text"] for chunk in chunks])
     
-    prompt = f"""You are a helpful assistant that provides accurate information based on the given context.
+    return f"""You are a helpful assistant that provides accurate information based on the given context.
 If the information to answer the question is not in the context, say 'I don't have enough information to answer this question.'
 
 Context:
@@ -218,33 +1355,233 @@ Question: {question}
 
 Answer:"""
 
-    try:
-        client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = await client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        answer_text = response.choices[0].message.content
-    except Exception as e:
-        print(f"Error calling OpenAI for completion: {e}")
-        answer_text = "[Error: Could not generate an answer due to an LLM API issue.]"
-    
-    sources = [{
+def completion_request(question: str, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Arguments of the chat completion call that answers a question from its chunks."""
+    return {
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": build_prompt(question, chunks)}
+        ],
+        "temperature": 0.3,
+        "max_tokens": 500,
+    }
+
+def format_sources(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Source entries returned with an answer, with a short snippet of each chunk."""
+    return [{
         "chunk_id": chunk["chunk_id"],
         "document_id": chunk["document_id"], 
         "document_name": chunk["document_name"],
+        "page": chunk["page"],
         "snippet": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"]
-    } for chunk in relevant_chunks]
+    } for chunk in chunks]
+
+async def answer_stream(question: str, doc_ids: Optional[List[int]] = None, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None,
+                        mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Generate an answer for a question using RAG, as a stream of events.
     
-    return {
-        "answer": answer_text,
-        "sources": sources
-    }
+    Args:
+        question: The question to answer
+        doc_ids: Optional list of document IDs to restrict search to
+        nprobe: Optional number of lists to visit for IVF indexes
+        ef_search: Optional search queue size for HNSW indexes
+        mode: Optional retrieval mode; "lexical" answers without any embedding call
+        
+    Yields:
+        (event, data) tuples: ("sources", {"sources": [...]}) as soon as
+        retrieval is done, ("token", {"text": ...}) for each piece of the
+        answer as the model produces it, then ("done", {"answer": ...}) with
+        the full text, or ("error", {"answer": ...}) if the completion failed
+    """
+    # Repeated questions, and rephrasings of them, are served from the answer cache
+    mode = mode or RETRIEVAL_MODE
+    scope = make_scope(doc_ids, nprobe, ef_search, mode)
+    cached = answer_cache.get(question, scope)
+    start = time.perf_counter()
+    generation = answer_cache.generation
+    query_vector = None
+    degraded = False
+    if cached is None and mode != "lexical":
+        query_vector = await embed_query(question)
+        if query_vector is None:
+            # Embeddings API down or too slow: answer from the lexical index alone
+            degraded = True
+        else:
+            cached = answer_cache.get_similar(query_vector, scope)
+    if cached is None and query_vector is None:
+        # Lexical and degraded queries skip the semantic lookup, which counts misses
+        answer_cache.record_miss()
+    if cached is not None:
+        yield "sources", {"sources": cached["sources"]}
+        yield "token", {"text": cached["answer"]}
+        yield "done", {"answer": cached["answer"]}
+        return
+
+    relevant_chunks, partial = await search(question, doc_ids, nprobe=nprobe, ef_search=ef_search,
+                                            query_vector=query_vector, mode="lexical" if degraded else mode)
+    
+    sources = format_sources(relevant_chunks)
+    yield "sources", {"sources": sources}
+    if not relevant_chunks:
+        yield "token", {"text": NO_RESULTS_ANSWER}
+        yield "done", {"answer": NO_RESULTS_ANSWER}
+        return
+
+    parts = []
+    stream = None
+    # Time spent waiting on the API only; the time the consumer takes to send each token on is left out
+    completion_seconds = 0.0
+    try:
+        started = time.perf_counter()
+        try:
+            stream = await get_openai_client().chat.completions.create(
+                **completion_request(question, relevant_chunks), stream=True
+            )
+        finally:
+            completion_seconds += time.perf_counter() - started
+        # Forward tokens as they arrive instead of waiting for the whole completion
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                completion_seconds += time.perf_counter() - started
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                parts.append(text)
+                yield "token", {"text": text}
+    except Exception as e:
+        print(f"Error calling OpenAI for completion: {e}")
+        yield "error", {"answer": LLM_ERROR_ANSWER}
+        return
+    finally:
+        metrics.observe("llm_completion", completion_seconds)
+        # Also reached when the client disconnects mid-answer; stop generating tokens nobody reads
+        if stream is not None:
+            await stream.close()
+    
+    answer_text = "".join(parts)
+    # Lexical-mode answers are cached by question text only; fallback answers, and
+    # answers missing the hits of a shard that failed, are not cached
+    if not degraded and not partial:
+        result = {"answer": answer_text, "sources": sources}
+        answer_cache.put(question, scope, query_vector, result, time.perf_counter() - start, generation)
+    yield "done", {"answer": answer_text}
+
+async def answer(question: str, doc_ids: Optional[List[int]] = None, nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None, mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generate an answer for a question using RAG.
+    
+    Args:
+        question: The question to answer
+        doc_ids: Optional list of document IDs to restrict search to
+        nprobe: Optional number of lists to visit for IVF indexes
+        ef_search: Optional search queue size for HNSW indexes
+        mode: Optional retrieval mode; "lexical" answers without any embedding call
+        
+    Returns:
+        Dictionary with answer and sources
+    """
+    result = {"answer": "", "sources": []}
+    async for event, data in answer_stream(question, doc_ids, nprobe=nprobe, ef_search=ef_search, mode=mode):
+        if event == "sources":
+            result["sources"] = data["sources"]
+        elif event in ("done", "error"):
+            result["answer"] = data["answer"]
+    return result
+
+async def answer_batch(questions: List[str], doc_ids: Optional[List[int]] = None, nprobe: Optional[int] = None,
+                       ef_search: Optional[int] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Answer many questions in one pass.
+
+    Cached questions are answered from the answer cache. The rest are
+    embedded together in as few embeddings requests as their tokens allow,
+    searched with a single FAISS call over the n x d query matrix and a single
+    chunk lookup, and answered by up to BATCH_COMPLETION_CONCURRENCY
+    completions at a time, shared by all batches in progress.
+
+    Args:
+        questions: The questions to answer; repeats are answered once
+        doc_ids: Optional list of document IDs to restrict every search to
+        nprobe: Optional number of lists to visit for IVF indexes
+        ef_search: Optional search queue size for HNSW indexes
+        mode: Optional retrieval mode; "lexical" answers without any embedding call
+
+    Returns:
+        For each question, in order, a dictionary with answer and sources
+    """
+    mode = mode or RETRIEVAL_MODE
+    scope = make_scope(doc_ids, nprobe, ef_search, mode)
+    start = time.perf_counter()
+    generation = answer_cache.generation
+    unique = list(dict.fromkeys(questions))
+    results: Dict[str, Dict[str, Any]] = {}
+
+    pending = []
+    for question in unique:
+        cached = answer_cache.get(question, scope)
+        if cached is not None:
+            results[question] = cached
+        else:
+            pending.append(question)
+
+    query_vectors = None
+    degraded = False
+    if pending and mode != "lexical":
+        query_vectors = await embed_queries(pending, timeout=None)
+        if query_vectors is None:
+            # Embeddings API down: answer the whole batch from the lexical index alone
+            degraded = True
+        else:
+            misses = []
+            for position, question in enumerate(pending):
+                cached = answer_cache.get_similar(query_vectors[position:position + 1], scope)
+                if cached is not None:
+                    results[question] = cached
+                else:
+                    misses.append(position)
+            query_vectors = query_vectors[misses]
+            pending = [pending[position] for position in misses]
+    if pending and query_vectors is None:
+        # Lexical and degraded queries skip the semantic lookup, which counts misses
+        answer_cache.record_miss(len(pending))
+
+    if pending:
+        searched, partial = await search_batch(pending, doc_ids, nprobe=nprobe, ef_search=ef_search,
+                                               query_vectors=query_vectors, mode="lexical" if degraded else mode)
+        async def complete(position: int, question: str, chunks: List[Dict[str, Any]]):
+            sources = format_sources(chunks)
+            if not chunks:
+                results[question] = {"answer": NO_RESULTS_ANSWER, "sources": sources}
+                return
+            async with batch_completion_slots:
+                try:
+                    with metrics.span("llm_completion"):
+                        response = await get_openai_client().chat.completions.create(
+                            **completion_request(question, chunks))
+                    answer_text = response.choices[0].message.content or ""
+                except Exception as e:
+                    print(f"Error calling OpenAI for completion: {e}")
+                    results[question] = {"answer": LLM_ERROR_ANSWER, "sources": sources}
+                    return
+            results[question] = {"answer": answer_text, "sources": sources}
+            # As in answer_stream, fallback and partial answers are not cached
+            if not degraded and not partial:
+                query_vector = query_vectors[position:position + 1] if query_vectors is not None else None
+                answer_cache.put(question, scope, query_vector, results[question],
+                                 time.perf_counter() - start, generation)
+
+        await asyncio.gather(*(complete(position, question, chunks)
+                               for position, (question, chunks) in enumerate(zip(pending, searched))))
+
+    return [results[question] for question in questions]
 
 # Initialize by loading the index on startup
 load_index() 
\ No newline at end of file
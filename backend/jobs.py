@@ -0,0 +1,155 @@
+import os
+import asyncio
+import traceback
+from datetime import datetime
+from typing import List, Optional
+from sqlmodel import Session, select
+
+from models import Job, engine
+from concurrency import run_in_thread
+from index import add_document, document_chunk_ids, remove_chunks
+
+# Where uploads are spooled until their job has been processed
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Number of documents ingested concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+# Uploads accepted but not yet started before new ones are rejected
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 100))
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue cannot take another job."""
+
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+
+def get_queue() -> asyncio.Queue:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    return _queue
+
+def queue_is_full() -> bool:
+    return get_queue().full()
+
+def create_job(file_name: str, file_path: str, doc_id: Optional[int] = None) -> Job:
+    """Persist a new queued job; with a doc_id, the job re-indexes that document."""
+    with Session(engine) as session:
+        job = Job(file_name=file_name, file_path=file_path, doc_id=doc_id)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+def get_job(job_id: int) -> Optional[Job]:
+    with Session(engine) as session:
+        return session.get(Job, job_id)
+
+def update_job(job_id: int, **fields):
+    """Update a job's columns and bump updated_at."""
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        if job is None:
+            return
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+def unfinished_job_ids() -> List[int]:
+    """Jobs that were queued or interrupted mid-run, oldest first."""
+    with Session(engine) as session:
+        statement = select(Job.id).where(Job.status.in_(["queued", "running"])).order_by(Job.id)
+        return list(session.exec(statement).all())
+
+async def enqueue(job_id: int):
+    """
+    Queue a job for the ingestion workers.
+
+    Raises:
+        QueueFullError: If the queue is at capacity
+    """
+    try:
+        get_queue().put_nowait(job_id)
+    except asyncio.QueueFull:
+        raise QueueFullError()
+
+def discard_partial_chunks(job: Job):
+    """
+    Remove the chunks an interrupted run of a job stored, and their vectors.
+
+    They are the document's chunks past the job's watermark; a re-indexed
+    document keeps the chunks of its previous version.
+    """
+    chunk_ids = document_chunk_ids(job.doc_id)
+    previous = [chunk_id for chunk_id in chunk_ids if chunk_id <= job.chunk_watermark]
+    if len(previous) < len(chunk_ids):
+        remove_chunks(job.doc_id, keep_chunk_ids=previous)
+        print(f"Job {job.id}: discarded {len(chunk_ids) - len(previous)} chunks stored by its interrupted run.")
+
+async def process_job(job_id: int):
+    """Run one ingestion job to completion, recording progress and the outcome."""
+    job = await run_in_thread(get_job, job_id)
+    if job is None or job.status in ("done", "failed"):
+        return
+
+    if job.status == "running" and job.doc_id is not None and job.chunk_watermark is not None:
+        # Interrupted by a restart: start over rather than add a second copy of what was stored
+        await run_in_thread(discard_partial_chunks, job)
+        watermark = job.chunk_watermark
+    else:
+        existing = await run_in_thread(document_chunk_ids, job.doc_id) if job.doc_id is not None else []
+        watermark = max(existing, default=0)
+    await run_in_thread(update_job, job_id, status="running", error=None, chunk_watermark=watermark)
+
+    async def on_progress(stage: str, doc_id: Optional[int]):
+        await run_in_thread(update_job, job_id, stage=stage, doc_id=doc_id)
+
+    try:
+        # A job interrupted by a restart reuses the document row it already created
+        doc_id = await add_document(job.file_path, job.file_name, on_progress=on_progress, doc_id=job.doc_id)
+    except Exception as e:
+        traceback.print_exc()
+        await run_in_thread(update_job, job_id, status="failed", error=str(e))
+    else:
+        await run_in_thread(update_job, job_id, status="done", stage=None, doc_id=doc_id)
+    finally:
+        job = await run_in_thread(get_job, job_id)
+        if job is not None and job.status in ("done", "failed") and os.path.exists(job.file_path):
+            os.unlink(job.file_path)
+
+async def worker():
+    queue = get_queue()
+    while True:
+        job_id = await queue.get()
+        try:
+            await process_job(job_id)
+        except Exception as e:
+            print(f"Error processing ingestion job {job_id}: {e}")
+        finally:
+            queue.task_done()
+
+async def start_workers():
+    """Start the ingestion workers and requeue jobs left over from a previous run."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    queue = get_queue()
+    for _ in range(INGEST_WORKERS):
+        _workers.append(asyncio.create_task(worker()))
+
+    leftover = await run_in_thread(unfinished_job_ids)
+    if leftover:
+        print(f"Resuming {len(leftover)} unfinished ingestion jobs.")
+
+    async def requeue():
+        # Blocking puts: recovered jobs may outnumber the queue's capacity
+        for job_id in leftover:
+            await queue.put(job_id)
+
+    _workers.append(asyncio.create_task(requeue()))
+
+async def stop_workers():
+    """Cancel the workers; unfinished jobs stay in the database and resume on next start."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
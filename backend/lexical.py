@@ -0,0 +1,313 @@
+import os
+import re
+import math
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Optional, Sequence
+import numpy as np
+
+import metrics
+from concurrency import RWLock
+from id_array import IdArray, MISSING
+from vector_log import atomic_write
+
+# BM25 term-frequency saturation and document-length normalization
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+# Words, numbers and compound identifiers such as part numbers (XJ-220/B), versions (v1.2.3) or snake_case
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+PART_PATTERN = re.compile(r"[-./:_]")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its of on or that the their then there
+these this to was were what when where which who why will with you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase search terms of a text, without stopwords.
+
+    Compound tokens are kept whole, so an exact identifier matches as one
+    term, and are also split into their parts.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in PART_PATTERN.split(token) if part and part not in STOPWORDS)
+    return terms
+
+def encode_varint(value: int, out: bytearray):
+    """Append a non-negative integer to out as a little-endian base-128 varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """Varint-encode an array of non-negative integers in one vectorized pass."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for group in range(int(lengths.max()) if len(lengths) else 0):
+        present = lengths > group
+        bits = (values[present] >> np.uint64(7 * group)) & np.uint64(0x7F)
+        more = (lengths[present] > group + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[present] + group] = bits | more
+    return out.tobytes()
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """Decode a buffer of varints into an int64 array in one vectorized pass."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not (raw & 0x80).any():
+        # Every value fits in one byte, the common case for gaps and term frequencies
+        return raw.astype(np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Position of each byte within its varint, i.e. which 7-bit group it holds
+    group = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+    parts = (raw & 0x7F).astype(np.int64) << (7 * group)
+    return np.add.reduceat(parts, starts)
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over chunk texts.
+
+    Chunks get dense entry numbers in the order they are added, like FAISS
+    ids. Each term's posting list is a bytearray of (entry gap, term
+    frequency) pairs encoded as varints; since entries only grow, gaps are
+    small and most pairs take two bytes. Lists are decoded with numpy at query
+    time. Removed chunks are tombstoned and dropped from the lists by
+    compact(), which renumbers the entries.
+    """
+
+    def __init__(self, path: str, compaction_threshold: float = 0.2):
+        self.path = path
+        self.compaction_threshold = compaction_threshold
+        self._lock = RWLock()
+        self._reset()
+
+    def _reset(self):
+        self._terms: Dict[str, int] = {}
+        self._postings: List[bytearray] = []
+        # Last entry added to each term's posting list, to compute the next gap
+        self._last = array("q")
+        # Entry -> chunk id, document id and length in terms
+        self.chunk_ids = IdArray()
+        self.doc_ids = IdArray()
+        self.lengths = IdArray()
+        self.live_count = 0
+        self.live_length = 0
+        self.tombstones = 0
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    def add(self, chunk_ids: Sequence[int], doc_ids: Sequence[int], texts: Sequence[str]):
+        """
+        Index chunks.
+
+        Args:
+            chunk_ids: Database IDs of the chunks
+            doc_ids: Document of each chunk
+            texts: Chunk texts
+        """
+        # Tokenize before taking the lock so searches are not held up by it
+        term_counts = [Counter(tokenize(text)) for text in texts]
+        with self._lock.write():
+            entry = len(self.chunk_ids)
+            lengths = []
+            for counts in term_counts:
+                for term, frequency in counts.items():
+                    term_id = self._terms.get(term)
+                    if term_id is None:
+                        term_id = self._terms[term] = len(self._postings)
+                        self._postings.append(bytearray())
+                        self._last.append(-1)
+                    postings = self._postings[term_id]
+                    encode_varint(entry - self._last[term_id], postings)
+                    encode_varint(frequency, postings)
+                    self._last[term_id] = entry
+                lengths.append(sum(counts.values()))
+                entry += 1
+            self.chunk_ids.append(chunk_ids)
+            self.doc_ids.append(doc_ids)
+            self.lengths.append(lengths)
+            self.live_count += len(lengths)
+            self.live_length += sum(lengths)
+
+    def remove(self, chunk_ids: Sequence[int]) -> int:
+        """Tombstone the given chunks. Returns the number removed."""
+        with self._lock.write():
+            entries = np.flatnonzero(np.isin(self.chunk_ids.values, np.asarray(chunk_ids, dtype=np.int64)))
+            return self._tombstone(entries)
+
+    def remove_document(self, doc_id: int, keep_chunk_ids: Sequence[int] = ()) -> int:
+        """Tombstone a document's chunks except keep_chunk_ids. Returns the number removed."""
+        with self._lock.write():
+            entries = np.flatnonzero(self.doc_ids.values == doc_id)
+            kept = np.isin(self.chunk_ids.values[entries], np.asarray(keep_chunk_ids, dtype=np.int64))
+            return self._tombstone(entries[~kept])
+
+    def _tombstone(self, entries: np.ndarray) -> int:
+        entries = entries[self.chunk_ids.values[entries] != MISSING]
+        if len(entries):
+            self.live_length -= int(self.lengths.values[entries].sum())
+            self.live_count -= len(entries)
+            self.tombstones += len(entries)
+            self.chunk_ids.assign(entries, MISSING)
+            self.doc_ids.assign(entries, MISSING)
+        return len(entries)
+
+    def entries(self) -> np.ndarray:
+        """(chunk id, document id) rows of every live chunk."""
+        with self._lock.read():
+            live = self.chunk_ids.values != MISSING
+            return np.stack([self.chunk_ids.values[live], self.doc_ids.values[live]], axis=1)
+
+    def _decode(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Entries and term frequencies of a posting list."""
+        values = decode_varints(self._postings[term_id])
+        # The first gap of every list is counted from entry -1
+        return np.cumsum(values[0::2]) - 1, values[1::2]
+
+    def search(self, query: str, k: int, doc_ids: Optional[List[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Rank chunks against a query with BM25. Blocking; call it from a worker thread.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            doc_ids: Optional list of document IDs to restrict search to
+
+        Returns:
+            List of (chunk ID, BM25 score) tuples, best match first
+        """
+        terms = set(tokenize(query))
+        with metrics.span("lexical_search"), self._lock.read():
+            if not self.live_count or not terms:
+                return []
+            average_length = self.live_length / self.live_count
+            chunk_ids = self.chunk_ids.values
+            scope = np.asarray(doc_ids, dtype=np.int64) if doc_ids else None
+
+            matched_entries, matched_scores = [], []
+            for term in terms:
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                entries, frequencies = self._decode(term_id)
+                entries_live = chunk_ids[entries] != MISSING
+                entries, frequencies = entries[entries_live], frequencies[entries_live]
+                if not len(entries):
+                    continue
+                # Document frequency over the whole collection, so scoped scores match unscoped ones
+                idf = math.log(1 + (self.live_count - len(entries) + 0.5) / (len(entries) + 0.5))
+                if scope is not None:
+                    in_scope = np.isin(self.doc_ids.values[entries], scope)
+                    entries, frequencies = entries[in_scope], frequencies[in_scope]
+                frequencies = frequencies.astype(np.float64)
+                norms = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths.values[entries] / average_length)
+                matched_entries.append(entries)
+                matched_scores.append(idf * frequencies * (BM25_K1 + 1) / (frequencies + norms))
+
+            if not matched_entries:
+                return []
+            entries, positions = np.unique(np.concatenate(matched_entries), return_inverse=True)
+            if not len(entries):
+                return []
+            scores = np.bincount(positions, weights=np.concatenate(matched_scores), minlength=len(entries))
+            k = min(k, len(entries))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return list(zip(chunk_ids[entries[top]].tolist(), scores[top].tolist()))
+
+    def compact(self):
+        """Drop tombstoned chunks from the posting lists and renumber the entries densely."""
+        with self._lock.write():
+            if not self.tombstones:
+                return
+            live = self.chunk_ids.values != MISSING
+            new_entries = np.cumsum(live) - 1
+            terms, postings, last = {}, [], array("q")
+            for term, term_id in self._terms.items():
+                entries, frequencies = self._decode(term_id)
+                kept = live[entries]
+                if not kept.any():
+                    continue
+                entries = new_entries[entries[kept]]
+                pairs = np.empty(2 * len(entries), dtype=np.int64)
+                pairs[0::2] = np.diff(entries, prepend=-1)
+                pairs[1::2] = frequencies[kept]
+                terms[term] = len(postings)
+                postings.append(bytearray(encode_varints(pairs)))
+                last.append(int(entries[-1]))
+            self._terms, self._postings, self._last = terms, postings, last
+            self.chunk_ids = IdArray(self.chunk_ids.values[live].copy())
+            self.doc_ids = IdArray(self.doc_ids.values[live].copy())
+            self.lengths = IdArray(self.lengths.values[live].copy())
+            self.tombstones = 0
+
+    def save(self):
+        """Write the index to self.path, compacting it first if enough of it is tombstoned."""
+        if self.tombstones > self.compaction_threshold * max(len(self.chunk_ids), 1):
+            self.compact()
+
+        with self._lock.read():
+            terms = sorted(self._terms, key=self._terms.get)
+            sizes = np.array([len(self._postings[self._terms[term]]) for term in terms], dtype=np.int64)
+            arrays = {
+                # Terms never contain whitespace, so one newline-separated string holds them all
+                "terms": np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                "offsets": np.concatenate(([0], np.cumsum(sizes))),
+                "postings": np.frombuffer(b"".join(self._postings), dtype=np.uint8),
+                "last": np.frombuffer(self._last, dtype=np.int64),
+                "chunk_ids": self.chunk_ids.values,
+                "doc_ids": self.doc_ids.values,
+                "lengths": self.lengths.values,
+            }
+
+            def write(path: str):
+                with open(path, "wb") as f:
+                    np.savez(f, **arrays)
+
+            atomic_write(self.path, write)
+
+    def load(self) -> bool:
+        """Replace the index with the one saved at self.path. Returns False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with np.load(self.path) as saved:
+            terms = saved["terms"].tobytes().decode("utf-8").split("\n") if len(saved["terms"]) else []
+            offsets, blob = saved["offsets"], saved["postings"].tobytes()
+            with self._lock.write():
+                self._reset()
+                self._terms = {term: term_id for term_id, term in enumerate(terms)}
+                self._postings = [bytearray(blob[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+                self._last = array("q", saved["last"].tobytes())
+                self.chunk_ids = IdArray(saved["chunk_ids"])
+                self.doc_ids = IdArray(saved["doc_ids"])
+                self.lengths = IdArray(saved["lengths"])
+                live = self.chunk_ids.values != MISSING
+                self.live_count = int(live.sum())
+                self.live_length = int(self.lengths.values[live].sum())
+                self.tombstones = len(live) - self.live_count
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Size of the index and of its posting lists."""
+        with self._lock.read():
+            postings_bytes = sum(len(postings) for postings in self._postings)
+            return {
+                "chunks": self.live_count,
+                "tombstones": self.tombstones,
+                "terms": len(self._terms),
+                "postings_bytes": postings_bytes,
+            }
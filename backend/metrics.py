@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import profiler
+
+# Add a Server-Timing header with the time each stage took to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+# Histogram bucket upper bounds, in seconds: 0.5 ms to 60 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stages spans are recorded for. Spans do not nest: time in one stage is never also counted in another.
+STAGES = (
+    "extract",          # reading text out of PDF, DOCX and TXT files (in worker processes)
+    "clean",            # clean_text
+    "tokenize",         # encoding text to token ids, for chunking and embedding batches
+    "chunk",            # cutting token ids into chunks
+    "embed_queue",      # waiting for one of EMBEDDING_CONCURRENCY request slots
+    "embed_request",    # embeddings API round trip
+    "faiss_add",
+    "faiss_search",
+    "faiss_rerank",     # exact re-ranking of candidates from quantized indexes
+    "shard_add",        # sending a document's vectors to its shard
+    "shard_search",     # scatter-gather search across all shards, until the slowest answers
+    "lexical_search",   # BM25
+    "sql_store",        # inserting chunks
+    "sql_fetch",        # resolving search hits to chunks and documents
+    "llm_completion",   # chat completion, from request to last token (waits on the API only, for streams)
+    "save_index",
+)
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus expects it."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+class Registry:
+    """Latency histograms of pipeline stages and of HTTP requests, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Every stage is exported from the start, with zero counts until it runs
+        self._stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self._requests: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route, str(status))
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self) -> str:
+        """All histograms in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP quickrag_stage_seconds Time spent in each stage of ingestion and querying.",
+                      "# TYPE quickrag_stage_seconds histogram"]
+            for stage, histogram in sorted(self._stages.items()):
+                lines += _histogram_lines("quickrag_stage_seconds", f'stage="{stage}"', histogram)
+            lines += ["# HELP quickrag_request_seconds HTTP request duration, until the last byte of the response.",
+                      "# TYPE quickrag_request_seconds histogram"]
+            for (method, route, status), histogram in sorted(self._requests.items()):
+                labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+                lines += _histogram_lines("quickrag_request_seconds", labels, histogram)
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+registry = Registry()
+
+# Seconds per stage for the request being handled, if anything is collecting them
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+# Spans recorded in a worker process, to be sent back with the result
+_worker_spans: Optional[List[Tuple[str, float]]] = None
+
+def observe(stage: str, seconds: float):
+    """Record that a stage took `seconds`, in its histogram and in the current request's timings."""
+    if _worker_spans is not None:
+        _worker_spans.append((stage, seconds))
+        return
+    registry.observe_stage(stage, seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as one occurrence of a stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def call_with_spans(func: Callable, *args, **kwargs) -> Tuple[Any, List[Tuple[str, float]]]:
+    """
+    Run func in a worker process and return its result with the spans it recorded.
+
+    Histograms live in the server process, so run_in_process replays the
+    spans there with record_spans.
+    """
+    global _worker_spans
+
+    _worker_spans = []
+    try:
+        return func(*args, **kwargs), _worker_spans
+    finally:
+        _worker_spans = None
+
+def record_spans(spans: List[Tuple[str, float]]):
+    for stage, seconds in spans:
+        observe(stage, seconds)
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Server-Timing header value, durations in milliseconds."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+class TimingMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its last body byte.
+
+    Collects the stage spans recorded while handling the request (including
+    in worker threads and processes) and, with SERVER_TIMING on, adds them as
+    a Server-Timing header. Streamed responses send their headers before the
+    work is done, so the header only covers what happened before the first
+    byte. Slow requests are handed to the sampling profiler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        profile = profiler.sampler.begin()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING and timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            seconds = time.perf_counter() - start
+            _timings.reset(token)
+            # The route template rather than the path, so /documents/{doc_id} is one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.observe_request(scope["method"], route, status, seconds)
+            profiler.sampler.end(profile, seconds, f"{scope['method']} {scope['path']}")
@@ -0,0 +1,55 @@
+"""
+Convert the saved FAISS index to another index type, offline.
+
+Loads the current snapshot (or a legacy <prefix>.index + <prefix>.map pair)
+and its vector log, stores full-precision copies of the vectors for exact
+re-ranking when the target type is quantized, builds the target index from
+the exact vectors and commits it as a new snapshot. The server does the same
+on startup, but running it ahead of time keeps the rebuild out of worker
+startup.
+
+Usage (from the backend directory, with the server stopped):
+    python migrate_index.py --index-type sq_int8
+"""
+import argparse
+import os
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-type", required=True, help="target FAISS_INDEX_TYPE, e.g. sq_fp16, sq_int8 or ivf_pq")
+    parser.add_argument("--index-path", default=os.getenv("FAISS_INDEX_PATH", ".faiss"),
+                        help="FAISS_INDEX_PATH prefix of the saved index (default %(default)s)")
+    args = parser.parse_args()
+
+    # The ann and index modules read their settings, and index loads the snapshot, on import
+    os.environ["FAISS_INDEX_TYPE"] = args.index_type
+    os.environ["FAISS_INDEX_PATH"] = args.index_path
+    os.environ["FAISS_MMAP"] = "0"
+    import ann
+    if args.index_type not in ann.INDEX_TYPES:
+        parser.error(f"unknown index type '{args.index_type}'; expected one of {', '.join(ann.INDEX_TYPES)}")
+    import faiss
+    import index
+
+    if not index.index_writable:
+        print(f"The index at {args.index_path} is in use by process {index.vector_log.lock_holder()}; stop the server first.")
+        return 1
+    index_type = ann.index_type_of(index.index)
+    if index_type != args.index_type:
+        print(f"Not enough vectors to build {args.index_type} yet ({index.index.ntotal}); "
+              f"the index stays {index_type} and is migrated once it grows.")
+        return 1
+
+    index.save_index()
+    stats = index.index_stats()
+    print(f"Index: {stats['index_type']}, {stats['vectors']} vectors, "
+          f"{faiss.serialize_index(index.index).nbytes / 2**20:.1f} MB in memory")
+    if index.KEEP_EXACT_VECTORS:
+        print(f"Full-precision vectors: {stats['exact_vectors']} in {index.vector_store.path} "
+              f"({index.vector_store.nbytes / 2**20:.1f} MB, memory-mapped), "
+              f"exact re-ranking {'on' if stats['exact_rerank'] else 'off'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
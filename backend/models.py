@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
+from sqlalchemy import inspect, text
 from sqlmodel import Field, SQLModel, create_engine, Session
 
 class Document(SQLModel, table=True):
@@ -12,6 +13,29 @@ class Chunk(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     doc_id: int = Field(foreign_key="document.id")
     text: str
+    page: Optional[int] = None  # Page the chunk starts on, for formats with pages
+
+class Job(SQLModel, table=True):
+    """A queued document ingestion, persisted so it survives restarts."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_name: str
+    file_path: str  # Spooled copy of the upload, removed once ingestion finishes
+    status: str = "queued"  # queued, running, done or failed
+    stage: Optional[str] = None  # Progress within a running job
+    doc_id: Optional[int] = None
+    # Highest ID among the document's chunks when the job started; the job's own chunks come after it
+    chunk_watermark: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ShardRemoval(SQLModel, table=True):
+    """A document removal a shard missed while it was unreachable, replayed once it answers again."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    shard_url: str = Field(index=True)
+    doc_id: int
+    keep_chunk_ids: str = "[]"  # JSON list of the chunk IDs the removal leaves in place
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Connection string for SQLite database
 DATABASE_URL = "sqlite:///quick_rag.db"
@@ -19,6 +43,12 @@ engine = create_engine(DATABASE_URL)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # create_all only creates missing tables; add columns introduced since a database was created
+    added_columns = [("chunk", "page", "INTEGER"), ("job", "chunk_watermark", "INTEGER")]
+    for table, column, column_type in added_columns:
+        if column not in {existing["name"] for existing in inspect(engine).get_columns(table)}:
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
 
 def get_session():
     with Session(engine) as session:
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+# Requests slower than this are profiled and their stacks written to PROFILE_DIR; 0 turns the profiler off
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", 0))
+# Milliseconds between stack samples while a request is in flight
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Stacks without a frame from this directory are idle threads, and are not counted
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class SamplingProfiler:
+    """
+    Statistical profiler for slow requests.
+
+    While at least one request is in flight, a background thread samples the
+    stack of every thread (the event loop and the worker pools) each
+    interval, and counts the stacks that run backend code against every
+    request in flight. When a
+    request turns out slower than the threshold, its counts are written out
+    in folded-stack format (one "thread;frame;frame count" line per stack),
+    which flamegraph.pl and speedscope read. Requests running at the same
+    time share samples, since async code interleaves on one thread; worker
+    process stacks are not included.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float, directory: str):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.profiles_written = 0
+        self._lock = threading.Lock()
+        self._active: Dict[int, Counter] = {}
+        self._next_id = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def begin(self) -> Optional[int]:
+        """Start collecting samples for a request; returns a handle for end(), or None when disabled."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            handle = self._next_id
+            self._next_id += 1
+            self._active[handle] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return handle
+
+    def end(self, handle: Optional[int], seconds: float, label: str):
+        """Stop collecting for a request, and write its profile if it took longer than the threshold."""
+        if handle is None:
+            return
+        with self._lock:
+            samples = self._active.pop(handle)
+        if seconds < self.threshold or not samples:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{handle}-{label.replace(' ', '-').replace('/', '_')}.folded"
+            path = os.path.join(self.directory, name)
+            with open(path, "w") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.profiles_written += 1
+            print(f"Slow request ({seconds * 1000:.0f} ms): {label}; profile written to {path}")
+        except OSError as e:
+            print(f"Could not write profile of slow request {label}: {e}")
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                busy = False
+                while frame is not None:
+                    code = frame.f_code
+                    directory, file_name = os.path.split(code.co_filename)
+                    busy = busy or directory == BACKEND_DIR
+                    frames.append(f"{code.co_name} ({file_name})")
+                    frame = frame.f_back
+                if not busy:
+                    continue
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks.append(";".join(reversed(frames)))
+            with self._lock:
+                for samples in self._active.values():
+                    samples.update(stacks)
+
+sampler = SamplingProfiler(PROFILE_SLOW_REQUEST_MS, PROFILE_INTERVAL_MS, PROFILE_DIR)
@@ -0,0 +1,78 @@
+"""
+Move documents to the shards that own them after shards were added.
+
+Documents are assigned to shards by rendezvous hashing on the shard list,
+so appending a shard moves only the documents the new shard wins (about
+1/N of them). Start the new shard servers, point the API server at the
+longer INDEX_SHARDS list, then run this with the same list. Queries keep
+working while it runs; hold off uploads and deletions until it is done.
+
+With --import-index, it first copies every document of an unsharded index
+(e.g. the API server's own .faiss files, with the server stopped) to the
+shard that owns it. The unsharded files are only read, never written.
+
+Usage (from the backend directory):
+    python rebalance_shards.py --shards http://127.0.0.1:8100,http://127.0.0.1:8101,http://127.0.0.1:8102
+    python rebalance_shards.py --shards http://127.0.0.1:8100,http://127.0.0.1:8101 --import-index .faiss
+"""
+import argparse
+import os
+import sys
+import time
+
+def import_index(shard_set, index_path: str):
+    """Copy every document of an unsharded index to its owner shard; returns (documents, vectors), or None."""
+    # The index module reads its settings, and loads the snapshot, on import; only the vectors are needed
+    os.environ["FAISS_INDEX_PATH"] = index_path
+    os.environ["INDEX_VECTORS_ONLY"] = "1"
+    import index
+
+    if not index.index_writable:
+        print(f"The index at {index_path} is in use by process {index.vector_log.lock_holder()}; stop the server first.")
+        return None
+    documents = vectors = 0
+    for doc_id in index.document_vector_counts():
+        chunk_ids, doc_vectors = index.document_vectors(doc_id)
+        # Clear any copy an interrupted import left behind
+        shard_set.remove(doc_id)
+        shard_set.add(doc_id, chunk_ids, doc_vectors)
+        documents += 1
+        vectors += len(chunk_ids)
+    return documents, vectors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", default=os.getenv("INDEX_SHARDS", ""),
+                        help="comma-separated shard URLs, in INDEX_SHARDS order (default: $INDEX_SHARDS)")
+    parser.add_argument("--import-index", metavar="PREFIX",
+                        help="FAISS_INDEX_PATH of an unsharded index to copy onto the shards first")
+    args = parser.parse_args()
+
+    urls = [url.strip().rstrip("/") for url in args.shards.split(",") if url.strip()]
+    if not urls:
+        parser.error("no shards given; pass --shards or set INDEX_SHARDS")
+    # This process only talks to the shards; it never serves them itself
+    os.environ.pop("INDEX_SHARDS", None)
+    from models import create_db_and_tables
+    from shards import ShardSet
+
+    # Removals shards missed are kept in the API server's database (quick_rag.db in this directory)
+    create_db_and_tables()
+    shard_set = ShardSet(urls)
+    start = time.perf_counter()
+    if args.import_index:
+        imported = import_index(shard_set, args.import_index)
+        if imported is None:
+            return 1
+        print(f"Imported {imported[0]} documents ({imported[1]} vectors) from {args.import_index}.")
+    documents, vectors = shard_set.rebalance()
+    # Snapshot the moves so restarts don't have to replay them from the logs
+    shard_set.save()
+    print(f"Moved {documents} documents ({vectors} vectors) across {len(urls)} shards "
+          f"in {time.perf_counter() - start:.1f} s.")
+    for stats in shard_set.stats():
+        print(f"  {stats['url']}: {stats.get('vectors', stats.get('error'))} vectors")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Serve one shard of a partitioned vector index.
+
+A shard server is a process holding its own FAISS index, id arrays, vector
+log and snapshots under its own FAISS_INDEX_PATH prefix, just like the API
+server's in-process index, but without the database or the lexical index:
+the document of every vector is logged alongside it. The API server (with
+INDEX_SHARDS set) sends each document's vectors to one shard and scatters
+searches across all of them. Request and response bodies are .npz arrays
+(see shards.py).
+
+Usage (from the backend directory, one process per shard):
+    python shard_server.py --shard 0 --port 8100
+    python shard_server.py --shard 1 --port 8101
+    INDEX_SHARDS=http://127.0.0.1:8100,http://127.0.0.1:8101 uvicorn app:app
+"""
+import argparse
+import os
+import sys
+
+def create_app():
+    """The shard's FastAPI app; import after the environment is set, as it loads the index."""
+    from typing import Optional
+    import numpy as np
+    from fastapi import FastAPI, Request, Response
+    from fastapi.responses import PlainTextResponse
+
+    import index
+    from concurrency import start_pools, shutdown_pools, run_in_thread
+    from metrics import TimingMiddleware, registry as metrics_registry
+    from shards import encode_arrays, decode_arrays
+
+    app = FastAPI(title="Quick-RAG index shard")
+    app.add_middleware(TimingMiddleware)
+
+    def npz_response(**arrays: np.ndarray) -> Response:
+        return Response(encode_arrays(**arrays), media_type="application/octet-stream")
+
+    def add_and_compact(doc_id: int, chunk_ids: np.ndarray, vectors: np.ndarray):
+        index.add_chunk_vectors(doc_id, chunk_ids, vectors)
+        index.compact_if_needed()
+
+    @app.on_event("startup")
+    async def on_startup():
+        start_pools()
+
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        index.save_index()
+        shutdown_pools()
+
+    @app.post("/documents/{doc_id}/vectors")
+    async def add_vectors(doc_id: int, request: Request):
+        arrays = decode_arrays(await request.body())
+        await run_in_thread(add_and_compact, doc_id, arrays["chunk_ids"], arrays["vectors"])
+        return {"added": len(arrays["chunk_ids"])}
+
+    @app.post("/documents/{doc_id}/remove")
+    async def remove_vectors(doc_id: int, request: Request):
+        arrays = decode_arrays(await request.body())
+        removed = await run_in_thread(index.remove_chunk_vectors, doc_id, arrays["keep"])
+        return {"removed": removed}
+
+    @app.get("/documents")
+    async def list_documents():
+        """Number of live vectors per document on this shard."""
+        return await run_in_thread(index.document_vector_counts)
+
+    @app.get("/documents/{doc_id}/vectors")
+    async def get_vectors(doc_id: int):
+        chunk_ids, vectors = await run_in_thread(index.document_vectors, doc_id)
+        return npz_response(chunk_ids=chunk_ids, vectors=vectors)
+
+    @app.post("/search")
+    async def search(request: Request, k: int, doc_ids: Optional[str] = None,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """
+        k nearest chunks for each query vector, as n x k chunk_ids and distances arrays padded with -1 and inf.
+        """
+        query_vectors = decode_arrays(await request.body())["query_vectors"]
+        scope = [int(doc_id) for doc_id in doc_ids.split(",")] if doc_ids else None
+        hits = await run_in_thread(index.search_vectors_batch, query_vectors, k, scope,
+                                   nprobe=nprobe, ef_search=ef_search)
+        chunk_ids = np.full((len(query_vectors), k), -1, dtype=np.int64)
+        distances = np.full((len(query_vectors), k), np.inf, dtype=np.float32)
+        for row, row_hits in enumerate(hits):
+            for column, (chunk_id, distance) in enumerate(row_hits):
+                chunk_ids[row, column] = chunk_id
+                distances[row, column] = distance
+        return npz_response(chunk_ids=chunk_ids, distances=distances)
+
+    @app.post("/save")
+    async def save():
+        await run_in_thread(index.save_index)
+        return {"epoch": index.index_epoch}
+
+    @app.get("/stats")
+    async def get_stats():
+        return index.index_stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics():
+        return metrics_registry.render()
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shard", type=int, required=True, help="position of this shard in INDEX_SHARDS")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--index-path", help="FAISS_INDEX_PATH prefix of this shard's files "
+                                             "(default: <FAISS_INDEX_PATH>.shard<n>)")
+    args = parser.parse_args()
+
+    # The index module reads its settings, and loads the snapshot, on import
+    os.environ["FAISS_INDEX_PATH"] = args.index_path or f"{os.getenv('FAISS_INDEX_PATH', '.faiss')}.shard{args.shard}"
+    os.environ["INDEX_VECTORS_ONLY"] = "1"
+    os.environ.pop("INDEX_SHARDS", None)
+    import uvicorn
+
+    print(f"Shard {args.shard}: index files under {os.environ['FAISS_INDEX_PATH']}")
+    app = create_app()
+    import index
+    # Each shard needs index files of its own; another process writing them would corrupt its log
+    if not index.index_writable:
+        print(f"The index at {os.environ['FAISS_INDEX_PATH']} is in use by process {index.vector_log.lock_holder()}; "
+              "give every shard its own --index-path.")
+        return 1
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
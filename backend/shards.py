@@ -0,0 +1,330 @@
+import io
+import os
+import json
+import asyncio
+import hashlib
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import httpx
+import numpy as np
+from sqlmodel import Session, select
+
+import metrics
+from concurrency import run_in_thread
+from models import ShardRemoval, engine
+
+# Base URLs of the shard servers (shard_server.py), comma separated; empty keeps the index in this process.
+# Shards are identified by their position, so new shards go at the end of the list.
+INDEX_SHARDS = [url.strip().rstrip("/") for url in os.getenv("INDEX_SHARDS", "").split(",") if url.strip()]
+# Seconds to wait for a shard
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", 30))
+# Seconds between retries of removals a shard missed while it was unreachable
+SHARD_RETRY_INTERVAL = float(os.getenv("SHARD_RETRY_INTERVAL", 30))
+
+def encode_arrays(**arrays: np.ndarray) -> bytes:
+    """Arrays as an uncompressed .npz body, the payload format of the shard protocol."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+def decode_arrays(body: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(body), allow_pickle=False) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+def shard_weight(doc_id: int, shard: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{doc_id}:{shard}".encode(), digest_size=8).digest(), "little")
+
+def owner_shard(doc_id: int, shard_count: int) -> int:
+    """
+    The shard a document's vectors live on, by rendezvous hashing of the document ID.
+
+    Every (document, shard) pair gets a pseudo-random weight and the heaviest
+    shard wins. Adding a shard only moves the documents the new shard now
+    wins, about 1/N of them; every other document keeps its shard.
+    """
+    return max(range(shard_count), key=lambda shard: shard_weight(doc_id, shard))
+
+def record_missed_removal(url: str, doc_id: int, keep_chunk_ids: np.ndarray):
+    """Persist a removal a shard missed; a later one for the same document supersedes it."""
+    with Session(engine) as session:
+        for missed in session.exec(select(ShardRemoval).where(ShardRemoval.shard_url == url,
+                                                              ShardRemoval.doc_id == doc_id)):
+            session.delete(missed)
+        session.add(ShardRemoval(shard_url=url, doc_id=doc_id, keep_chunk_ids=json.dumps(keep_chunk_ids.tolist())))
+        session.commit()
+
+def clear_missed_removal(url: str, doc_id: int):
+    with Session(engine) as session:
+        for missed in session.exec(select(ShardRemoval).where(ShardRemoval.shard_url == url,
+                                                              ShardRemoval.doc_id == doc_id)):
+            session.delete(missed)
+        session.commit()
+
+def missed_removals(url: str) -> List[Tuple[int, np.ndarray]]:
+    """(document ID, chunk IDs to keep) of every removal a shard has yet to apply, oldest first."""
+    with Session(engine) as session:
+        statement = select(ShardRemoval).where(ShardRemoval.shard_url == url).order_by(ShardRemoval.id)
+        return [(missed.doc_id, np.asarray(json.loads(missed.keep_chunk_ids), dtype=np.int64))
+                for missed in session.exec(statement)]
+
+def merge_hits(shard_hits: Sequence[List[Tuple[int, float]]], k: int) -> List[Tuple[int, float]]:
+    """
+    Merge per-shard hit lists, each nearest first, into the overall k nearest.
+
+    A heap merge only looks at as many hits as it returns. A chunk found on
+    two shards (mid-rebalance) is kept once.
+    """
+    merged, seen = [], set()
+    for chunk_id, distance in heapq.merge(*shard_hits, key=lambda hit: hit[1]):
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        merged.append((chunk_id, distance))
+        if len(merged) == k:
+            break
+    return merged
+
+class ShardSet:
+    """
+    Client for a vector index partitioned across shard server processes.
+
+    Each document's vectors live on one shard, chosen by owner_shard.
+    Searches are scattered to every shard at once and their top-k lists
+    merged. Writes are blocking calls made from worker threads, like local
+    index writes; searches run on the event loop. Removals a shard misses
+    while it is down are stored in the database and replayed before
+    anything else is written to it.
+    """
+
+    def __init__(self, urls: List[str], timeout: float = SHARD_TIMEOUT):
+        self.urls = urls
+        self.timeout = timeout
+        self._client = httpx.Client(timeout=timeout)
+        # Created on first use, inside the running event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
+        # Fans removals out to all shards at once
+        self._pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="shard")
+        # Keep replays of missed removals ordered before other writes to the same shard
+        self._write_locks = [threading.Lock() for _ in urls]
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def owner(self, doc_id: int) -> int:
+        return owner_shard(doc_id, len(self.urls))
+
+    def _post(self, shard: int, path: str, body: bytes) -> httpx.Response:
+        response = self._client.post(f"{self.urls[shard]}{path}", content=body,
+                                     headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+        return response
+
+    def add(self, doc_id: int, chunk_ids: Sequence[int], vectors: np.ndarray, shard: Optional[int] = None):
+        """Add a document's vectors to its shard (or the given one). Blocking."""
+        shard = self.owner(doc_id) if shard is None else shard
+        body = encode_arrays(chunk_ids=np.asarray(chunk_ids, dtype=np.int64),
+                             vectors=np.asarray(vectors, dtype=np.float32))
+        with self._write_locks[shard]:
+            # A removal the shard missed must not land after, and tombstone, these vectors
+            self._replay_missed(shard)
+            with metrics.span("shard_add"):
+                self._post(shard, f"/documents/{doc_id}/vectors", body)
+
+    def _remove_from(self, shard: int, doc_id: int, keep: np.ndarray) -> int:
+        """Remove a document's vectors, except keep, from one shard. Raises if the shard fails."""
+        with self._write_locks[shard]:
+            self._replay_missed(shard)
+            removed = self._post(shard, f"/documents/{doc_id}/remove", encode_arrays(keep=keep)).json()["removed"]
+            # This removal supersedes any older one the shard missed for the document
+            clear_missed_removal(self.urls[shard], doc_id)
+        return removed
+
+    def remove(self, doc_id: int, keep_chunk_ids: Sequence[int] = ()) -> int:
+        """
+        Tombstone a document's vectors, except keep_chunk_ids, on every shard at once. Blocking.
+
+        Asks every shard, since a document can sit on a shard other than its
+        owner until a rebalance moves it. A shard that cannot be reached does
+        not fail the removal: it is recorded and replayed once the shard
+        answers again (replay_missed), so deletions keep working while a
+        shard is down and the removal is applied exactly as asked.
+
+        Returns:
+            Number of vectors removed by the shards that answered
+        """
+        keep = np.asarray(keep_chunk_ids, dtype=np.int64)
+        futures = [self._pool.submit(self._remove_from, shard, doc_id, keep) for shard in range(len(self.urls))]
+        removed = 0
+        for shard, future in enumerate(futures):
+            try:
+                removed += future.result()
+            except httpx.HTTPError as e:
+                print(f"Shard {shard} ({self.urls[shard]}) missed the removal of document {doc_id}: {e!r}; "
+                      "it is retried once the shard is back.")
+                record_missed_removal(self.urls[shard], doc_id, keep)
+        return removed
+
+    def _replay_missed(self, shard: int) -> int:
+        """Apply the removals a shard missed. Call with its write lock held; raises if the shard fails."""
+        url = self.urls[shard]
+        replayed = 0
+        for doc_id, keep in missed_removals(url):
+            self._post(shard, f"/documents/{doc_id}/remove", encode_arrays(keep=keep))
+            clear_missed_removal(url, doc_id)
+            replayed += 1
+        if replayed:
+            print(f"Replayed {replayed} removals that shard {shard} ({url}) had missed.")
+        return replayed
+
+    def replay_missed(self) -> int:
+        """
+        Apply removals shards missed while they were down, on every shard that answers. Blocking.
+
+        Returns:
+            Number of removals replayed
+        """
+        replayed = 0
+        for shard in range(len(self.urls)):
+            try:
+                with self._write_locks[shard]:
+                    replayed += self._replay_missed(shard)
+            except httpx.HTTPError:
+                continue
+        return replayed
+
+    async def retry_missed_removals(self):
+        """Replay missed removals every SHARD_RETRY_INTERVAL seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(SHARD_RETRY_INTERVAL)
+            try:
+                await run_in_thread(self.replay_missed)
+            except Exception as e:
+                print(f"Error replaying missed shard removals: {e}")
+
+    def documents(self, shard: int) -> Dict[int, int]:
+        """Number of live vectors per document on a shard."""
+        response = self._client.get(f"{self.urls[shard]}/documents")
+        response.raise_for_status()
+        return {int(doc_id): count for doc_id, count in response.json().items()}
+
+    def document_vectors(self, shard: int, doc_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk IDs, vectors) of a document on a shard."""
+        response = self._client.get(f"{self.urls[shard]}/documents/{doc_id}/vectors")
+        response.raise_for_status()
+        arrays = decode_arrays(response.content)
+        return arrays["chunk_ids"], arrays["vectors"]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """index_stats() of every shard; unreachable shards report their error."""
+        results = []
+        for url in self.urls:
+            try:
+                response = self._client.get(f"{url}/stats")
+                response.raise_for_status()
+                results.append({"url": url, **response.json()})
+            except httpx.HTTPError as e:
+                results.append({"url": url, "error": repr(e)})
+        return results
+
+    def save(self):
+        """Ask every shard to write a snapshot. Blocking."""
+        for shard in range(len(self.urls)):
+            self._post(shard, "/save", b"")
+
+    def rebalance(self) -> Tuple[int, int]:
+        """
+        Move every document to the shard that owns it under the current shard list.
+
+        Run after appending shards. A document is copied to its new shard
+        before it is removed from the old one, and search merges drop the
+        duplicates meanwhile, so queries keep working throughout; pause
+        uploads and deletions until it finishes. Safe to re-run after an
+        interruption. Blocking.
+
+        Returns:
+            (documents moved, vectors moved)
+        """
+        moved_documents = moved_vectors = 0
+        # Vectors a shard should already have dropped must not be copied elsewhere
+        for shard in range(len(self.urls)):
+            with self._write_locks[shard]:
+                self._replay_missed(shard)
+        for source in range(len(self.urls)):
+            for doc_id in self.documents(source):
+                target = self.owner(doc_id)
+                if target == source:
+                    continue
+                chunk_ids, vectors = self.document_vectors(source, doc_id)
+                # Clear any partial copy an interrupted rebalance left on the target
+                empty = np.empty(0, dtype=np.int64)
+                self._remove_from(target, doc_id, empty)
+                self.add(doc_id, chunk_ids, vectors, shard=target)
+                self._remove_from(source, doc_id, empty)
+                moved_documents += 1
+                moved_vectors += len(chunk_ids)
+        return moved_documents, moved_vectors
+
+    async def _search_shard(self, shard: int, body: bytes, params: Dict[str, Any]) -> Optional[Dict[str, np.ndarray]]:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await self._async_client.post(f"{self.urls[shard]}/search", content=body, params=params,
+                                                     headers={"Content-Type": "application/octet-stream"})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"Shard {shard} ({self.urls[shard]}) failed to search: {e!r}")
+            return None
+        return decode_arrays(response.content)
+
+    async def search(self, query_vectors: np.ndarray, k: int, doc_ids: Optional[List[int]] = None,
+                     nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None) -> Tuple[List[List[Tuple[int, float]]], bool]:
+        """
+        Search every shard concurrently and merge their results.
+
+        Args:
+            query_vectors: n x d float32 query vectors
+            k: Number of results per query
+            doc_ids: Optional list of document IDs to restrict every search to
+            nprobe: Optional number of lists to visit for IVF indexes
+            ef_search: Optional search queue size for HNSW indexes
+
+        Returns:
+            (results, partial): for each query, a list of (chunk ID, distance)
+            tuples, nearest first; and whether any shard failed. A shard that
+            fails is left out of the merge rather than failing the query, so
+            partial results must not be cached as if they were complete.
+        """
+        params = {"k": k}
+        if doc_ids:
+            params["doc_ids"] = ",".join(str(doc_id) for doc_id in doc_ids)
+        if nprobe is not None:
+            params["nprobe"] = nprobe
+        if ef_search is not None:
+            params["ef_search"] = ef_search
+        body = encode_arrays(query_vectors=np.asarray(query_vectors, dtype=np.float32))
+
+        with metrics.span("shard_search"):
+            responses = await asyncio.gather(*(self._search_shard(shard, body, params)
+                                               for shard in range(len(self.urls))))
+        partial = any(response is None for response in responses)
+        responses = [response for response in responses if response is not None]
+        results = []
+        for row in range(len(query_vectors)):
+            # Shards pad short rows with -1; those sort last and are dropped
+            shard_hits = [[(chunk_id, distance) for chunk_id, distance in
+                           zip(response["chunk_ids"][row].tolist(), response["distances"][row].tolist())
+                           if chunk_id >= 0]
+                          for response in responses]
+            results.append(merge_hits(shard_hits, k))
+        return results, partial
+
+    async def aclose(self):
+        self._pool.shutdown(wait=False)
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+shards = ShardSet(INDEX_SHARDS) if INDEX_SHARDS else None
@@ -0,0 +1,133 @@
+"""
+Shared setup and fixtures for the backend unit tests.
+
+Run from the backend directory with `python -m pytest`. The models and
+index modules create quick_rag.db and the index files relative to the
+working directory when they are imported, so the tests run in a scratch
+directory with every path pointed into it.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="quick-rag-tests-")
+os.chdir(WORKDIR)
+os.environ["FAISS_INDEX_PATH"] = os.path.join(WORKDIR, ".faiss")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(WORKDIR, "embedding_cache.db")
+os.environ["UPLOAD_DIR"] = os.path.join(WORKDIR, "uploads")
+# The tests never talk to shard servers
+os.environ.pop("INDEX_SHARDS", None)
+
+DIMENSIONS = 1536
+
+
+@pytest.fixture
+def rng():
+    """A seeded random generator, so every run sees the same vectors."""
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def random_vectors(rng):
+    """Draw count x dimensions float32 vectors from the seeded generator."""
+    def draw(count, dimensions=DIMENSIONS):
+        return rng.standard_normal((count, dimensions), dtype=np.float32)
+    return draw
+
+
+def text_vector(text):
+    """Deterministic unit vector for a text, as the fake embeddings API returns it."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIMENSIONS, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddings:
+    """Stand-in for client.embeddings that fails a number of times before answering."""
+
+    def __init__(self):
+        self.failures = 0
+        self.calls = 0
+        self.inputs = []
+
+    async def create(self, model, input):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("embeddings API unavailable")
+        self.inputs.append(list(input))
+        # Out of order, as the API does not promise input order
+        data = [SimpleNamespace(index=i, embedding=text_vector(text).tolist()) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+class FakeStream:
+    """Stand-in for a streamed completion that sends the whole answer in one chunk."""
+
+    def __init__(self, text):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])]
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def close(self):
+        pass
+
+
+class FakeCompletions:
+    """Stand-in for client.chat.completions that answers with the question it was asked."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        question = prompt.split("Question: ", 1)[1].split("\n", 1)[0]
+        if stream:
+            return FakeStream(f"Answer to {question}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Answer to {question}"))])
+
+
+@pytest.fixture
+def openai_client(monkeypatch):
+    """Replace the shared OpenAI client with an in-process fake."""
+    import clients
+
+    client = SimpleNamespace(embeddings=FakeEmbeddings(), chat=SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setattr(clients, "_client", client)
+    return client
+
+
+@pytest.fixture
+def fresh_index(tmp_path, monkeypatch):
+    """
+    The index module with empty index files under tmp_path, an empty database and answer cache.
+
+    Compactions only run when a test calls compact_index.
+    """
+    import index
+    from answer_cache import AnswerCache
+    from lexical import BM25Index
+    from models import SQLModel, create_db_and_tables, engine
+    from vector_log import VectorLog
+
+    path = str(tmp_path / ".faiss")
+    monkeypatch.setattr(index, "FAISS_INDEX_PATH", path)
+    monkeypatch.setattr(index, "vector_log", VectorLog(f"{path}.log"))
+    monkeypatch.setattr(index, "lexical_index", BM25Index(f"{path}.lexical.npz"))
+    monkeypatch.setattr(index, "answer_cache", AnswerCache(100, 3600, 0.95))
+    monkeypatch.setattr(index, "COMPACTION_THRESHOLD", 2.0)
+    SQLModel.metadata.drop_all(engine)
+    create_db_and_tables()
+    index.load_index()
+    return index
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import ann
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "sq_fp16", "sq_int8"])
+def test_migration_keeps_faiss_ids(random_vectors, index_type):
+    vectors = random_vectors(1200, 64)
+
+    migrated = ann.migrate_index(ann.build_index("flat", vectors), index_type)
+
+    assert ann.index_type_of(migrated) == index_type
+    assert migrated.ntotal == 1200
+    _, ids = migrated.search(vectors[:100], 1)
+    assert ids[:, 0].tolist() == list(range(100))
+
+
+def test_migration_builds_from_exact_vectors_when_given(random_vectors):
+    vectors = random_vectors(1200, 64)
+    quantized = ann.build_index("sq_int8", vectors)
+
+    from_codes = ann.migrate_index(quantized, "flat")
+    from_exact = ann.migrate_index(quantized, "flat", vectors=vectors)
+
+    np.testing.assert_array_equal(from_exact.reconstruct_n(0, 1200), vectors)
+    assert not np.array_equal(from_codes.reconstruct_n(0, 1200), vectors)
+
+
+def test_migration_waits_for_enough_vectors_to_train(random_vectors):
+    flat = ann.build_index("flat", random_vectors(10, 64))
+
+    assert ann.migrate_index(flat, "sq_int8") is flat
+
+
+@pytest.mark.parametrize("index_type", ["sq_fp16", "sq_int8"])
+def test_rebuild_copies_the_kept_codes(random_vectors, index_type):
+    quantized = ann.build_index(index_type, random_vectors(1200, 64))
+    keep = np.arange(0, 1200, 3)
+
+    rebuilt = ann.rebuild_index(quantized, keep)
+
+    assert ann.index_type_of(rebuilt) == index_type
+    np.testing.assert_array_equal(rebuilt.reconstruct_n(0, len(keep)), quantized.reconstruct_batch(keep))
@@ -0,0 +1,135 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, make_scope
+
+SCOPE = make_scope(None, mode="hybrid")
+RESULT = {"answer": "The total was 42.", "sources": []}
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(max_entries=10, ttl=60, similarity=0.95)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.monotonic for the cache's expiry checks."""
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def at_similarity(vector, rng, similarity):
+    """A unit vector whose cosine similarity to the unit vector `vector` is `similarity`."""
+    other = rng.standard_normal(vector.shape, dtype=np.float32)
+    other -= other.dot(vector) * vector
+    other /= np.linalg.norm(other)
+    return similarity * vector + np.sqrt(1 - similarity ** 2) * other
+
+
+def test_exact_hits_ignore_case_spacing_and_trailing_punctuation(cache):
+    cache.put("What was the total?", SCOPE, None, RESULT, 1.5, cache.generation)
+
+    assert cache.get("  what WAS the   total", SCOPE) == RESULT
+    assert cache.get("What was the total?", make_scope([1], mode="hybrid")) is None
+    assert cache.get("What was the total?", make_scope(None, mode="lexical")) is None
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["saved_latency_seconds"] == 1.5
+
+
+@pytest.mark.parametrize("similarity, hit", [(1.0, True), (0.951, True), (0.949, False), (0.5, False)])
+def test_semantic_hits_start_at_the_similarity_threshold(cache, random_vectors, rng, similarity, hit):
+    asked = random_vectors(1)[0]
+    asked /= np.linalg.norm(asked)
+    cache.put("How much was invoiced?", SCOPE, asked, RESULT, 1.0, cache.generation)
+
+    found = cache.get_similar(at_similarity(asked, rng, similarity), SCOPE)
+
+    assert (found == RESULT) is hit
+    assert cache.stats()["semantic_hits" if hit else "misses"] == 1
+
+
+def test_semantic_hits_only_match_the_same_scope(cache, random_vectors):
+    asked = random_vectors(1)
+    cache.put("How much was invoiced?", SCOPE, asked, RESULT, 1.0, cache.generation)
+
+    assert cache.get_similar(asked, make_scope([3], mode="hybrid")) is None
+
+
+def test_invalidation_drops_answers_whose_scope_includes_the_document(cache):
+    cache.put("q", make_scope(None), None, RESULT, 1.0, cache.generation)
+    cache.put("q", make_scope([1, 2]), None, RESULT, 1.0, cache.generation)
+    cache.put("q", make_scope([2]), None, RESULT, 1.0, cache.generation)
+
+    cache.invalidate(1)
+
+    assert cache.get("q", make_scope(None)) is None
+    assert cache.get("q", make_scope([2, 1])) is None
+    assert cache.get("q", make_scope([2])) == RESULT
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_answers_computed_across_an_invalidation_are_not_cached(cache):
+    generation = cache.generation
+    cache.invalidate(7)
+
+    cache.put("q", SCOPE, None, RESULT, 1.0, generation)
+
+    assert cache.get("q", SCOPE) is None
+
+
+def test_uploads_and_deletions_invalidate_answers(fresh_index, random_vectors):
+    cache = fresh_index.answer_cache
+    doc_id = fresh_index.create_document("report.txt", "text/plain")
+
+    for change in (lambda: fresh_index.store_chunks(doc_id, ["The total was 42."], random_vectors(1)),
+                   lambda: fresh_index.delete_document(doc_id)):
+        cache.put("What was the total?", SCOPE, None, RESULT, 1.0, cache.generation)
+        # An answer that was being computed while the documents changed
+        generation = cache.generation
+        change()
+        cache.put("How much was it?", SCOPE, None, RESULT, 1.0, generation)
+
+        assert cache.get("What was the total?", SCOPE) is None
+        assert cache.get("How much was it?", SCOPE) is None
+
+
+
+def test_lexical_questions_count_their_misses(fresh_index, openai_client, random_vectors):
+    doc_id = fresh_index.create_document("report.txt", "text/plain")
+    fresh_index.store_chunks(doc_id, ["The total was 42."], random_vectors(1))
+
+    asyncio.run(fresh_index.answer("What was the total?", mode="lexical"))
+    asyncio.run(fresh_index.answer("What was the total?", mode="lexical"))
+    asyncio.run(fresh_index.answer_batch(["How much was it?", "What was the total?"], mode="lexical"))
+
+    stats = fresh_index.answer_cache.stats()
+    assert (stats["exact_hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_rate"] == 0.5
+
+def test_entries_expire_after_the_ttl(cache, clock, random_vectors):
+    asked = random_vectors(1)
+    cache.put("What was the total?", SCOPE, asked, RESULT, 1.0, cache.generation)
+
+    clock[0] += 59
+    assert cache.get("What was the total?", SCOPE) == RESULT
+    clock[0] += 2
+    assert cache.get("What was the total?", SCOPE) is None
+    assert cache.get_similar(asked, SCOPE) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    for i in range(10):
+        cache.put(f"question {i}", SCOPE, None, RESULT, 1.0, cache.generation)
+    cache.get("question 0", SCOPE)
+
+    cache.put("question 10", SCOPE, None, RESULT, 1.0, cache.generation)
+
+    assert cache.get("question 0", SCOPE) == RESULT
+    assert cache.get("question 1", SCOPE) is None
+    assert cache.stats()["entries"] == 10
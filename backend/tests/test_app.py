@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from conftest import text_vector
+
+
+@pytest.fixture
+def client(fresh_index, openai_client):
+    return TestClient(app.app)
+
+
+def store_texts(index, name, texts):
+    doc_id = index.create_document(name, "text/plain")
+    index.store_chunks(doc_id, texts, [text_vector(text) for text in texts])
+    return doc_id
+
+
+def test_batch_answers_come_back_in_question_order(client, fresh_index, openai_client):
+    store_texts(fresh_index, "report.txt", ["Revenue grew by a tenth.", "Costs stayed flat.", "Staff doubled."])
+    questions = ["How did staff change?", "What happened to revenue?", "And costs?", "How did staff change?"]
+
+    response = client.post("/query/batch", json={"questions": questions})
+
+    assert response.status_code == 200
+    assert [result["answer"] for result in response.json()["results"]] == [f"Answer to {q}" for q in questions]
+    # The repeated question was answered once
+    assert len(openai_client.chat.completions.prompts) == 3
+
+
+def test_batch_is_scoped_to_the_given_documents(client, fresh_index, openai_client):
+    store_texts(fresh_index, "revenue.txt", ["Revenue grew by a tenth."])
+    costs = store_texts(fresh_index, "costs.txt", ["Costs stayed flat.", "Costs of revenue fell."])
+
+    response = client.post("/query/batch", json={"questions": ["What happened to revenue?", "And costs?"],
+                                                 "doc_ids": [costs]})
+
+    assert response.status_code == 200
+    sources = [source for result in response.json()["results"] for source in result["sources"]]
+    assert sources and {source["document_id"] for source in sources} == {costs}
+    assert not any("grew" in prompt for prompt in openai_client.chat.completions.prompts)
+
+
+def test_oversized_batch_is_rejected(client, openai_client, monkeypatch):
+    monkeypatch.setattr(app, "QUERY_BATCH_MAX_QUESTIONS", 3)
+
+    response = client.post("/query/batch", json={"questions": ["a?", "b?", "c?", "d?"]})
+
+    assert response.status_code == 413
+    assert openai_client.embeddings.calls == 0
+    assert openai_client.chat.completions.prompts == []
+
+
+def test_failed_upload_copy_leaves_no_file_behind(client, monkeypatch, tmp_path):
+    def fail_copy(source, destination, length):
+        destination.write(b"partial")
+        raise OSError("No space left on device")
+
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(app, "UPLOAD_DIR", str(uploads))
+    monkeypatch.setattr(app.shutil, "copyfileobj", fail_copy)
+
+    with pytest.raises(OSError):
+        client.post("/documents", files={"file": ("report.txt", b"The total was 42.", "text/plain")})
+
+    assert list(uploads.iterdir()) == []
+
+
+def test_stats_reads_the_embedding_cache_off_the_event_loop(client, monkeypatch):
+    callers = []
+
+    def stats():
+        try:
+            asyncio.get_running_loop()
+            callers.append("event loop")
+        except RuntimeError:
+            callers.append("worker thread")
+        return {}
+
+    monkeypatch.setattr(app.embedding_cache, "stats", stats)
+    response = client.get("/stats")
+
+    assert response.status_code == 200
+    assert callers == ["worker thread"]
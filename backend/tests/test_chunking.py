@@ -0,0 +1,137 @@
+import re
+
+import numpy as np
+import pytest
+
+from chunking import NO_BREAK, SENTENCE_BREAK, PageChunker, chunk_text, cut_qualities
+from embeddings import encoder
+
+
+def numbered_pages(pages, words_per_page, sentence_words=4):
+    """
+    Pages of distinct words w0, w1, ... with a sentence end every sentence_words
+    words, often enough that every chunk can end at one rather than mid-word.
+    """
+    texts, first_word = [], 0
+    for _ in range(pages):
+        words = [f"w{first_word + i}" for i in range(words_per_page)]
+        for i in range(sentence_words - 1, words_per_page, sentence_words):
+            words[i] += "."
+        texts.append(" ".join(words))
+        first_word += words_per_page
+    return texts
+
+
+def words_of(chunk):
+    return [int(number) for number in re.findall(r"w(\d+)", chunk)]
+
+
+def chunk_pages(texts, chunk_size, overlap):
+    chunker = PageChunker(chunk_size, overlap)
+    chunks = []
+    for page, text in enumerate(texts, start=1):
+        chunks += chunker.feed(text, page)
+    return chunks + chunker.finish()
+
+
+@pytest.mark.parametrize("overlap", [0, 20])
+def test_chunks_cover_every_word_in_order(overlap):
+    texts = numbered_pages(pages=6, words_per_page=150)
+
+    chunks = chunk_pages(texts, chunk_size=100, overlap=overlap)
+
+    covered = [words_of(chunk) for chunk, _ in chunks]
+    assert sorted(set(word for words in covered for word in words)) == list(range(6 * 150))
+    # Each chunk is a contiguous run of words, and chunks advance through the text
+    for words in covered:
+        assert words == list(range(words[0], words[-1] + 1))
+    assert [words[0] for words in covered] == sorted(words[0] for words in covered)
+
+
+def test_chunks_stay_within_the_token_limit():
+    chunks = chunk_pages(numbered_pages(pages=4, words_per_page=200), chunk_size=80, overlap=10)
+
+    assert max(len(encoder.encode_ordinary(chunk)) for chunk, _ in chunks) <= 80
+
+
+def test_chunks_without_overlap_do_not_repeat_words():
+    chunks = chunk_pages(numbered_pages(pages=3, words_per_page=200), chunk_size=60, overlap=0)
+
+    words = [word for chunk, _ in chunks for word in words_of(chunk)]
+    assert words == list(range(3 * 200))
+
+
+def test_hard_cuts_lose_nothing():
+    text = " ".join(f"w{i}" for i in range(500))
+
+    chunks = chunk_text(text, chunk_size=50, overlap=0)
+
+    assert len(chunks) > 1
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
+
+
+def test_consecutive_chunks_overlap():
+    chunks = chunk_pages(numbered_pages(pages=3, words_per_page=200), chunk_size=100, overlap=30)
+
+    for (previous, _), (current, _) in zip(chunks, chunks[1:]):
+        assert set(words_of(previous)) & set(words_of(current))
+
+
+def test_chunks_end_at_sentence_breaks():
+    chunks = chunk_pages(numbered_pages(pages=3, words_per_page=200), chunk_size=100, overlap=0)
+
+    assert all(chunk.endswith(".") for chunk, _ in chunks[:-1])
+
+
+def test_chunk_page_is_the_page_it_starts_on():
+    words_per_page = 150
+    chunks = chunk_pages(numbered_pages(pages=5, words_per_page=words_per_page), chunk_size=100, overlap=20)
+
+    for chunk, page in chunks:
+        # The overlap may start a chunk partway through a word, e.g. "149" of w149
+        first_word = int(re.match(r"\s*w?(\d+)", chunk).group(1))
+        assert page == first_word // words_per_page + 1
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("Just one short sentence.") == ["Just one short sentence."]
+    assert chunk_text("") == []
+
+
+def test_overlap_must_be_smaller_than_the_chunk_size():
+    with pytest.raises(ValueError):
+        PageChunker(chunk_size=50, overlap=50)
+
+
+def sentence_breaks(text):
+    """Text before each sentence break cut_qualities finds."""
+    ids = np.asarray(encoder.encode_ordinary(text), dtype=np.int64)
+    quality = cut_qualities(ids)
+    return [encoder.decode(ids[:position].tolist()) for position in np.flatnonzero(quality == SENTENCE_BREAK)]
+
+
+@pytest.mark.parametrize("text", [
+    "Ask Dr. Smith about it",
+    "See Fig. 3 for details",
+    "Written by J. Smith in spring",
+    "Use a tool, e.g. the one below",
+    "Based in the U.S. Army base",
+    "The rate was 3.5 percent",
+])
+def test_abbreviations_initials_and_decimals_are_not_sentence_ends(text):
+    assert sentence_breaks(text) == []
+
+
+@pytest.mark.parametrize("text, before", [
+    ("I said no. Then I left", "I said no."),
+    ("Pick option a. Then continue", "Pick option a."),
+    ("It works. The end", "It works."),
+])
+def test_sentence_ends_are_found(text, before):
+    assert sentence_breaks(text) == [before]
+
+
+def test_no_cut_inside_a_word():
+    ids = np.asarray(encoder.encode_ordinary("alphabet soup"), dtype=np.int64)
+
+    assert cut_qualities(ids).max() == NO_BREAK
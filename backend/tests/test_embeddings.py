@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+import pytest
+import tenacity
+
+import embeddings
+from conftest import text_vector
+from embeddings import batch_by_tokens, count_tokens
+
+
+def test_batches_stay_within_the_token_budget():
+    texts = [f"sentence number {i} about the quarterly report" for i in range(50)]
+    budget = count_tokens(texts[0]) * 4
+
+    batches = batch_by_tokens(texts, max_tokens=budget, max_inputs=100)
+
+    assert [text for batch in batches for text in batch] == texts
+    assert all(sum(count_tokens(text) for text in batch) <= budget for batch in batches)
+    assert len(batches) > 1
+
+
+def test_batches_stay_within_the_input_limit():
+    texts = [f"text {i}" for i in range(10)]
+
+    batches = batch_by_tokens(texts, max_tokens=10_000, max_inputs=3)
+
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+
+
+def test_oversized_text_gets_a_batch_of_its_own():
+    long_text = "word " * 200
+    texts = ["short", long_text, "short again"]
+
+    batches = batch_by_tokens(texts, max_tokens=20, max_inputs=100)
+
+    assert batches == [["short"], [long_text], ["short again"]]
+
+
+def request_with_recorded_waits(openai_client, failures):
+    openai_client.embeddings.failures = failures
+    waits = []
+
+    async def record_sleep(seconds):
+        waits.append(seconds)
+
+    return waits, embeddings.request_embeddings.retry_with(sleep=record_sleep)
+
+
+def test_request_retries_with_backoff_then_succeeds(openai_client):
+    waits, request = request_with_recorded_waits(openai_client, failures=2)
+
+    vectors = asyncio.run(request(["a", "b", "c"]))
+
+    # In input order, though the API answered out of order
+    assert vectors == [text_vector(text).tolist() for text in ["a", "b", "c"]]
+    assert openai_client.embeddings.calls == 3
+    # One randomized exponential backoff per failure, capped at 20 s
+    assert len(waits) == 2
+    assert all(0 <= wait <= 20 for wait in waits)
+
+
+def test_request_gives_up_after_three_attempts(openai_client):
+    waits, request = request_with_recorded_waits(openai_client, failures=10)
+
+    with pytest.raises(tenacity.RetryError):
+        asyncio.run(request(["a"]))
+    assert openai_client.embeddings.calls == 3
+    assert len(waits) == 2
+
+
+def test_request_slot_is_released_after_failures(openai_client):
+    _, request = request_with_recorded_waits(openai_client, failures=10)
+
+    with pytest.raises(tenacity.RetryError):
+        asyncio.run(request(["a"]))
+    assert embeddings.request_slots._value == embeddings.EMBEDDING_CONCURRENCY
+
+
+def test_embed_sends_each_uncached_text_once(openai_client):
+    first = asyncio.run(embeddings.embed(["alpha", "be", "alpha"]))
+    second = asyncio.run(embeddings.embed(["be", "gamma"]))
+
+    np.testing.assert_allclose(first, [text_vector(text) for text in ["alpha", "be", "alpha"]], rtol=1e-6)
+    np.testing.assert_allclose(second, [text_vector(text) for text in ["be", "gamma"]], rtol=1e-6)
+    # "be" was cached by the first call
+    assert openai_client.embeddings.inputs == [["alpha", "be"], ["gamma"]]
@@ -0,0 +1,269 @@
+import asyncio
+import functools
+
+import numpy as np
+import pytest
+
+from answer_cache import make_scope
+from conftest import text_vector
+from vector_log import VectorLog
+
+
+def store_document(index, vectors, name="report.txt"):
+    doc_id = index.create_document(name, "text/plain")
+    chunk_ids = index.store_chunks(doc_id, [f"{name} chunk {i}" for i in range(len(vectors))], vectors)
+    return doc_id, chunk_ids
+
+
+def nearest(index, vectors, k=4, doc_ids=None):
+    """Chunk IDs of the vector search hits for each vector, nearest first."""
+    return [[chunk_id for chunk_id, _ in hits] for hits in index.search_vectors_batch(vectors, k, doc_ids)]
+
+
+def pages_from(pages):
+    """A stand-in for extract.iter_pages yielding the current contents of the pages list."""
+    async def iter_pages(file_path, original_file_name):
+        for page, text in enumerate(list(pages), start=1):
+            if text is None:
+                raise ValueError("Unreadable page")
+            yield page, text
+    return iter_pages
+
+
+def test_deleted_chunks_never_come_back_from_search(fresh_index, random_vectors):
+    _, kept_ids = store_document(fresh_index, random_vectors(6))
+    deleted_vectors = random_vectors(6)
+    deleted_doc, _ = store_document(fresh_index, deleted_vectors)
+
+    assert fresh_index.delete_document(deleted_doc)
+
+    # Even searched with their own vectors, only live chunks come back
+    for _ in range(2):
+        assert all(sorted(hits) == sorted(kept_ids) for hits in nearest(fresh_index, deleted_vectors, k=12))
+        assert nearest(fresh_index, deleted_vectors, doc_ids=[deleted_doc]) == [[]] * 6
+        # Tombstones are replayed from the vector log on restart
+        fresh_index.load_index()
+    assert fresh_index.tombstone_count == 6
+    assert not fresh_index.delete_document(deleted_doc)
+
+
+def test_compaction_keeps_surviving_vectors_and_their_chunk_ids(fresh_index, random_vectors):
+    vectors = random_vectors(15)
+    documents = [store_document(fresh_index, vectors[start:start + 5]) for start in range(0, 15, 5)]
+    fresh_index.delete_document(documents[1][0])
+    survivors = np.r_[0:5, 10:15]
+    surviving_ids = documents[0][1] + documents[2][1]
+
+    fresh_index.compact_index()
+
+    for _ in range(2):
+        assert fresh_index.index.ntotal == 10
+        assert fresh_index.tombstone_count == 0
+        hits = fresh_index.search_vectors_batch(vectors[survivors], 1)
+        assert [row[0][0] for row in hits] == surviving_ids
+        assert max(row[0][1] for row in hits) < 1e-3
+        assert sorted(nearest(fresh_index, vectors[10:11], k=10, doc_ids=[documents[2][0]])[0]) == documents[2][1]
+        # The compacted snapshot is what a restart loads
+        fresh_index.load_index()
+
+
+def test_vectors_added_during_compaction_are_carried_over(fresh_index, random_vectors, monkeypatch):
+    first, second = random_vectors(4), random_vectors(4)
+    deleted_doc, _ = store_document(fresh_index, first)
+    fresh_index.delete_document(deleted_doc)
+    rebuild_index = fresh_index.ann.rebuild_index
+    added = []
+
+    def rebuild_while_uploading(source, keep):
+        # An upload lands between taking the copy and swapping the rebuilt index in
+        added.append(store_document(fresh_index, second))
+        return rebuild_index(source, keep)
+
+    monkeypatch.setattr(fresh_index.ann, "rebuild_index", rebuild_while_uploading)
+    fresh_index.compact_index()
+
+    doc_id, chunk_ids = added[0]
+    assert fresh_index.index.ntotal == 4
+    assert [hits[0] for hits in nearest(fresh_index, second, k=1)] == chunk_ids
+    fresh_index.load_index()
+    assert [hits[0] for hits in nearest(fresh_index, second, k=1)] == chunk_ids
+
+
+def test_replacement_keeps_old_chunks_searchable_until_the_new_version_is_indexed(fresh_index, openai_client,
+                                                                               monkeypatch):
+    pages = ["The first version of the quarterly report."]
+    monkeypatch.setattr(fresh_index, "iter_pages", pages_from(pages))
+    doc_id = asyncio.run(fresh_index.add_document("report.txt", "report.txt"))
+    old_ids = fresh_index.document_chunk_ids(doc_id)
+    query = text_vector("quarterly report").reshape(1, -1)
+    searchable = []
+
+    async def on_progress(stage, _):
+        searchable.append(sorted(nearest(fresh_index, query, k=10, doc_ids=[doc_id])[0]))
+
+    pages[:] = ["The second version of the quarterly report.", "It has a second page."]
+    asyncio.run(fresh_index.add_document("report.txt", "report.txt", on_progress=on_progress, doc_id=doc_id))
+
+    assert searchable and all(chunk_ids == old_ids for chunk_ids in searchable)
+    new_ids = fresh_index.document_chunk_ids(doc_id)
+    assert not set(new_ids) & set(old_ids)
+    assert sorted(nearest(fresh_index, query, k=10, doc_ids=[doc_id])[0]) == new_ids
+
+
+def test_failed_replacement_keeps_the_old_version(fresh_index, openai_client, monkeypatch):
+    pages = ["The first version of the quarterly report."]
+    monkeypatch.setattr(fresh_index, "iter_pages", pages_from(pages))
+    doc_id = asyncio.run(fresh_index.add_document("report.txt", "report.txt"))
+    old_ids = fresh_index.document_chunk_ids(doc_id)
+
+    pages[:] = ["The second version of the quarterly report.", None]
+    with pytest.raises(ValueError):
+        asyncio.run(fresh_index.add_document("report.txt", "report.txt", doc_id=doc_id))
+
+    assert fresh_index.document_chunk_ids(doc_id) == old_ids
+    query = text_vector("quarterly report").reshape(1, -1)
+    assert nearest(fresh_index, query, k=10) == [old_ids]
+
+
+def file_contents(directory):
+    return {path.name: path.read_bytes() for path in directory.iterdir() if path.is_file()}
+
+
+def test_read_only_copy_leaves_the_index_files_alone(fresh_index, random_vectors, monkeypatch, tmp_path):
+    monkeypatch.setattr(fresh_index, "KEEP_EXACT_VECTORS", True)
+    saved_vectors, logged_vectors = random_vectors(4), random_vectors(3)
+    _, saved_ids = store_document(fresh_index, saved_vectors)
+    fresh_index.save_index()
+    _, logged_ids = store_document(fresh_index, logged_vectors)
+    # The writer is midway through appending another record
+    with open(fresh_index.vector_log.path, "ab") as f:
+        f.write(b"VLGD partial")
+    files = file_contents(tmp_path)
+
+    # The fixture's log keeps the writer lock, as another process would
+    monkeypatch.setattr(fresh_index, "vector_log", VectorLog(fresh_index.vector_log.path))
+    fresh_index.load_index()
+
+    assert not fresh_index.index_writable
+    assert file_contents(tmp_path) == files
+    vectors = np.vstack([saved_vectors, logged_vectors])
+    assert [hits[0] for hits in nearest(fresh_index, vectors, k=1)] == saved_ids + logged_ids
+    # Replayed rows are kept in memory, after the snapshot's rows in the file
+    np.testing.assert_array_equal(fresh_index.vector_store.get(np.arange(7)), vectors)
+    np.testing.assert_array_equal(fresh_index.exact_vectors(), vectors)
+
+
+def store_as_the_writer(index, writer_log, vectors):
+    """Store a document the way another process holding the writer lock does: chunk rows, then a log record."""
+    doc_id = index.create_document("other.txt", "text/plain")
+    with index.Session(index.engine) as session:
+        chunks = [index.Chunk(doc_id=doc_id, text=f"other.txt chunk {i}") for i in range(len(vectors))]
+        session.add_all(chunks)
+        session.commit()
+        chunk_ids = [chunk.id for chunk in chunks]
+    writer_log.append(index.index_epoch, index.index.ntotal, np.array(chunk_ids), np.full(len(vectors), doc_id),
+                      vectors)
+    return chunk_ids
+
+
+def test_read_only_copy_reloads_the_writers_changes(fresh_index, random_vectors, monkeypatch):
+    first, second = random_vectors(3), random_vectors(2)
+    _, first_ids = store_document(fresh_index, first)
+    fresh_index.save_index()
+    writer_log = fresh_index.vector_log
+    monkeypatch.setattr(fresh_index, "vector_log", VectorLog(writer_log.path))
+    fresh_index.load_index()
+    cache = fresh_index.answer_cache
+    cache.put("What was the total?", make_scope(None), None, {"answer": "42", "sources": []}, 1.0, cache.generation)
+
+    assert not fresh_index.reload_if_stale()
+    second_ids = store_as_the_writer(fresh_index, writer_log, second)
+    assert fresh_index.reload_if_stale()
+
+    assert not fresh_index.index_writable
+    assert [hits[0] for hits in nearest(fresh_index, np.vstack([first, second]), k=1)] == first_ids + second_ids
+    assert cache.get("What was the total?", make_scope(None)) is None
+    assert not fresh_index.reload_if_stale()
+    assert fresh_index.index_stats()["read_only"]
+
+
+def test_scoped_search_only_reads_the_scope(fresh_index, random_vectors, monkeypatch):
+    vectors, queries = random_vectors(30), random_vectors(5)
+    doc_id, first_ids = store_document(fresh_index, vectors[:10])
+    store_document(fresh_index, vectors[10:20], name="other.txt")
+    # A second batch of the same document leaves a gap in its FAISS ids
+    later_ids = fresh_index.store_chunks(doc_id, [f"later chunk {i}" for i in range(10)], vectors[20:])
+
+    def no_selector(faiss_ids):
+        raise AssertionError("a flat index searches the scope's own vectors")
+
+    monkeypatch.setattr(fresh_index, "scope_selector", no_selector)
+    hits = nearest(fresh_index, queries, doc_ids=[doc_id])
+
+    scoped = np.vstack([vectors[:10], vectors[20:]])
+    scoped_ids = np.array(first_ids + later_ids)
+    distances = ((queries[:, None, :] - scoped[None, :, :]) ** 2).sum(axis=2)
+    assert hits == scoped_ids[np.argsort(distances, axis=1)[:, :4]].tolist()
+
+
+def clustered_vectors(rng, count, clusters=20, spread=0.3):
+    """Vectors around a few centers, where near neighbours are close and quantization errors can reorder them."""
+    centers = rng.standard_normal((clusters, 1536), dtype=np.float32)
+    noise = rng.standard_normal((count, 1536), dtype=np.float32) * spread
+    return centers[rng.integers(clusters, size=count)] + noise
+
+
+@pytest.mark.parametrize("index_type", ["sq_fp16", "sq_int8"])
+def test_reranked_quantized_search_matches_flat_search(fresh_index, rng, monkeypatch, index_type):
+    monkeypatch.setattr(fresh_index, "KEEP_EXACT_VECTORS", True)
+    vectors = clustered_vectors(rng, 1200)
+    queries = vectors[rng.choice(1200, 50, replace=False)] + rng.standard_normal((50, 1536), dtype=np.float32) * 0.3
+    store_document(fresh_index, vectors)
+    flat_hits = nearest(fresh_index, queries)
+
+    migrated = fresh_index.ann.migrate_index(fresh_index.index, index_type, vectors=fresh_index.exact_vectors())
+    monkeypatch.setattr(fresh_index, "index", migrated)
+
+    assert fresh_index.ann.index_type_of(fresh_index.index) == index_type
+    assert fresh_index.rerank_enabled()
+    assert nearest(fresh_index, queries) == flat_hits
+
+
+def test_large_scopes_of_quantized_indexes_are_filtered_in_the_index(fresh_index, rng, monkeypatch):
+    monkeypatch.setattr(fresh_index, "KEEP_EXACT_VECTORS", True)
+    vectors = clustered_vectors(rng, 1200)
+    doc_id, chunk_ids = store_document(fresh_index, vectors[:600])
+    store_document(fresh_index, vectors[600:], name="other.txt")
+    migrated = fresh_index.ann.migrate_index(fresh_index.index, "sq_int8", vectors=fresh_index.exact_vectors())
+    monkeypatch.setattr(fresh_index, "index", migrated)
+    exact_hits = nearest(fresh_index, vectors[::100], doc_ids=[doc_id])
+
+    monkeypatch.setattr(fresh_index, "SCOPED_EXACT_SEARCH_MAX", 100)
+    filtered_hits = nearest(fresh_index, vectors[::100], doc_ids=[doc_id])
+
+    assert all(set(hits) <= set(chunk_ids) and len(hits) == 4 for hits in filtered_hits)
+    # Re-ranked against the same full-precision vectors, both paths agree
+    assert filtered_hits == exact_hits
+
+
+def configure_index_type(monkeypatch, index, index_type):
+    """Act as if FAISS_INDEX_TYPE were index_type; ann reads the setting when it is imported."""
+    monkeypatch.setattr(index, "KEEP_EXACT_VECTORS", index.ann.is_quantized(index_type))
+    monkeypatch.setattr(index.ann, "migrate_index", functools.partial(index.ann.migrate_index, index_type=index_type))
+
+
+def test_migration_on_startup_keeps_chunk_ids(fresh_index, rng, monkeypatch):
+    vectors = clustered_vectors(rng, 300)
+    _, chunk_ids = store_document(fresh_index, vectors)
+    fresh_index.save_index()
+
+    # A flat snapshot loaded with a quantized index type configured, as migrate_index.py does
+    configure_index_type(monkeypatch, fresh_index, "sq_fp16")
+    fresh_index.load_index()
+    fresh_index.save_index()
+    fresh_index.load_index()
+
+    assert fresh_index.ann.index_type_of(fresh_index.index) == "sq_fp16"
+    assert len(fresh_index.vector_store) == 300
+    assert fresh_index.rerank_enabled()
+    assert [hits[0] for hits in nearest(fresh_index, vectors, k=1)] == chunk_ids
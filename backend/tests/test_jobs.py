@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import jobs
+from conftest import text_vector
+
+
+def pages_from(pages, on_start=lambda: None):
+    async def iter_pages(file_path, original_file_name):
+        on_start()
+        for page, text in enumerate(pages, start=1):
+            yield page, text
+    return iter_pages
+
+
+def document_texts(index, doc_id):
+    with index.Session(index.engine) as session:
+        statement = index.select(index.Chunk.text).where(index.Chunk.doc_id == doc_id).order_by(index.Chunk.id)
+        return list(session.exec(statement).all())
+
+
+@pytest.mark.parametrize("replacing", [False, True])
+def test_interrupted_job_resumes_without_duplicating_chunks(fresh_index, openai_client, monkeypatch, tmp_path,
+                                                            replacing):
+    pages = ["The quarterly report. " * 150, "Revenue grew by a tenth. " * 150]
+    monkeypatch.setattr(fresh_index, "iter_pages", pages_from(pages))
+    expected = document_texts(fresh_index, asyncio.run(fresh_index.add_document("clean.txt", "clean.txt")))
+    upload = tmp_path / "report.txt"
+    upload.write_text("".join(pages))
+    doc_id = fresh_index.create_document("report.txt", "text/plain")
+    if replacing:
+        fresh_index.store_chunks(doc_id, ["The previous version."], [text_vector("The previous version.")])
+
+    # A restart stopped the job after it recorded its watermark and stored the first batch of chunks
+    job = jobs.create_job("report.txt", str(upload), doc_id)
+    watermark = max(fresh_index.document_chunk_ids(doc_id), default=0)
+    jobs.update_job(job.id, status="running", stage="embedding", chunk_watermark=watermark)
+    fresh_index.store_chunks(doc_id, expected[:1], [text_vector(expected[0])])
+    previous = document_texts(fresh_index, doc_id)[:-1]
+    at_start = []
+
+    def record_document():
+        at_start.append((document_texts(fresh_index, doc_id), fresh_index.document_vector_counts().get(doc_id, 0)))
+
+    monkeypatch.setattr(fresh_index, "iter_pages", pages_from(pages, record_document))
+    asyncio.run(jobs.process_job(job.id))
+
+    # The resumed run started from the watermark, without the first run's chunks
+    assert at_start == [(previous, len(previous))]
+    assert jobs.get_job(job.id).status == "done"
+    assert document_texts(fresh_index, doc_id) == expected
+    assert fresh_index.document_vector_counts()[doc_id] == len(expected)
+    assert len(fresh_index.lexical_index) == 2 * len(expected)
+    assert not upload.exists()
+
+
+def test_new_job_records_the_document_watermark(fresh_index, openai_client, monkeypatch, tmp_path):
+    monkeypatch.setattr(fresh_index, "iter_pages", pages_from(["The second version."]))
+    doc_id = fresh_index.create_document("report.txt", "text/plain")
+    previous = fresh_index.store_chunks(doc_id, ["The first version."], [text_vector("The first version.")])
+    upload = tmp_path / "report.txt"
+    upload.write_text("The second version.")
+    job = jobs.create_job("report.txt", str(upload), doc_id)
+
+    asyncio.run(jobs.process_job(job.id))
+
+    assert jobs.get_job(job.id).chunk_watermark == max(previous)
+    assert document_texts(fresh_index, doc_id) == ["The second version."]
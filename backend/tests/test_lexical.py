@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from index import RRF_K, reciprocal_rank_fusion
+from lexical import BM25Index, decode_varints, encode_varint, encode_varints
+
+EDGE_VALUES = [0, 1, 127, 128, 255, 16383, 16384, 2**31, 2**35 + 7, 2**62]
+
+
+def test_varints_round_trip():
+    values = np.array(EDGE_VALUES * 3, dtype=np.int64)
+
+    np.testing.assert_array_equal(decode_varints(encode_varints(values)), values)
+
+
+def test_vectorized_encoding_matches_the_scalar_one():
+    scalar = bytearray()
+    for value in EDGE_VALUES:
+        encode_varint(value, scalar)
+
+    assert encode_varints(np.array(EDGE_VALUES)) == bytes(scalar)
+    assert len(encode_varints(np.array([127]))) == 1
+    assert len(encode_varints(np.array([128]))) == 2
+
+
+def test_single_byte_varints_decode():
+    values = np.arange(128)
+
+    np.testing.assert_array_equal(decode_varints(encode_varints(values)), values)
+    assert len(decode_varints(b"")) == 0
+
+
+@pytest.fixture
+def bm25(tmp_path):
+    index = BM25Index(str(tmp_path / "lexical.npz"))
+    index.add([10, 11, 12], [1, 1, 2], [
+        "invoice total for part AX-100",
+        "the shipping address of the customer",
+        "invoice invoice overdue reminder",
+    ])
+    return index
+
+
+def test_search_ranks_by_bm25(bm25):
+    hits = bm25.search("invoice", 10)
+
+    # The chunk repeating the term ranks first
+    assert [chunk_id for chunk_id, _ in hits] == [12, 10]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_search_respects_document_scope(bm25):
+    assert [chunk_id for chunk_id, _ in bm25.search("invoice", 10, doc_ids=[1])] == [10]
+
+
+def test_removed_chunks_drop_out(bm25):
+    assert bm25.remove_document(1, keep_chunk_ids=[11]) == 1
+
+    assert [chunk_id for chunk_id, _ in bm25.search("invoice", 10)] == [12]
+    assert len(bm25) == 2
+
+
+def test_postings_survive_compaction_and_save(bm25, tmp_path):
+    bm25.remove([11])
+    expected = bm25.search("invoice overdue", 10)
+    bm25.compact()
+    assert bm25.search("invoice overdue", 10) == expected
+
+    bm25.add([13], [3], ["late invoice"])
+    bm25.save()
+    loaded = BM25Index(bm25.path)
+    assert loaded.load()
+
+    assert loaded.search("invoice", 10) == bm25.search("invoice", 10)
+    assert loaded.entries().tolist() == bm25.entries().tolist()
+
+
+def test_fusion_favours_chunks_found_by_both_rankings():
+    vector = [(1, 0.1), (2, 0.2), (3, 0.3)]
+    lexical = [(3, 9.0), (4, 5.0)]
+
+    fused = reciprocal_rank_fusion([vector, lexical], k=3)
+
+    assert [chunk_id for chunk_id, _ in fused] == [3, 1, 2]
+    assert fused[0][1] == pytest.approx(1 / (RRF_K + 3) + 1 / (RRF_K + 1))
+    assert fused[1][1] == pytest.approx(1 / (RRF_K + 1))
+
+
+def test_fusion_of_one_ranking_keeps_its_order():
+    lexical = [(7, 3.0), (5, 2.0), (9, 1.0)]
+
+    assert [chunk_id for chunk_id, _ in reciprocal_rank_fusion([[], lexical], k=10)] == [7, 5, 9]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from shards import decode_arrays, encode_arrays, merge_hits, owner_shard
+
+
+def shard_hit_lists(rng, shards=4, hits_per_shard=20):
+    chunk_ids = rng.permutation(shards * hits_per_shard)
+    distances = rng.random(shards * hits_per_shard)
+    return [sorted(((int(chunk_id), float(distance)) for chunk_id, distance
+                    in zip(chunk_ids[shard::shards], distances[shard::shards])), key=lambda hit: hit[1])
+            for shard in range(shards)]
+
+
+@pytest.mark.parametrize("k", [1, 10, 80, 200])
+def test_merge_returns_the_overall_nearest(k, rng):
+    shard_hits = shard_hit_lists(rng)
+
+    merged = merge_hits(shard_hits, k)
+
+    every_hit = sorted((hit for hits in shard_hits for hit in hits), key=lambda hit: hit[1])
+    assert merged == every_hit[:k]
+
+
+def test_merge_keeps_a_chunk_found_on_two_shards_once():
+    first = [(1, 0.1), (2, 0.3)]
+    second = [(1, 0.1), (3, 0.2)]
+
+    assert merge_hits([first, second], 10) == [(1, 0.1), (3, 0.2), (2, 0.3)]
+
+
+def test_merge_of_no_hits_is_empty():
+    assert merge_hits([[], []], 5) == []
+
+
+def test_owner_shard_is_deterministic_and_in_range():
+    owners = [owner_shard(doc_id, 5) for doc_id in range(1000)]
+
+    assert owners == [owner_shard(doc_id, 5) for doc_id in range(1000)]
+    assert set(owners) == set(range(5))
+
+
+def test_adding_a_shard_only_moves_documents_to_it():
+    before = {doc_id: owner_shard(doc_id, 4) for doc_id in range(2000)}
+    after = {doc_id: owner_shard(doc_id, 5) for doc_id in range(2000)}
+
+    moved = [doc_id for doc_id in before if before[doc_id] != after[doc_id]]
+    assert all(after[doc_id] == 4 for doc_id in moved)
+    # About a fifth of the documents move to the new shard
+    assert 0.1 < len(moved) / len(before) < 0.3
+
+
+def test_arrays_round_trip(random_vectors):
+    chunk_ids = np.array([3, 1, 2], dtype=np.int64)
+    vectors = random_vectors(3, 8)
+
+    decoded = decode_arrays(encode_arrays(chunk_ids=chunk_ids, vectors=vectors))
+
+    assert set(decoded) == {"chunk_ids", "vectors"}
+    np.testing.assert_array_equal(decoded["chunk_ids"], chunk_ids)
+    np.testing.assert_array_equal(decoded["vectors"], vectors)
+    assert decoded["vectors"].dtype == np.float32
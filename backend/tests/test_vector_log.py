@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_log import CHECKSUM, HEADER, VectorLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    return VectorLog(str(tmp_path / "index.log"))
+
+
+def record_size(count, dimensions=4):
+    # Header, chunk ids, doc ids, vectors, checksum
+    return HEADER.size + count * 16 + count * dimensions * 4 + CHECKSUM.size
+
+
+def test_records_round_trip(log, random_vectors):
+    first = random_vectors(3, 4)
+    second = random_vectors(2, 4)
+    log.append(1, 0, np.array([10, 11, 12]), np.array([1, 1, 1]), first)
+    log.append_tombstones(1, np.array([1]))
+    log.append(1, 3, np.array([13, 14]), np.array([2, 2]), second)
+
+    records = list(log.replay(1))
+
+    assert len(records) == 3
+    first_id, chunk_ids, doc_ids, replayed = records[0]
+    assert first_id == 0
+    assert chunk_ids.tolist() == [10, 11, 12]
+    assert doc_ids.tolist() == [1, 1, 1]
+    np.testing.assert_array_equal(replayed, first)
+    assert records[1][1].tolist() == [1]
+    assert records[1][2] is None and records[1][3] is None
+    assert records[2][0] == 3
+    np.testing.assert_array_equal(records[2][3], second)
+
+
+def test_replay_skips_records_of_other_epochs(log, random_vectors):
+    log.append(1, 0, np.array([10]), np.array([1]), random_vectors(1, 4))
+    log.append(2, 0, np.array([20]), np.array([2]), random_vectors(1, 4))
+
+    assert [chunk_ids.tolist() for _, chunk_ids, _, _ in log.replay(2)] == [[20]]
+    assert log.max_epoch == 2
+
+
+def test_torn_tail_is_truncated(log, random_vectors):
+    log.append(1, 0, np.array([10, 11]), np.array([1, 1]), random_vectors(2, 4))
+    log.append(1, 2, np.array([12, 13]), np.array([1, 1]), random_vectors(2, 4))
+    # A crash midway through the second append
+    with open(log.path, "rb+") as f:
+        f.truncate(record_size(2) + record_size(2) // 2)
+
+    records = list(log.replay(1))
+
+    assert [chunk_ids.tolist() for _, chunk_ids, _, _ in records] == [[10, 11]]
+    assert os.path.getsize(log.path) == record_size(2)
+
+
+
+def test_replay_without_truncating_leaves_the_tail(log, random_vectors):
+    log.append(1, 0, np.array([10]), np.array([1]), random_vectors(1, 4))
+    # Another process's append in progress
+    with open(log.path, "ab") as f:
+        f.write(b"VLGD")
+
+    records = list(log.replay(1, truncate=False))
+
+    assert [chunk_ids.tolist() for _, chunk_ids, _, _ in records] == [[10]]
+    assert os.path.getsize(log.path) == record_size(1) + 4
+
+def test_corrupt_record_fails_its_checksum(log, random_vectors):
+    log.append(1, 0, np.array([10]), np.array([1]), random_vectors(1, 4))
+    log.append(1, 1, np.array([11]), np.array([1]), random_vectors(1, 4))
+    # Flip a bit inside the second record's vector
+    position = record_size(1) + HEADER.size + 16 + 2
+    with open(log.path, "rb+") as f:
+        f.seek(position)
+        byte = f.read(1)
+        f.seek(position)
+        f.write(bytes([byte[0] ^ 0x01]))
+
+    records = list(log.replay(1))
+
+    assert [chunk_ids.tolist() for _, chunk_ids, _, _ in records] == [[10]]
+    assert os.path.getsize(log.path) == record_size(1)
+
+
+def test_reset_drops_every_record(log, random_vectors):
+    log.append(1, 0, np.array([10]), np.array([1]), random_vectors(1, 4))
+
+    log.reset()
+
+    assert log.size() == 0
+    assert list(log.replay(1)) == []
+
+
+def test_only_one_writer_holds_the_lock(log):
+    other = VectorLog(log.path)
+
+    assert log.lock()
+    assert not other.lock()
+    assert log.lock_holder() == str(os.getpid())
@@ -0,0 +1,177 @@
+import os
+import fcntl
+import struct
+import zlib
+from typing import Callable, Iterator, Optional, Tuple
+import numpy as np
+
+# Record layout: header, chunk ids (int64), vectors (float32), CRC32 of everything before it
+MAGIC = b"VLOG"
+# Current vector records also carry the document of each chunk: header, chunk ids, doc ids (int64), vectors, CRC32
+DOCS_MAGIC = b"VLGD"
+# Tombstone records reuse the layout: header, FAISS ids (int64), no vectors, CRC32
+TOMBSTONE_MAGIC = b"VDEL"
+HEADER = struct.Struct("<4sIIIQ")  # magic, epoch, count, dimensions, first FAISS id
+CHECKSUM = struct.Struct("<I")
+
+def fsync_dir(path: str):
+    """Flush a directory entry so a rename inside it survives a crash."""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(path: str, write: Callable[[str], None]):
+    """
+    Write a file so readers see either the old or the new version, never a partial one.
+
+    Args:
+        path: Destination file
+        write: Function writing the full content to the temp path it is given
+    """
+    temp_path = f"{path}.tmp"
+    write(temp_path)
+    with open(temp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    fsync_dir(path)
+
+class VectorLog:
+    """
+    Append-only log of vectors added since the last index snapshot.
+
+    Each upload appends one checksummed record, so persisting it costs time
+    proportional to the upload rather than the corpus. Records carry the
+    snapshot epoch they extend; a snapshot that renumbers FAISS ids bumps the
+    epoch so stale records are never replayed onto it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Highest epoch of any record written or replayed, current or not
+        self.max_epoch = 0
+        # Open while this process holds the writer lock
+        self._lock_file = None
+
+    def lock(self) -> bool:
+        """
+        Take the single-writer lock on the index files this log belongs to.
+
+        Only one process may append to the log and write snapshots: two
+        writers would interleave conflicting records and delete snapshot
+        generations the other still reads. The lock is an exclusive flock on
+        `<path>.lock`, held until the process exits (or crashes).
+
+        Returns:
+            False if another process holds the lock
+        """
+        if self._lock_file is not None:
+            return True
+        dir_path = os.path.dirname(self.path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        lock_file = open(f"{self.path}.lock", "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        # Record the holder, for the message other processes print
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def lock_holder(self) -> str:
+        """PID of the process holding the writer lock, as it recorded it."""
+        try:
+            with open(f"{self.path}.lock") as f:
+                return f.read().strip() or "unknown"
+        except OSError:
+            return "unknown"
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, epoch: int, first_id: int, chunk_ids: np.ndarray, doc_ids: np.ndarray, vectors: np.ndarray):
+        """Durably append one record (flushed and fsynced before returning)."""
+        chunk_ids = np.ascontiguousarray(chunk_ids, dtype=np.int64)
+        doc_ids = np.ascontiguousarray(doc_ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        header = HEADER.pack(DOCS_MAGIC, epoch, len(chunk_ids), vectors.shape[1], first_id)
+        self.max_epoch = max(self.max_epoch, epoch)
+        self._write(header + chunk_ids.tobytes() + doc_ids.tobytes() + vectors.tobytes())
+
+    def append_tombstones(self, epoch: int, faiss_ids: np.ndarray):
+        """Durably record that the given FAISS ids were deleted."""
+        faiss_ids = np.ascontiguousarray(faiss_ids, dtype=np.int64)
+        self.max_epoch = max(self.max_epoch, epoch)
+        self._write(HEADER.pack(TOMBSTONE_MAGIC, epoch, len(faiss_ids), 0, 0) + faiss_ids.tobytes())
+
+    def _write(self, payload: bytes):
+        dir_path = os.path.dirname(self.path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(payload + CHECKSUM.pack(zlib.crc32(payload)))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self, epoch: int,
+               truncate: bool = True) -> Iterator[Tuple[int, np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]]:
+        """
+        Yield (first FAISS id, ids, doc ids, vectors) for every intact record of the given epoch, in order.
+
+        Added vectors come with their chunk ids, and their doc ids unless the
+        record predates them (None); tombstone records carry the deleted
+        FAISS ids and None for doc ids and vectors. A torn or corrupt tail
+        (e.g. from a crash mid-append) is truncated away, unless truncate is
+        False: to a process without the writer lock, the tail may be an
+        append still in progress.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            magic, record_epoch, count, dimensions, first_id = HEADER.unpack_from(data, offset)
+            id_columns = 2 if magic == DOCS_MAGIC else 1
+            end = offset + HEADER.size + count * 8 * id_columns + count * dimensions * 4
+            if magic not in (MAGIC, DOCS_MAGIC, TOMBSTONE_MAGIC) or end + CHECKSUM.size > len(data):
+                break
+            (checksum,) = CHECKSUM.unpack_from(data, end)
+            if zlib.crc32(data[offset:end]) != checksum:
+                break
+
+            self.max_epoch = max(self.max_epoch, record_epoch)
+            if record_epoch == epoch:
+                ids_start = offset + HEADER.size
+                ids = np.frombuffer(data, dtype=np.int64, count=count, offset=ids_start)
+                if magic == TOMBSTONE_MAGIC:
+                    yield first_id, ids, None, None
+                else:
+                    doc_ids = None
+                    if magic == DOCS_MAGIC:
+                        doc_ids = np.frombuffer(data, dtype=np.int64, count=count, offset=ids_start + count * 8)
+                    vectors = np.frombuffer(data, dtype=np.float32, count=count * dimensions,
+                                            offset=ids_start + count * 8 * id_columns).reshape(count, dimensions)
+                    yield first_id, ids, doc_ids, vectors
+            offset = end + CHECKSUM.size
+
+        if offset < len(data) and truncate:
+            print(f"Truncating {len(data) - offset} bytes of incomplete vector log at {self.path}.")
+            with open(self.path, "rb+") as f:
+                f.truncate(offset)
+                os.fsync(f.fileno())
+
+    def reset(self):
+        """Drop all records once a snapshot covers them."""
+        if os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
@@ -0,0 +1,143 @@
+import os
+from typing import List, Optional
+import numpy as np
+
+from vector_log import fsync_dir
+
+class VectorStore:
+    """
+    Full-precision copies of indexed vectors in a flat float32 file, row i holding FAISS id i.
+
+    Quantized indexes keep only compressed codes in memory. Searches over-fetch
+    candidates from the codes and re-rank them against these vectors. The file
+    is memory-mapped, so only the pages holding candidates are read, and
+    uvicorn workers share them through the page cache. The vector log is what
+    makes new vectors durable, so appends are not fsynced one by one; rows
+    past the snapshot are dropped on startup and replayed from the log.
+
+    A process that does not hold the index's writer lock opens the file
+    read-only: it never truncates or appends to it, and keeps the rows it
+    replays in memory instead.
+    """
+
+    def __init__(self, path: str, dimensions: int):
+        self.path = path
+        self.dimensions = dimensions
+        self._rows = 0
+        # Read-only view of the file, remapped once rows are appended past it
+        self._map: Optional[np.ndarray] = None
+        self.read_only = False
+        # Rows of a read-only store in the file; the rest are in _memory_rows
+        self._file_rows = 0
+        self._memory_rows: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dimensions * 4
+
+    @property
+    def nbytes(self) -> int:
+        return self._rows * self.row_bytes
+
+    def open(self, max_rows: int, read_only: bool = False):
+        """
+        Open (or create) the file, dropping rows past max_rows and any torn partial row.
+
+        A read-only store leaves the file as it is and only uses its first max_rows rows.
+        """
+        self.read_only = read_only
+        self._memory_rows = []
+        self._map = None
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._rows = self._file_rows = min(size // self.row_bytes, max_rows)
+        if read_only:
+            return
+        dir_path = os.path.dirname(self.path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        if size != self._rows * self.row_bytes:
+            with open(self.path, "ab") as f:
+                f.truncate(self._rows * self.row_bytes)
+
+    def append(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        if self.read_only:
+            self._memory_rows.append(vectors.copy())
+        else:
+            with open(self.path, "ab") as f:
+                f.write(vectors.tobytes())
+        self._rows += len(vectors)
+
+    def sync(self):
+        """Flush appended rows to disk, before a snapshot that relies on them is committed."""
+        if os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                os.fsync(f.fileno())
+            fsync_dir(self.path)
+
+    def vectors(self) -> np.ndarray:
+        """
+        All rows as a read-only memory-mapped array, without reading them into memory.
+
+        A read-only store holding rows in memory returns a copy of every row instead.
+        """
+        if self._memory_rows:
+            return np.concatenate([self._file_view(), self._memory()])
+        return self._file_view()
+
+    def _file_view(self) -> np.ndarray:
+        rows = self._file_rows if self.read_only else self._rows
+        if rows == 0:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        view = self._map
+        if view is None or len(view) < rows:
+            view = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+            self._map = view
+        return view[:rows]
+
+    def _memory(self) -> np.ndarray:
+        # Merged on first use, so a replay appending record by record does not copy quadratically
+        if len(self._memory_rows) > 1:
+            self._memory_rows = [np.concatenate(self._memory_rows)]
+        return self._memory_rows[0]
+
+    def get(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """Copy the rows of the given FAISS ids into memory."""
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        if not self._memory_rows:
+            return np.asarray(self._file_view()[faiss_ids])
+        in_file = faiss_ids < self._file_rows
+        rows = np.empty((len(faiss_ids), self.dimensions), dtype=np.float32)
+        rows[in_file] = self._file_view()[faiss_ids[in_file]]
+        rows[~in_file] = self._memory()[faiss_ids[~in_file] - self._file_rows]
+        return rows
+
+    def copy_rows(self, keep: np.ndarray, path: str) -> "VectorStore":
+        """
+        Write the rows at the given FAISS ids to a new file, renumbered by their position in keep.
+
+        Args:
+            keep: Sorted FAISS ids to copy
+            path: File for the new store
+
+        Returns:
+            The new store, synced to disk
+        """
+        copy = VectorStore(path, self.dimensions)
+        source = self.vectors()
+        with open(path, "wb") as f:
+            # In slices, so a large store is never read into memory at once
+            for start in range(0, len(keep), 65536):
+                f.write(np.ascontiguousarray(source[keep[start:start + 65536]]).tobytes())
+        copy._rows = len(keep)
+        copy.sync()
+        return copy
+
+    def remove(self):
+        """Delete the file. Workers that have it mapped keep reading the unlinked pages."""
+        self._map = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
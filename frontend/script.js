@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const backendUrl = 'http://localhost:8000'; // Base URL for API
     const queryEndpoint = `${backendUrl}/query`; // Endpoint for queries
+    const streamEndpoint = `${queryEndpoint}/stream`; // Streams sources, then answer tokens, as server-sent events
 
     const addMessageToChat = (message, sender, sources = null) => {
         const messageDiv = document.createElement('div');
@@ -15,7 +16,17 @@ document.addEventListener('DOMContentLoaded', () => {
         messageText.textContent = message;
         messageDiv.appendChild(messageText);
 
-        if (sender === 'bot' && sources && sources.length > 0) {
+        if (sender === 'bot') {
+            addSources(messageDiv, sources);
+        }
+
+        responseArea.appendChild(messageDiv);
+        responseArea.scrollTop = responseArea.scrollHeight; // Scroll to the bottom
+        return messageDiv;
+    };
+
+    const addSources = (messageDiv, sources) => {
+        if (sources && sources.length > 0) {
             const sourcesTitle = document.createElement('p');
             sourcesTitle.textContent = 'Sources:';
             sourcesTitle.style.fontWeight = 'bold';
@@ -46,7 +57,8 @@ document.addEventListener('DOMContentLoaded', () => {
                     const docName = sourceData.document_name || 'Unknown Document';
                     const chunkId = sourceData.chunk_id !== undefined ? sourceData.chunk_id : 'N/A';
                     const displayName = docName.length > 60 ? docName.substring(0, 57) + '...' : docName;
-                    metaDiv.textContent = `File: ${displayName} (Chunk ID: ${chunkId})`;
+                    const page = sourceData.page ? `, page ${sourceData.page}` : '';
+                    metaDiv.textContent = `File: ${displayName}${page} (Chunk ID: ${chunkId})`;
                     listItem.appendChild(metaDiv);
                     
                     // Check for and display snippet if available
@@ -75,9 +87,20 @@ document.addEventListener('DOMContentLoaded', () => {
             });
             messageDiv.appendChild(sourcesList);
         }
+    };
 
-        responseArea.appendChild(messageDiv);
-        responseArea.scrollTop = responseArea.scrollHeight; // Scroll to the bottom
+    // Parse one server-sent event ("event: ...\ndata: ...") into { event, data }
+    const parseEvent = (rawEvent) => {
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        return { event, data: data ? JSON.parse(data) : {} };
     };
 
     const handleQuerySubmit = async () => {
@@ -88,11 +111,12 @@ document.addEventListener('DOMContentLoaded', () => {
         userQueryInput.value = ''; // Clear input field
 
         try {
-            // Add a thinking indicator for the bot
-            addMessageToChat('Thinking...', 'bot');
-            const thinkingMessage = responseArea.lastChild;
+            // Add a thinking indicator for the bot; the answer is written into it as it streams in
+            const botMessage = addMessageToChat('Thinking...', 'bot');
+            const answerText = botMessage.querySelector('p');
+            let answer = '';
 
-            const response = await fetch(queryEndpoint, {
+            const response = await fetch(streamEndpoint, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -100,21 +124,38 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ question: query }), // Updated request body to match backend
             });
 
-            // Remove the thinking indicator
-            if (thinkingMessage && thinkingMessage.textContent === 'Thinking...') {
-                 responseArea.removeChild(thinkingMessage);
-            }
-
             if (!response.ok) {
+                responseArea.removeChild(botMessage);
                 const errorData = await response.json().catch(() => ({ detail: 'Unknown error occurred' }));
                 throw new Error(`HTTP error! status: ${response.status}, message: ${errorData.detail}`);
             }
 
-            const data = await response.json();
-            // Updated to use 'answer' and 'sources' from backend response
-            const botResponse = data.answer || 'No answer from server.';
-            const sources = data.sources || []; 
-            addMessageToChat(botResponse, 'bot', sources);
+            const handleEvent = ({ event, data }) => {
+                if (event === 'sources') {
+                    addSources(botMessage, data.sources);
+                } else if (event === 'token') {
+                    answer += data.text;
+                    answerText.textContent = answer;
+                } else if (event === 'done' || event === 'error') {
+                    answerText.textContent = data.answer || 'No answer from server.';
+                }
+                responseArea.scrollTop = responseArea.scrollHeight;
+            };
+
+            // Events are separated by a blank line and may be split across network reads
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                    handleEvent(parseEvent(buffer.slice(0, boundary)));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
 
         } catch (error) {
             console.error('Error fetching response:', error);